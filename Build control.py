@@ -1,14 +1,49 @@
+import sys
+
+if __name__ == "__main__" and "--headless" in sys.argv[1:]:
+    # Rack machines without a display: the controller without any Tk import (see headless.py)
+    from headless import main
+    sys.exit(main(sys.argv[1:]))
+
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
-import serial
-import serial.tools.list_ports
-import threading
+from tkinter import ttk, messagebox, scrolledtext, filedialog
+import os
+import collections
+import queue
 import time
-import math # Still needed for SemicircleSlider, though it's not used for servo control directly anymore
+import math # SemicircleSlider and PupilView geometry
 import re # For regular expressions to parse serial data
 
+from command_channel import CommandChannel
+from instrumentation import STAGES, PipelineInstrumentation, format_us
+from port_watcher import PortMemory, PortWatcher
+from protocol_runner import ProtocolRunner, load_protocol, summarize, write_results
+from recorder import FILE_EXTENSION, Recording, ReplayReader, TelemetryRecorder
+from reflex_metrics import ReflexMetrics
+from reflex_engine import SERVO_MAX_ANGLE, SERVO_MIN_ANGLE, compare_frame, evaluate, validate_thresholds
+from serial_link import SerialConnection
+from view_model import ViewModel
+from telemetry import (DEFAULT_HIGH_THRESHOLD, DEFAULT_LOW_THRESHOLD, DEFAULT_TELEMETRY_PERIOD_MS, LESION_FIELDS,
+                       LESION_PINS, REPORT_ALL, REPORT_CHANGES, REPORT_OFF, DataFrame, TelemetryStreamDecoder,
+                       TELEM_BIN_COMMAND, debug_command, decode_data_line, encode_data_line, lesion_mask_from_states,
+                       period_command, report_command, state_command)
+
+STARTUP_PROBE_ENV = "IRIS_STARTUP_PROBE" # Set by benchmarks/bench_startup.py to a file path
+
+
+def _import_serial():
+    # pyserial and its list_ports backend cost a noticeable share of cold start (more in a
+    # one-file build, which unpacks them first), so they are imported on the port-scan
+    # thread after the window is up. Later calls just return the cached module.
+    import serial
+    import serial.tools.list_ports
+    return serial
+
+
 # --- Custom Semicircle Slider Widget (Kept as a generic component, though no longer used for servo control in this simplified GUI) ---
 # This class is still included for completeness, but its instances are removed from the main app.
+# Retained mode: the arcs, knobs and centre line are created once. A drag only moves the
+# dragged knob and reshapes the range arc; a resize re-lays out the existing items.
 class SemicircleSlider(tk.Canvas):
     def __init__(self, parent, min_val=0, max_val=180, default_min=30, default_max=150, **kwargs):
         super().__init__(parent, **kwargs)
@@ -25,10 +60,17 @@ class SemicircleSlider(tk.Canvas):
         self.radius = min(self.center_x, self.center_y) - 20 # Leave some padding
 
         self.knob_radius = 10
-        self.knob1_id = None
-        self.knob2_id = None
         self.active_knob = None
 
+        # Angles for arc are in degrees, 0 is right, 90 is up, 180 is left.
+        # Servo angles (0-180) map to canvas arc angles (180-0): servo_angle -> 180 - servo_angle
+        self.arc_id = self.create_arc(0, 0, 0, 0, start=0, extent=180, style="arc", outline="#4CAF50", width=4, tags="arc")
+        self.range_arc_id = self.create_arc(0, 0, 0, 0, start=0, extent=0, style="arc", outline="#2196F3", width=6, tags="range_arc")
+        # Center line (optional, for visual reference of 90 degrees)
+        self.center_line_id = self.create_line(0, 0, 0, 0, fill="gray", dash=(2,2))
+        self.knob1_id = self.create_oval(0, 0, 0, 0, fill="#FF5722", outline="#BF360C", width=2, tags="knob1")
+        self.knob2_id = self.create_oval(0, 0, 0, 0, fill="#FF5722", outline="#BF360C", width=2, tags="knob2")
+
         self.bind("<ButtonPress-1>", self._on_button_press)
         self.bind("<B1-Motion>", self._on_mouse_drag)
         self.bind("<ButtonRelease-1>", self._on_button_release)
@@ -46,70 +88,44 @@ class SemicircleSlider(tk.Canvas):
         self.center_x = self.width / 2
         self.center_y = self.height - 10
         self.radius = min(self.center_x, self.center_y) - 20
-        self.draw_slider() # Redraw everything
+        self.draw_slider()
 
     def draw_slider(self):
-        self.delete("all")
-
-        # Draw the background arc (semicircle)
-        # Angles for arc are in degrees, 0 is right, 90 is up, 180 is left
-        # We want 0-180 degrees to map to 180-0 degrees on the canvas arc (top left to top right)
-        # Tkinter arc start/extent: start=0, extent=180 draws from right to left (0 to 180 on a compass)
-        # To map servo 0-180 to this, we need to invert: servo_angle -> 180 - servo_angle
-        self.create_arc(self.center_x - self.radius, self.center_y - self.radius,
-                        self.center_x + self.radius, self.center_y + self.radius,
-                        start=0, extent=180, style="arc", outline="#4CAF50", width=4, tags="arc")
-
-        # Draw current sweep range arc
-        # Convert servo angles (0-180) to canvas arc angles (180-0)
-        # The start of the arc is 180 - max(self.current_min, self.current_max)
-        # The extent is abs(self.current_max - self.current_min)
-        start_arc_angle = 180 - max(self.current_min, self.current_max)
-        extent_arc_angle = abs(self.current_max - self.current_min)
-
-        self.create_arc(self.center_x - self.radius, self.center_y - self.radius,
-                        self.center_x + self.radius, self.center_y + self.radius,
-                        start=start_arc_angle, extent=extent_arc_angle, style="arc", outline="#2196F3", width=6, tags="range_arc")
-
-
-        # Draw knobs
-        self._draw_knob(self.current_min, "knob1")
-        self._draw_knob(self.current_max, "knob2")
-
-        # Draw center line (optional, for visual reference of 90 degrees)
-        self.create_line(self.center_x, self.center_y, self.center_x, self.center_y - self.radius, fill="gray", dash=(2,2))
-
-    def _draw_knob(self, angle, tag):
-        # Convert servo angle (0-180) to canvas angle (180-0 for arc drawing)
-        canvas_angle = 180 - angle
-
-        # Convert degrees to radians for math.cos and math.sin
-        rad_angle = math.radians(canvas_angle)
-
-        # Calculate knob position
-        x = self.center_x + self.radius * math.cos(rad_angle)
-        y = self.center_y - self.radius * math.sin(rad_angle)
-
-        # Draw the knob circle
-        knob_id = self.create_oval(x - self.knob_radius, y - self.knob_radius,
-                                   x + self.knob_radius, y + self.knob_radius,
-                                   fill="#FF5722", outline="#BF360C", width=2, tags=tag)
-        if tag == "knob1":
-            self.knob1_id = knob_id
-        else:
-            self.knob2_id = knob_id
+        # Lay out every item for the current size and values
+        box = (self.center_x - self.radius, self.center_y - self.radius,
+               self.center_x + self.radius, self.center_y + self.radius)
+        self.coords(self.arc_id, *box)
+        self.coords(self.range_arc_id, *box)
+        self.coords(self.center_line_id, self.center_x, self.center_y, self.center_x, self.center_y - self.radius)
+        self._update_range_arc()
+        self._move_knob(self.knob1_id, self.current_min)
+        self._move_knob(self.knob2_id, self.current_max)
+
+    def _update_range_arc(self):
+        # The sweep range runs from 180 - max(min, max) for abs(max - min) degrees
+        self.itemconfigure(self.range_arc_id, start=180 - max(self.current_min, self.current_max),
+                           extent=abs(self.current_max - self.current_min))
+
+    def _knob_center(self, angle):
+        # Convert servo angle (0-180) to canvas angle (180-0), then to a point on the arc
+        rad_angle = math.radians(180 - angle)
+        return (self.center_x + self.radius * math.cos(rad_angle),
+                self.center_y - self.radius * math.sin(rad_angle))
+
+    def _move_knob(self, knob_id, angle):
+        x, y = self._knob_center(angle)
+        r = self.knob_radius
+        self.coords(knob_id, x - r, y - r, x + r, y + r)
+
+    def _hit_knob(self, angle, x, y):
+        # Computed from the value, so a press costs no canvas round trip
+        knob_x, knob_y = self._knob_center(angle)
+        return abs(x - knob_x) <= self.knob_radius and abs(y - knob_y) <= self.knob_radius
 
     def _on_button_press(self, event):
-        x, y = event.x, event.y
-        # Check if knob1 was clicked
-        if self.find_withtag("knob1") and self.coords(self.knob1_id) and \
-           self.coords(self.knob1_id)[0] <= x <= self.coords(self.knob1_id)[2] and \
-           self.coords(self.knob1_id)[1] <= y <= self.coords(self.knob1_id)[3]:
+        if self._hit_knob(self.current_min, event.x, event.y):
             self.active_knob = "knob1"
-        # Check if knob2 was clicked
-        elif self.find_withtag("knob2") and self.coords(self.knob2_id) and \
-             self.coords(self.knob2_id)[0] <= x <= self.coords(self.knob2_id)[2] and \
-             self.coords(self.knob2_id)[1] <= y <= self.coords(self.knob2_id)[3]:
+        elif self._hit_knob(self.current_max, event.x, event.y):
             self.active_knob = "knob2"
 
     def _on_mouse_drag(self, event):
@@ -137,13 +153,18 @@ class SemicircleSlider(tk.Canvas):
             # Convert canvas angle (180-0) back to servo angle (0-180)
             servo_angle = round(180 - angle_deg)
 
-            # Update the active knob's value
+            # Update the active knob's value; motion events within the same degree change nothing
             if self.active_knob == "knob1":
+                if servo_angle == self.current_min:
+                    return
                 self.current_min = servo_angle
+                self._move_knob(self.knob1_id, servo_angle)
             else:
+                if servo_angle == self.current_max:
+                    return
                 self.current_max = servo_angle
-
-            self.draw_slider() # Redraw the slider with updated knob position
+                self._move_knob(self.knob2_id, servo_angle)
+            self._update_range_arc()
             if self.value_change_callback:
                 self.value_change_callback(self.current_min, self.current_max)
 
@@ -159,7 +180,9 @@ class SemicircleSlider(tk.Canvas):
     def set_min_max_angles(self, min_angle, max_angle):
         self.current_min = constrain(min_angle, self.min_val, self.max_val)
         self.current_max = constrain(max_angle, self.min_val, self.max_val)
-        self.draw_slider()
+        self._update_range_arc()
+        self._move_knob(self.knob1_id, self.current_min)
+        self._move_knob(self.knob2_id, self.current_max)
 
 # Helper function to constrain values (similar to Arduino's constrain)
 def constrain(val, min_val, max_val):
@@ -167,49 +190,34 @@ def constrain(val, min_val, max_val):
 
 # --- Custom Toggle Button (for lesion switches) ---
 class ToggleButton(ttk.Button):
-    # Class-level counter to ensure unique style names
-    _instance_count = 0
+    # Every button with the same colours shares one style per state, configured once; toggling
+    # just switches the button to the other style (one configure call) instead of remapping a
+    # style of its own
+    _styles = {} # (background, foreground) -> style name
 
     def __init__(self, parent, style_obj, text_on="INTACT", text_off="LESION", bg_on="#4CAF50", bg_off="#F44336",
                  fg_on="white", fg_off="white", initial_state=True, command=None, **kwargs):
         kwargs.pop('width', None)
         kwargs.pop('height', None)
-
-        # Generate a unique style name for this instance
-        ToggleButton._instance_count += 1
-        # Use a base style like 'TButton' for inheritance
-        self.unique_style_name = f'LesionToggle{ToggleButton._instance_count}.TButton'
-        
-        # Configure the style for this unique name, inheriting from 'TButton'
-        # This must be done BEFORE calling super().__init__
-        style_obj.configure(self.unique_style_name,
-                            font=('Inter', 10, 'bold'),
-                            padding=(10, 15),
-                            borderwidth=2, # Ensure border is consistent
-                            relief='raised') # Ensure initial relief is consistent
-
-        # Map the states for this unique style
-        # The 'background' and 'foreground' states are mapped here
-        style_obj.map(self.unique_style_name,
-                      background=[('!disabled', bg_on), ('!disabled', 'pressed', bg_off)],
-                      foreground=[('!disabled', fg_on), ('!disabled', 'pressed', fg_off)])
-
-        # Initialize the ttk.Button with the unique style name
-        super().__init__(parent, style=self.unique_style_name, **kwargs)
-        
+        self.style_on = self._shared_style(style_obj, bg_on, fg_on)
+        self.style_off = self._shared_style(style_obj, bg_off, fg_off)
         self.text_on = text_on
         self.text_off = text_off
-        self.bg_on = bg_on
-        self.bg_off = bg_off
-        self.fg_on = fg_on
-        self.fg_off = fg_off
         self._state = initial_state # True for ON (intact), False for OFF (lesion)
         self._command = command # Store the original command
-        self.style_obj = style_obj # Store the style object passed from the app
-
-        self.config(command=self._toggle_state)
-        # Call _update_appearance to set the initial text and background based on initial_state
-        self._update_appearance()
+        super().__init__(parent, style=self.style_on if initial_state else self.style_off,
+                         text=text_on if initial_state else text_off, command=self._toggle_state, **kwargs)
+
+    @classmethod
+    def _shared_style(cls, style_obj, background, foreground):
+        name = cls._styles.get((background, foreground))
+        if name is None:
+            name = f"LesionToggle{len(cls._styles) + 1}.TButton"
+            style_obj.configure(name, font=('Inter', 10, 'bold'), padding=(10, 15), borderwidth=2, relief='raised')
+            style_obj.map(name, background=[('!disabled', background), ('active', background)],
+                          foreground=[('!disabled', foreground), ('active', foreground)])
+            cls._styles[(background, foreground)] = name
+        return name
 
     def _toggle_state(self):
         self._state = not self._state
@@ -218,20 +226,10 @@ class ToggleButton(ttk.Button):
             self._command(self._state) # Pass the new state (True/False) to the callback
 
     def _update_appearance(self):
-        # Update the button's text based on its internal state
         if self._state:
-            self.config(text=self.text_on)
-            # When state is ON (INTACT), ensure its background is bg_on
-            self.style_obj.map(self.unique_style_name,
-                               background=[('!disabled', self.bg_on), ('active', self.bg_on)],
-                               foreground=[('!disabled', self.fg_on), ('active', self.fg_on)])
+            self.config(text=self.text_on, style=self.style_on)
         else:
-            self.config(text=self.text_off)
-            # When state is OFF (LESION), ensure its background is bg_off
-            self.style_obj.map(self.unique_style_name,
-                               background=[('!disabled', self.bg_off), ('active', self.bg_off)],
-                               foreground=[('!disabled', self.fg_off), ('active', self.fg_off)])
-
+            self.config(text=self.text_off, style=self.style_off)
 
     def get_state(self):
         return self._state
@@ -242,12 +240,606 @@ class ToggleButton(ttk.Button):
             self._update_appearance()
 
 
+# --- Bounded Console Log (backs the "Arduino Serial Output" panel) ---
+# The Text widget only ever holds a small window of lines. The full history lives in a
+# fixed-capacity deque, so memory stays flat on long sessions and filters/scroll-back are
+# applied to the deque rather than by searching the widget.
+class ConsoleLog:
+    KIND_DATA = "DATA"
+    KIND_DBG = "DBG"
+    KIND_OTHER = "OTHER"
+
+    def __init__(self, text_widget, capacity=20000, window=500):
+        self.text_widget = text_widget
+        self.capacity = capacity
+        self.window = window # Max lines rendered in the widget at once
+        self.buffer = collections.deque(maxlen=capacity) # (kind, line) tuples
+        self.filters = {self.KIND_DATA: True, self.KIND_DBG: True, self.KIND_OTHER: True}
+        self.paused = False
+        self._rendered_lines = 0
+        self._snapshot = None # Filtered lines frozen at pause time, used for paging
+        self._snapshot_end = 0 # Exclusive end index of the page shown from _snapshot
+
+    @classmethod
+    def classify(cls, line):
+        if line.startswith("DATA|"):
+            return cls.KIND_DATA
+        if line.startswith("DBG|"):
+            return cls.KIND_DBG
+        return cls.KIND_OTHER
+
+    def append_lines(self, lines):
+        # Ingestion never stops, even while the view is paused
+        visible = []
+        filters = self.filters
+        for line in lines:
+            kind = self.classify(line)
+            self.buffer.append((kind, line))
+            if filters[kind]:
+                visible.append(line)
+        if visible and not self.paused:
+            self._append_to_widget(visible)
+
+    def _append_to_widget(self, lines):
+        # Only the tail of a large burst can ever be visible
+        if len(lines) > self.window:
+            lines = lines[-self.window:]
+        widget = self.text_widget
+        widget.config(state=tk.NORMAL)
+        widget.insert(tk.END, "\n".join(lines) + "\n")
+        self._rendered_lines += len(lines)
+        # Trim in bulk once the widget holds 25% more than the window, not on every line
+        if self._rendered_lines > self.window + self.window // 4:
+            excess = self._rendered_lines - self.window
+            widget.delete("1.0", f"{excess + 1}.0")
+            self._rendered_lines = self.window
+        widget.see(tk.END)
+        widget.config(state=tk.DISABLED)
+
+    def _render(self, lines):
+        widget = self.text_widget
+        widget.config(state=tk.NORMAL)
+        widget.delete("1.0", tk.END)
+        if lines:
+            widget.insert(tk.END, "\n".join(lines) + "\n")
+        self._rendered_lines = len(lines)
+        widget.see(tk.END)
+        widget.config(state=tk.DISABLED)
+
+    def _filtered(self):
+        filters = self.filters
+        return [line for kind, line in self.buffer if filters[kind]]
+
+    def _render_live_tail(self):
+        # Walk the deque from the newest end and stop as soon as the window is full
+        filters = self.filters
+        tail = []
+        for kind, line in reversed(self.buffer):
+            if filters[kind]:
+                tail.append(line)
+                if len(tail) >= self.window:
+                    break
+        tail.reverse()
+        self._render(tail)
+
+    def set_filter(self, kind, enabled):
+        self.filters[kind] = enabled
+        if self.paused:
+            self._snapshot = self._filtered()
+            self._snapshot_end = len(self._snapshot)
+            self._render(self._snapshot[-self.window:])
+        else:
+            self._render_live_tail()
+
+    def set_paused(self, paused):
+        if paused == self.paused:
+            return
+        self.paused = paused
+        if paused:
+            self._snapshot = self._filtered()
+            self._snapshot_end = len(self._snapshot)
+        else:
+            self._snapshot = None
+            self._render_live_tail()
+
+    def page(self, direction):
+        # direction < 0 scrolls back towards older lines; only meaningful while paused
+        if not self.paused or self._snapshot is None:
+            return
+        end = self._snapshot_end + direction * self.window
+        end = constrain(end, min(self.window, len(self._snapshot)), len(self._snapshot))
+        if end != self._snapshot_end:
+            self._snapshot_end = end
+            self._render(self._snapshot[max(0, end - self.window):end])
+
+    def clear(self):
+        self.buffer.clear()
+        if self._snapshot is not None:
+            self._snapshot = []
+            self._snapshot_end = 0
+        self._render([])
+
+
+# --- Scrolling Strip Chart (LDR / threshold / servo traces) ---
+# Drawing is incremental: every trace is one Canvas line item created up front, and a redraw
+# only moves it with coords(); nothing is deleted or recreated per frame.
+# Samples are reduced on arrival into per-pixel min/max buckets kept in a fixed-size ring
+# (one column per plot pixel), so a 10-minute window at any frame rate costs the same to
+# render: two points per pixel per trace, and a spike shorter than a pixel still shows up.
+class StripChart(tk.Canvas):
+    LEFT_MARGIN = 38 # Room for the y-axis labels
+    PANE_GAP = 14
+    REDRAW_INTERVAL = 0.1 # Seconds; traces are redrawn at most this often
+
+    def __init__(self, parent, panes, channels, window_seconds=600, **kwargs):
+        kwargs.setdefault("bg", "#1e1e1e")
+        kwargs.setdefault("highlightthickness", 0)
+        super().__init__(parent, **kwargs)
+        self.panes = panes # [(y_min, y_max)], stacked top to bottom
+        self.channels = channels # [(name, pane index, colour, dash or None)]; add_samples rows follow this order
+        self.window_seconds = window_seconds
+        self._plot_width = max(1, int(self["width"]) - self.LEFT_MARGIN)
+        self._height = int(self["height"])
+        self._bucket_seconds = window_seconds / self._plot_width
+        # Ring of columns [bucket number, min0, max0, min1, max1, ...], newest on the right
+        self._columns = collections.deque(maxlen=self._plot_width)
+        self._dirty = False
+        self._last_redraw = 0.0
+        self._y_transforms = []
+
+        self._pane_items = [(self.create_rectangle(0, 0, 0, 0, outline="#444444"),
+                             self.create_text(0, 0, anchor="ne", fill="#909090", font=('Consolas', 7), text=str(y_max)),
+                             self.create_text(0, 0, anchor="se", fill="#909090", font=('Consolas', 7), text=str(y_min)))
+                            for y_min, y_max in panes]
+        self._legend_items = [self.create_text(0, 0, anchor="nw", fill=colour, font=('Consolas', 8), text=name)
+                              for name, _, colour, _ in channels]
+        self._lines = [self.create_line(0, 0, 0, 0, fill=colour, dash=dash or ()) for _, _, colour, dash in channels]
+        self._layout()
+        self.bind("<Configure>", self._on_resize)
+
+    def add_samples(self, t, rows):
+        # t: monotonic seconds shared by the rows (one GUI tick's worth of frames)
+        bucket = int(t / self._bucket_seconds)
+        columns = self._columns
+        for values in rows:
+            if columns and columns[-1][0] == bucket:
+                column = columns[-1]
+                i = 1
+                for value in values:
+                    if value < column[i]:
+                        column[i] = value
+                    elif value > column[i + 1]:
+                        column[i + 1] = value
+                    i += 2
+            else:
+                column = [bucket]
+                for value in values:
+                    column += (value, value)
+                columns.append(column) # The deque drops the oldest pixel column by itself
+        if rows:
+            self._dirty = True
+
+    def set_window(self, seconds):
+        # Bucket sizes change, so the history restarts
+        self.window_seconds = seconds
+        self._bucket_seconds = seconds / self._plot_width
+        self.clear()
+
+    def clear(self):
+        self._columns.clear()
+        for line in self._lines:
+            self.coords(line, 0, 0, 0, 0)
+
+    def redraw(self, now):
+        if not self._dirty or not self._columns or now - self._last_redraw < self.REDRAW_INTERVAL:
+            return
+        self._dirty = False
+        self._last_redraw = now
+        columns = self._columns
+        newest = columns[-1][0]
+        right = self.LEFT_MARGIN + self._plot_width - 1
+        oldest = newest - self._plot_width + 1 # Columns older than this have scrolled off
+        points = [[] for _ in self.channels]
+        transforms = self._y_transforms
+        for column in columns:
+            bucket = column[0]
+            if bucket < oldest:
+                continue
+            x = right - (newest - bucket)
+            i = 1
+            for trace, (offset, scale) in zip(points, transforms):
+                trace += (x, offset - column[i] * scale, x, offset - column[i + 1] * scale)
+                i += 2
+        for line, trace in zip(self._lines, points):
+            self.coords(line, *trace)
+
+    def _layout(self):
+        pane_height = (self._height - self.PANE_GAP * (len(self.panes) + 1)) / len(self.panes)
+        left = self.LEFT_MARGIN
+        right = left + self._plot_width - 1
+        bounds = []
+        for index, (frame, top_label, bottom_label) in enumerate(self._pane_items):
+            top = self.PANE_GAP + index * (pane_height + self.PANE_GAP)
+            bottom = top + pane_height
+            bounds.append((top, bottom))
+            self.coords(frame, left, top, right, bottom)
+            self.coords(top_label, left - 3, top)
+            self.coords(bottom_label, left - 3, bottom)
+        # y = offset - value * scale maps [y_min, y_max] onto [bottom, top]
+        self._y_transforms = []
+        legend_x = [left + 4] * len(self.panes)
+        for (name, pane, _, _), legend in zip(self.channels, self._legend_items):
+            top, bottom = bounds[pane]
+            y_min, y_max = self.panes[pane]
+            scale = (bottom - top) / (y_max - y_min)
+            self._y_transforms.append((bottom + y_min * scale, scale))
+            self.coords(legend, legend_x[pane], top - self.PANE_GAP + 1)
+            legend_x[pane] += 9 * len(name) + 12
+
+    def _on_resize(self, event):
+        plot_width = max(1, event.width - self.LEFT_MARGIN)
+        if plot_width == self._plot_width and event.height == self._height:
+            return
+        # Re-bucket the existing columns for the new pixel width (min/max merge cleanly)
+        old_seconds = self._bucket_seconds
+        self._plot_width = plot_width
+        self._height = event.height
+        self._bucket_seconds = self.window_seconds / plot_width
+        ratio = old_seconds / self._bucket_seconds
+        merged = collections.deque(maxlen=plot_width)
+        for column in self._columns:
+            bucket = int(column[0] * ratio)
+            if merged and merged[-1][0] == bucket:
+                target = merged[-1]
+                for i in range(1, len(column), 2):
+                    target[i] = min(target[i], column[i])
+                    target[i + 1] = max(target[i + 1], column[i + 1])
+            else:
+                merged.append([bucket] + column[1:])
+        self._columns = merged
+        self._layout()
+        self._dirty = bool(merged)
+        self._last_redraw = 0.0
+
+
+# --- Animated Pupils (ServoL / ServoR) ---
+# Two eyes whose pupils open and close with the servo positions in the telemetry, for when the
+# rig itself is out of sight. Retained mode like StripChart: every item is created once and
+# only moved with coords()/itemconfigure(). A frame just sets the targets; an animation timer
+# eases each pupil towards its target at ANIMATION_HZ and stops once both have settled, so a
+# steady reading costs nothing. Each animation frame has a hard budget: updates are applied
+# in priority order (pupils, then the angle labels) and whatever does not fit in FRAME_BUDGET
+# is carried to the next frame with the newest values.
+class PupilView(tk.Canvas):
+    ANIMATION_HZ = 60
+    FRAME_BUDGET = 0.004 # Seconds of canvas work per animation frame
+    TIME_CONSTANT = 0.08 # Seconds for a pupil to cover ~63% of a change
+    PUPIL_MIN = 0.2 # Pupil radius as a fraction of the iris radius, fully constricted (SERVO_MIN_ANGLE)
+    PUPIL_MAX = 0.8 # ... and fully dilated (SERVO_MAX_ANGLE)
+
+    def __init__(self, parent, **kwargs):
+        kwargs.setdefault("bg", "#1e1e1e")
+        kwargs.setdefault("highlightthickness", 0)
+        super().__init__(parent, **kwargs)
+        self._width = int(self["width"])
+        self._height = int(self["height"])
+        self._interval_ms = max(1, int(round(1000 / self.ANIMATION_HZ)))
+        self._targets = [SERVO_MAX_ANGLE, SERVO_MAX_ANGLE] # Servo angles from the latest frame
+        self._shown = [float(SERVO_MAX_ANGLE)] * 2 # Animated servo angles
+        self._drawn_pupils = [None, None] # Pupil radius last written, in half pixels
+        self._drawn_labels = [None, None]
+        self._after_id = None
+        self._last_step = 0.0
+        self.frames_drawn = 0
+        self.frames_over_budget = 0 # Frames that left updates for the next one
+
+        self._eyes = []
+        for name in ("Left", "Right"):
+            self._eyes.append((self.create_oval(0, 0, 0, 0, fill="#E8E8E8", outline="#909090"), # Sclera
+                               self.create_oval(0, 0, 0, 0, fill="#4E7DA6", outline="#2F4F6F"), # Iris
+                               self.create_oval(0, 0, 0, 0, fill="black", outline=""), # Pupil
+                               self.create_text(0, 0, anchor="nw", fill="#909090", font=('Consolas', 8), text=name),
+                               self.create_text(0, 0, anchor="ne", fill="#e0e0e0", font=('Consolas', 8), text="---")))
+        self._layout()
+        self.bind("<Configure>", self._on_resize)
+
+    def set_servos(self, servo_l, servo_r):
+        if servo_l == self._targets[0] and servo_r == self._targets[1]:
+            return
+        self._targets = [servo_l, servo_r]
+        if self._after_id is None:
+            self._last_step = time.perf_counter()
+            self._after_id = self.after(self._interval_ms, self._animate)
+
+    def destroy(self):
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+            self._after_id = None
+        super().destroy()
+
+    def _pupil_radius(self, servo):
+        fraction = (constrain(servo, SERVO_MIN_ANGLE, SERVO_MAX_ANGLE) - SERVO_MIN_ANGLE) / (SERVO_MAX_ANGLE - SERVO_MIN_ANGLE)
+        return self._iris_radius * (self.PUPIL_MIN + (self.PUPIL_MAX - self.PUPIL_MIN) * fraction)
+
+    def _animate(self):
+        self._after_id = None
+        start = time.perf_counter()
+        alpha = 1.0 - math.exp(-(start - self._last_step) / self.TIME_CONSTANT)
+        self._last_step = start
+
+        updates = [] # (priority order) callables that each make one canvas call
+        for eye in (0, 1):
+            target = self._targets[eye]
+            shown = self._shown[eye] + (target - self._shown[eye]) * alpha
+            if abs(self._pupil_radius(target) - self._pupil_radius(shown)) < 0.25:
+                shown = float(target) # Within a quarter pixel: snap and settle
+            self._shown[eye] = shown
+            half_px = int(round(self._pupil_radius(shown) * 2))
+            if half_px != self._drawn_pupils[eye]:
+                updates.append((self._draw_pupil, eye, half_px))
+        for eye in (0, 1):
+            if self._targets[eye] != self._drawn_labels[eye]:
+                updates.append((self._draw_label, eye, self._targets[eye]))
+
+        deferred = False
+        for update, eye, value in updates:
+            if time.perf_counter() - start > self.FRAME_BUDGET:
+                deferred = True
+                break
+            update(eye, value)
+        self.frames_drawn += 1
+        if deferred:
+            self.frames_over_budget += 1
+        if deferred or self._shown != [float(t) for t in self._targets]:
+            self._after_id = self.after(self._interval_ms, self._animate)
+
+    def _draw_pupil(self, eye, half_px):
+        r = half_px / 2
+        cx, cy = self._centers[eye]
+        self.coords(self._eyes[eye][2], cx - r, cy - r, cx + r, cy + r)
+        self._drawn_pupils[eye] = half_px
+
+    def _draw_label(self, eye, servo):
+        self.itemconfigure(self._eyes[eye][4], text=f"Servo {servo}°")
+        self._drawn_labels[eye] = servo
+
+    def _layout(self):
+        # Two eyes side by side, captions above
+        caption = 14
+        self._iris_radius = max(4.0, min(self._width / 7, (self._height - caption) / 2 - 4))
+        r = self._iris_radius
+        cy = caption + (self._height - caption) / 2
+        self._centers = [(self._width / 4, cy), (self._width * 3 / 4, cy)]
+        for (cx, cy), (sclera, iris, pupil, name, value) in zip(self._centers, self._eyes):
+            self.coords(sclera, cx - 1.7 * r, cy - 1.05 * r, cx + 1.7 * r, cy + 1.05 * r)
+            self.coords(iris, cx - r, cy - r, cx + r, cy + r)
+            self.coords(name, cx - 1.7 * r, 1)
+            self.coords(value, cx + 1.7 * r, 1)
+        self._drawn_pupils = [None, None]
+        for eye in (0, 1):
+            self._draw_pupil(eye, int(round(self._pupil_radius(self._shown[eye]) * 2)))
+
+    def _on_resize(self, event):
+        if event.width == self._width and event.height == self._height:
+            return
+        self._width = event.width
+        self._height = event.height
+        self._layout()
+
+
+# --- Rig Manager Window (many Arduino rigs from one process) ---
+# A compact grid with one row per rig. Rows are refreshed from DeviceManager.pop_dirty()
+# on a timer, so a rig streaming at full rate costs at most one row update per refresh.
+class RigManagerWindow(tk.Toplevel):
+    REFRESH_MS = 200
+    COLUMNS = (("port", "Port", 150), ("status", "Status", 90), ("ldr_l", "LDR L", 55), ("ldr_r", "LDR R", 55),
+               ("gll", "GLL", 110), ("servo_l", "Servo L", 60), ("servo_r", "Servo R", 60),
+               ("thresholds", "Thresholds", 80), ("lesions", "Lesions", 200))
+
+    def __init__(self, app, manager):
+        super().__init__(app.master)
+        self.app = app
+        self.manager = manager
+        self.title("Rig Manager")
+        self.geometry("1000x400")
+        self._row_values = {} # port -> tuple last written to the Treeview
+        self.protocol_runner = None
+
+        controls = ttk.Frame(self, padding="10")
+        controls.pack(fill="x")
+        ttk.Label(controls, text="Port:").pack(side="left", padx=5)
+        self.port_combobox = ttk.Combobox(controls, width=30, values=list(app.port_combobox['values']), font=('Inter', 10))
+        self.port_combobox.pack(side="left", padx=5)
+        ttk.Button(controls, text="Add", command=self.add_rig, style='Connect.TButton').pack(side="left", padx=2)
+        ttk.Button(controls, text="Remove", command=self.remove_selected, style='Disconnect.TButton').pack(side="left", padx=2)
+        ttk.Button(controls, text="Connect All", command=self.manager.connect_all, style='Connect.TButton').pack(side="left", padx=10)
+        ttk.Button(controls, text="Disconnect All", command=self.disconnect_all, style='Disconnect.TButton').pack(side="left", padx=2)
+
+        self.tree = ttk.Treeview(self, columns=[c[0] for c in self.COLUMNS], show="headings", selectmode="extended")
+        for key, heading, width in self.COLUMNS:
+            self.tree.heading(key, text=heading)
+            self.tree.column(key, width=width, anchor="w")
+        self.tree.pack(fill="both", expand=True, padx=10)
+
+        # Broadcast actions use the thresholds/lesions currently set in the main window
+        actions = ttk.Frame(self, padding="10")
+        actions.pack(fill="x")
+        ttk.Button(actions, text="Thresholds → Selected", command=lambda: self.apply_thresholds(self.selected_ports())).pack(side="left", padx=2)
+        ttk.Button(actions, text="Thresholds → All", command=lambda: self.apply_thresholds(None)).pack(side="left", padx=2)
+        ttk.Button(actions, text="Lesions → Selected", command=lambda: self.apply_lesions(self.selected_ports())).pack(side="left", padx=10)
+        ttk.Button(actions, text="Lesions → All", command=lambda: self.apply_lesions(None)).pack(side="left", padx=2)
+        # Scripted protocols run against the selected rigs, or every live rig if none are selected
+        self.protocol_button = ttk.Button(actions, text="Run Protocol...", command=self.run_protocol)
+        self.protocol_button.pack(side="left", padx=10)
+        self.stop_protocol_button = ttk.Button(actions, text="Stop", command=self.stop_protocol, state=tk.DISABLED)
+        self.stop_protocol_button.pack(side="left", padx=2)
+        self.protocol_label = ttk.Label(actions, text="")
+        self.protocol_label.pack(side="left", padx=10)
+
+        for rig in self.manager.rigs.values():
+            self._update_row(rig)
+        self.after(self.REFRESH_MS, self._refresh)
+
+    def selected_ports(self):
+        return list(self.tree.selection())
+
+    def add_rig(self):
+        port = self.port_combobox.get().strip()
+        if not port:
+            return
+        wokwi_url = self.app.WOKWI_URL if port == self.app.WOKWI_PORT_NAME else None
+        rig = self.manager.add_rig(port, wokwi_url)
+        rig.high_threshold = self.app.ldr_high_threshold.get()
+        rig.low_threshold = self.app.ldr_low_threshold.get()
+        rig.lesion_states = {name: var.get() for name, var in self.app.lesion_states.items()}
+        self._update_row(rig)
+        self.manager.connect(port)
+
+    def remove_selected(self):
+        for port in self.selected_ports():
+            self.manager.remove_rig(port)
+            self.tree.delete(port)
+            self._row_values.pop(port, None)
+
+    def disconnect_all(self):
+        for port in list(self.manager.rigs):
+            self.manager.disconnect(port)
+
+    def apply_thresholds(self, ports):
+        high = self.app.ldr_high_threshold.get()
+        low = self.app.ldr_low_threshold.get()
+        if high >= low:
+            messagebox.showwarning("Threshold Warning", "High Intensity Threshold must be less than Low Intensity Threshold for correct LDR behavior.", parent=self)
+            return
+        self.manager.apply_thresholds(high, low, ports)
+        for rig in self.manager.rigs.values():
+            self._update_row(rig)
+
+    def apply_lesions(self, ports):
+        states = {name: var.get() for name, var in self.app.lesion_states.items()}
+        self.manager.apply_lesions(states, ports)
+        for rig in self.manager.rigs.values():
+            self._update_row(rig)
+
+    def run_protocol(self):
+        if self.protocol_runner is not None:
+            return
+        ports = [port for port in (self.selected_ports() or list(self.manager.rigs))
+                 if self.manager.rigs[port].status == self.manager.rigs[port].STATUS_LIVE]
+        if not ports:
+            messagebox.showwarning("Run Protocol", "Connect at least one rig first.", parent=self)
+            return
+        path = filedialog.askopenfilename(title="Run protocol", parent=self,
+                                          filetypes=[("Protocol", "*.txt"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            steps = load_protocol(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Protocol Error", str(e), parent=self)
+            return
+        out_path = filedialog.asksaveasfilename(title="Write protocol results to", parent=self, defaultextension=".json",
+                                                filetypes=[("JSON", "*.json"), ("CSV", "*.csv")])
+        if not out_path:
+            return
+        self.protocol_runner = ProtocolRunner(self.manager, steps, ports,
+                                              on_result=lambda result: self._post(self.on_protocol_result, result),
+                                              on_finished=lambda results, error: self._post(self.on_protocol_finished,
+                                                                                            results, error, out_path))
+        self.protocol_button.config(state=tk.DISABLED)
+        self.stop_protocol_button.config(state=tk.NORMAL)
+        self.protocol_label.config(text=f"Running {os.path.basename(path)} on {len(ports)} rig(s)...")
+        self.app.update_console(f"[Protocol] Running {path} on {', '.join(ports)}")
+        self.protocol_runner.start()
+
+    def stop_protocol(self):
+        if self.protocol_runner is not None:
+            self.protocol_runner.stop()
+
+    def _post(self, callback, *args):
+        # Runner thread -> Tk thread; the window may already be gone
+        try:
+            self.after(0, callback, *args)
+        except (RuntimeError, tk.TclError):
+            pass
+
+    def on_protocol_result(self, result):
+        if not result["ok"]:
+            self.app.update_console(f"[Protocol] line {result['line']} {result['op']} [{result['label'] or '-'}] "
+                                    f"on {result['rig']}: {result['error']}")
+
+    def on_protocol_finished(self, results, error, out_path):
+        self.protocol_runner = None
+        self.protocol_button.config(state=tk.NORMAL)
+        self.stop_protocol_button.config(state=tk.DISABLED)
+        if error is not None:
+            self.protocol_label.config(text="Protocol failed")
+            self.app.update_console(f"[Protocol] Stopped: {error}")
+            return
+        try:
+            write_results(results, out_path)
+        except OSError as e:
+            messagebox.showerror("Protocol Error", f"Could not write {out_path}: {e}", parent=self)
+        passed = sum(result["ok"] for result in results)
+        self.protocol_label.config(text=f"{passed}/{len(results)} passed")
+        self.app.update_console(f"[Protocol] {summarize(results)}\n[Protocol] Results written to {out_path}")
+
+    @staticmethod
+    def _row_for(rig):
+        frame = rig.frame
+        status = rig.status if rig.status != rig.STATUS_ERROR else f"error: {rig.last_error}"
+        # Prefer the lesion state the rig reports; fall back to what we last sent it
+        mask = frame.lesion_mask if frame is not None else rig.lesion_mask
+        lesions = ",".join(field for bit, field in enumerate(LESION_FIELDS) if (mask >> bit) & 1) or "all intact"
+        if frame is None:
+            return (rig.port, status, "---", "---", "---", "---", "---", f"{rig.high_threshold}/{rig.low_threshold}", lesions)
+        return (rig.port, status, frame.ldr_l, frame.ldr_r, frame.gll.name, frame.servo_l, frame.servo_r,
+                f"{rig.high_threshold}/{rig.low_threshold}", lesions)
+
+    def _update_row(self, rig):
+        values = self._row_for(rig)
+        if self._row_values.get(rig.port) == values:
+            return
+        if rig.port in self._row_values:
+            self.tree.item(rig.port, values=values)
+        else:
+            self.tree.insert("", tk.END, iid=rig.port, values=values)
+        self._row_values[rig.port] = values
+
+    def _refresh(self):
+        for rig in self.manager.pop_dirty():
+            self._update_row(rig)
+        self.after(self.REFRESH_MS, self._refresh)
+
+
 # --- Main Application Class ---
 class IrisControllerApp:
-    def __init__(self, master):
+    # --- UI update pipeline tuning ---
+    # The reader thread never touches Tk directly; it pushes raw lines into a bounded queue
+    # which the GUI drains once per tick. At 30 Hz this is far faster than the firmware's
+    # 150 ms loop while still batching bursts into a single console insert.
+    DEFAULT_UI_TICK_HZ = 30
+    UI_QUEUE_MAXSIZE = 5000 # Lines; if the GUI falls this far behind, new lines are dropped
+    TELEMETRY_HANDSHAKE_MS = 1500 # How long to wait for the firmware to acknowledge SET_TELEM:BIN
+    WOKWI_PORT_NAME = "Wokwi RFC2217 (localhost:4000)"
+    WOKWI_URL = "rfc2217://localhost:4000"
+    READER_STATS_INTERVAL = 1.0 # Seconds between reads/s and bytes/read updates
+    ORACLE_GRACE_PERIOD = 0.5 # Seconds of in-flight frames to ignore after changing thresholds
+    REPLAY_SPEEDS = {"1×": 1.0, "10×": 10.0, "Max": None} # None = as fast as the GUI drains it
+    CHART_WINDOWS = {"30 s": 30, "2 min": 120, "10 min": 600} # Strip chart time spans
+    STATE_KEY = "SET_STATE" # Command channel key for the combined lesion/threshold state
+    STATS_PANEL_INTERVAL = 0.5 # Seconds between stats panel refreshes while it is shown
+    METRICS_INTERVAL = 0.5 # Seconds between reflex metrics label refreshes
+    TELEMETRY_PERIODS = {"50 ms": 50, "150 ms": 150, "500 ms": 500, "1 s": 1000}
+    REPORT_CHOICES = {"Every frame": REPORT_ALL, "Changes only": REPORT_CHANGES}
+    # What the sketch boots with; the sync after a (re)connect only sends settings that differ
+    FIRMWARE_TELEMETRY_DEFAULTS = {period_command(DEFAULT_TELEMETRY_PERIOD_MS), debug_command(True),
+                                   report_command(REPORT_ALL)}
+
+    def __init__(self, master, ui_tick_hz=DEFAULT_UI_TICK_HZ):
         self.master = master
         master.title("Iris Reflex Simulation") # Simplified title
-        master.geometry("800x600") # Adjusted smaller window size
+        master.geometry("800x900") # Room for the strip chart, its metrics line and the telemetry controls
         master.resizable(True, True)
 
         self.style = ttk.Style()
@@ -263,31 +855,97 @@ class IrisControllerApp:
         self.style.configure('Disconnect.TButton', background='#F44336', foreground='white')
         self.style.map('Disconnect.TButton', background=[('active', '!disabled', '#EF5350')])
         self.style.configure('Mode.TRadiobutton', font=('Inter', 12, 'bold'), background='#f0f0f0')
+        # Lesion state reported by the firmware: one style per state, shared by all eight labels
+        self.style.configure('Intact.Reported.TLabel', font=('Inter', 9, 'bold'), foreground='#2E7D32')
+        self.style.configure('Lesion.Reported.TLabel', font=('Inter', 9, 'bold'), foreground='#C62828')
+        self.style.configure('Unknown.Reported.TLabel', font=('Inter', 9, 'bold'), foreground='#9E9E9E')
         # Removed the global 'Lesion.TButton' configure/map as it's now handled by each ToggleButton instance
 
 
         self.serial_port = None
-        self.ser = None
-        self.read_thread = None
-        self.running = False
-        self.arduino_data = {} # Dictionary to store parsed data from Arduino
+        self.connection = None # serial_link.SerialConnection from Connect until Disconnect (any state)
+        self.reader = None # Has stats_snapshot(): the connection, or a ReplayReader during replay
+        self._want_binary = False # Snapshot of the Binary telemetry box at connect, for the sync burst
+        self.device_manager = None # Created on first use of the Rig Manager window
+        self.rig_manager_window = None
+        self.reader_rates = {'reads_per_sec': 0.0, 'bytes_per_read': 0.0}
+        self._reader_sample = None # (reads, bytes, monotonic time) at the last rate update
+        self.arduino_data = None # Latest telemetry.DataFrame decoded from the Arduino
+        self.telemetry_decoder = TelemetryStreamDecoder()
+        self.binary_telemetry = tk.BooleanVar(value=True) # Ask real boards for compact binary frames
+        self.io_process = tk.BooleanVar(value=False) # Serial I/O in a worker process (serial_worker)
+        self.share_telemetry = tk.BooleanVar(value=False)
+        self.telemetry_server = None # telemetry_server.TelemetryServer while sharing on localhost
+        self.recorder = None # recorder.TelemetryRecorder while recording
+        self.replay = None # recorder.Recording being replayed (self.reader is then its ReplayReader)
+        self.replay_speed = tk.StringVar(value="1×")
+        self.replay_start = tk.DoubleVar(value=0.0) # Seconds into the recording
+        # Firmware telemetry rate/verbosity. DBG| lines are off by default: they are twice the
+        # size of a DATA line and the GUI only shows them in the console.
+        self.telemetry_period = tk.StringVar(value="150 ms")
+        self.report_choice = tk.StringVar(value="Every frame")
+        self.debug_output = tk.BooleanVar(value=False)
+        self._telemetry_settings = (DEFAULT_TELEMETRY_PERIOD_MS, False, REPORT_ALL) # Plain copy for the connection thread
+        self._minimized = False # Window iconified: the board is told to go quiet
+
+        # Reader thread -> GUI hand-off (see _ui_tick)
+        self.ui_tick_ms = max(1, int(round(1000 / ui_tick_hz)))
+        self.ui_queue = queue.Queue(maxsize=self.UI_QUEUE_MAXSIZE)
+        # Pipeline counters. Each one has a single writer thread, so no lock is needed:
+        # 'dropped' is written by the reader thread, everything else by the Tk thread.
+        self.ui_stats = {
+            'queue_depth': 0,      # Lines waiting at the start of the last tick
+            'max_queue_depth': 0,  # High-water mark since startup
+            'lines_applied': 0,    # Lines appended to the console
+            'frames_applied': 0,   # DATA frames actually rendered to the labels
+            'frames_coalesced': 0, # DATA frames superseded by a newer one in the same tick
+            'dropped': 0,          # Lines discarded because the queue was full
+            'malformed': 0,        # DATA lines rejected by the decoder
+            'oracle_mismatches': 0, # Frames that disagree with reflex_engine's prediction
+        }
+        # Thresholds the firmware is running with (it boots with the defaults), for the oracle check
+        self.applied_thresholds = (DEFAULT_HIGH_THRESHOLD, DEFAULT_LOW_THRESHOLD)
+        self._oracle_grace_until = 0.0
+        # Per-stage latency histograms; off (one attribute check per hook) until the Stats panel is shown
+        self.instrumentation = PipelineInstrumentation()
+        self._stats_panel_refreshed = 0.0
+        # Latency/amplitude/RAPD, fed every frame on the reader thread and shown by the GUI tick
+        self.reflex_metrics = ReflexMetrics()
+        self._metrics_refreshed = 0.0
+        # Widget state with change detection; the GUI tick applies what changed, once
+        self.view = ViewModel()
 
         # No current_mode StringVar needed as it's fixed to REFLEX
-        self.ldr_high_threshold = tk.IntVar(value=400)
-        self.ldr_low_threshold = tk.IntVar(value=600)
+        self.ldr_high_threshold = tk.IntVar(value=DEFAULT_HIGH_THRESHOLD)
+        self.ldr_low_threshold = tk.IntVar(value=DEFAULT_LOW_THRESHOLD)
 
         # Mapping of lesion pin numbers to their names for GUI and commands
-        # These pin numbers MUST match the Arduino sketch's pin definitions
-        self.lesion_pins = {
-            "Optic Nerve Left": 2, "Optic Nerve Right": 3, # Renamed from Afferent
-            "PTN Left": 4, "PTN Right": 5,
-            "EWP Left": 6, "EWP Right": 7,
-            "CN3 Left": 8, "CN3 Right": 11
-        }
+        # These pin numbers MUST match the Arduino sketch's pin definitions (see telemetry.LESION_PINS)
+        self.lesion_pins = dict(LESION_PINS)
         self.lesion_states = {name: tk.BooleanVar(value=True) for name in self.lesion_pins} # True=intact, False=lesion
+        # Plain copy of the lesion states sent to the board; read by the connection thread when resyncing
+        self.applied_lesions = {name: True for name in self.lesion_pins}
+
+        # Port list: kept current by a background hot-plug watcher. The last board that went live
+        # is remembered by USB identity, so it is found again under whatever name it comes back as.
+        self.ports = [] # port_watcher.PortInfo list from the last scan
+        self.port_memory = PortMemory()
+        self.auto_connect = tk.BooleanVar(value=self.port_memory.auto_connect)
+        self._port_chosen_by_user = False
+        self.port_watcher = PortWatcher(lambda: _import_serial().tools.list_ports.comports(),
+                                        self._post_ports_changed, self._post_port_error)
+        self._startup_probe = os.environ.get(STARTUP_PROBE_ENV) # File to log startup milestones to, if set
+        self._startup_marks = set()
 
         self.create_widgets()
-        self.update_port_list()
+        self.port_combobox.set("Scanning ports...")
+        self.port_watcher.start()
+        if self._startup_probe:
+            # Idle callbacks run in order, so this fires after the first layout and paint
+            self.master.after_idle(self._startup_mark, "window")
+        self.master.bind("<Unmap>", lambda event: self.on_window_mapped(event, False), add="+")
+        self.master.bind("<Map>", lambda event: self.on_window_mapped(event, True), add="+")
+        self.master.after(self.ui_tick_ms, self._ui_tick)
 
     def create_widgets(self):
         main_frame = ttk.Frame(self.master, padding="15")
@@ -295,7 +953,8 @@ class IrisControllerApp:
         main_frame.grid_columnconfigure(0, weight=1)
         main_frame.grid_columnconfigure(1, weight=1)
         main_frame.grid_rowconfigure(1, weight=1) # LDR/Lesion row
-        main_frame.grid_rowconfigure(2, weight=1) # Console output row
+        main_frame.grid_rowconfigure(2, weight=1) # Strip chart row
+        main_frame.grid_rowconfigure(3, weight=1) # Console output row
 
         # --- Top: Port Selection ---
         top_frame = ttk.Frame(main_frame, padding="10")
@@ -316,6 +975,52 @@ class IrisControllerApp:
         self.disconnect_button = ttk.Button(top_frame, text="Disconnect", command=self.disconnect_serial, state=tk.DISABLED, style='Disconnect.TButton')
         self.disconnect_button.grid(row=0, column=4, padx=5, pady=2)
 
+        ttk.Checkbutton(top_frame, text="Binary telemetry", variable=self.binary_telemetry).grid(row=0, column=5, padx=5, pady=2)
+
+        ttk.Button(top_frame, text="Rigs...", command=self.open_rig_manager).grid(row=0, column=6, padx=5, pady=2)
+
+        ttk.Checkbutton(top_frame, text="Auto-connect", variable=self.auto_connect,
+                        command=self.on_auto_connect_change).grid(row=0, column=7, padx=5, pady=2)
+
+        # Recording / replay
+        session_frame = ttk.Frame(top_frame)
+        session_frame.grid(row=1, column=0, columnspan=8, sticky="ew", pady=(5, 0))
+        self.record_button = ttk.Button(session_frame, text="Record...", command=self.toggle_recording)
+        self.record_button.pack(side="left", padx=5)
+        self.replay_button = ttk.Button(session_frame, text="Replay...", command=self.toggle_replay)
+        self.replay_button.pack(side="left", padx=5)
+        ttk.Label(session_frame, text="Speed:").pack(side="left", padx=(10, 2))
+        ttk.Combobox(session_frame, textvariable=self.replay_speed, values=list(self.REPLAY_SPEEDS), width=5,
+                     state="readonly").pack(side="left")
+        ttk.Label(session_frame, text="From (s):").pack(side="left", padx=(10, 2))
+        ttk.Entry(session_frame, textvariable=self.replay_start, width=8).pack(side="left")
+        self.session_label = ttk.Label(session_frame, text="")
+        self.session_label.pack(side="left", padx=10)
+        self.connection_label = ttk.Label(session_frame, text="Disconnected")
+        self.connection_label.pack(side="right", padx=5)
+        self.rig_state_label = ttk.Label(session_frame, text="")
+        self.rig_state_label.pack(side="right", padx=5)
+
+        # Firmware telemetry rate and verbosity; applied immediately while connected
+        telemetry_frame = ttk.Frame(top_frame)
+        telemetry_frame.grid(row=2, column=0, columnspan=8, sticky="ew", pady=(5, 0))
+        ttk.Label(telemetry_frame, text="Telemetry every:").pack(side="left", padx=(5, 2))
+        period_box = ttk.Combobox(telemetry_frame, textvariable=self.telemetry_period, values=list(self.TELEMETRY_PERIODS),
+                                  width=7, state="readonly")
+        period_box.pack(side="left")
+        period_box.bind("<<ComboboxSelected>>", self.apply_telemetry_settings)
+        ttk.Label(telemetry_frame, text="Report:").pack(side="left", padx=(10, 2))
+        report_box = ttk.Combobox(telemetry_frame, textvariable=self.report_choice, values=list(self.REPORT_CHOICES),
+                                  width=13, state="readonly")
+        report_box.pack(side="left")
+        report_box.bind("<<ComboboxSelected>>", self.apply_telemetry_settings)
+        ttk.Checkbutton(telemetry_frame, text="DBG lines", variable=self.debug_output,
+                        command=self.apply_telemetry_settings).pack(side="left", padx=10)
+        # Takes effect on the next Connect
+        ttk.Checkbutton(telemetry_frame, text="I/O process", variable=self.io_process).pack(side="left", padx=10)
+        ttk.Checkbutton(telemetry_frame, text="Share on localhost", variable=self.share_telemetry,
+                        command=self.toggle_sharing).pack(side="left", padx=10)
+
         # --- Middle Row: LDR/Thresholds (Left) & Lesion Switches (Right) ---
         # LDR & Threshold Frame
         ldr_frame = ttk.LabelFrame(main_frame, text="Light Sensor (LDR) Control", padding="10")
@@ -352,6 +1057,10 @@ class IrisControllerApp:
         self.set_ldr_button = ttk.Button(ldr_frame, text="Apply LDR Thresholds", command=self.send_ldr_thresholds, style='Connect.TButton')
         self.set_ldr_button.grid(row=6, column=0, columnspan=4, pady=10)
 
+        # Pupils driven by ServoL/ServoR
+        self.pupil_view = PupilView(ldr_frame, width=340, height=90)
+        self.pupil_view.grid(row=7, column=0, columnspan=4, sticky="ew")
+
 
         # Lesion Switches Frame
         lesion_frame = ttk.LabelFrame(main_frame, text="Neural Pathway Lesions", padding="10")
@@ -382,165 +1091,636 @@ class IrisControllerApp:
             self.lesion_toggle_buttons[name_r] = btn_r
             row_idx += 1
 
+        # What the board says it is running (the lesion section of each DATA frame)
+        reported_frame = ttk.Frame(lesion_frame)
+        reported_frame.grid(row=row_idx, column=0, columnspan=2, pady=(5, 0))
+        ttk.Label(reported_frame, text="Board reports:", font=('Inter', 9)).pack(side="left", padx=(0, 4))
+        self.reported_lesion_labels = {}
+        for field in LESION_FIELDS:
+            label = ttk.Label(reported_frame, text=field, style='Unknown.Reported.TLabel')
+            label.pack(side="left", padx=3)
+            self.reported_lesion_labels[field] = label
+
+        # Strip chart: LDRs against the thresholds (top), servo commands (bottom)
+        chart_frame = ttk.LabelFrame(main_frame, text="Live Traces", padding="5")
+        chart_frame.grid(row=2, column=0, columnspan=2, padx=10, pady=5, sticky="nsew")
+        chart_frame.grid_rowconfigure(1, weight=1)
+        chart_frame.grid_columnconfigure(0, weight=1)
+        chart_controls = ttk.Frame(chart_frame)
+        chart_controls.grid(row=0, column=0, sticky="ew")
+        ttk.Label(chart_controls, text="Window:").pack(side="left", padx=(0, 2))
+        self.chart_window = tk.StringVar(value="10 min")
+        chart_window_box = ttk.Combobox(chart_controls, textvariable=self.chart_window, values=list(self.CHART_WINDOWS),
+                                        width=7, state="readonly")
+        chart_window_box.pack(side="left")
+        chart_window_box.bind("<<ComboboxSelected>>", self.on_chart_window_change)
+        self.strip_chart = StripChart(chart_frame, panes=[(0, 1023), (0, 180)],
+                                      channels=[("LDR_L", 0, "#4FC3F7", None), ("LDR_R", 0, "#FFB74D", None),
+                                                ("High", 0, "#E57373", (4, 2)), ("Low", 0, "#81C784", (4, 2)),
+                                                ("ServoL", 1, "#4FC3F7", None), ("ServoR", 1, "#FFB74D", None)],
+                                      window_seconds=self.CHART_WINDOWS[self.chart_window.get()], width=760, height=180)
+        self.strip_chart.grid(row=1, column=0, sticky="nsew")
+        metrics_row = ttk.Frame(chart_frame)
+        metrics_row.grid(row=2, column=0, sticky="ew", pady=(2, 0))
+        self.metrics_label = ttk.Label(metrics_row, text="", font=('Consolas', 8))
+        self.metrics_label.pack(side="left")
+        ttk.Button(metrics_row, text="Reset metrics", command=self.reset_reflex_metrics).pack(side="right")
+
         # Console Output
         console_frame = ttk.LabelFrame(main_frame, text="Arduino Serial Output (Debug)", padding="10")
-        console_frame.grid(row=2, column=0, columnspan=2, padx=10, pady=10, sticky="nsew")
-        console_frame.grid_rowconfigure(0, weight=1)
+        console_frame.grid(row=3, column=0, columnspan=2, padx=10, pady=10, sticky="nsew")
+        console_frame.grid_rowconfigure(1, weight=1)
         console_frame.grid_columnconfigure(0, weight=1)
 
+        # Console controls: filters, pause and paging through the buffered history
+        console_controls = ttk.Frame(console_frame)
+        console_controls.grid(row=0, column=0, sticky="ew", pady=(0, 5))
+        self.console_filter_vars = {}
+        for kind, label in [(ConsoleLog.KIND_DATA, "DATA"), (ConsoleLog.KIND_DBG, "DBG"), (ConsoleLog.KIND_OTHER, "Other")]:
+            var = tk.BooleanVar(value=True)
+            ttk.Checkbutton(console_controls, text=label, variable=var,
+                            command=lambda k=kind, v=var: self.console_log.set_filter(k, v.get())).pack(side="left", padx=3)
+            self.console_filter_vars[kind] = var
+        self.console_paused = tk.BooleanVar(value=False)
+        ttk.Checkbutton(console_controls, text="Pause", variable=self.console_paused,
+                        command=lambda: self.console_log.set_paused(self.console_paused.get())).pack(side="left", padx=10)
+        ttk.Button(console_controls, text="Newer", width=6, command=lambda: self.console_log.page(1)).pack(side="right", padx=1)
+        ttk.Button(console_controls, text="Older", width=6, command=lambda: self.console_log.page(-1)).pack(side="right", padx=1)
+        ttk.Button(console_controls, text="Clear", width=6, command=lambda: self.console_log.clear()).pack(side="right", padx=5)
+        self.stats_visible = tk.BooleanVar(value=False)
+        ttk.Checkbutton(console_controls, text="Stats", variable=self.stats_visible,
+                        command=self.toggle_stats_panel).pack(side="left", padx=10)
+
         self.console_text = scrolledtext.ScrolledText(console_frame, width=80, height=10, wrap=tk.WORD, font=('Consolas', 9), bg="#1e1e1e", fg="#e0e0e0", insertbackground="white")
-        self.console_text.grid(row=0, column=0, sticky="nsew")
+        self.console_text.grid(row=1, column=0, sticky="nsew")
         self.console_text.config(state=tk.DISABLED)
-
+        self.console_log = ConsoleLog(self.console_text)
+
+        self.pipeline_stats_label = ttk.Label(console_frame, text="", font=('Consolas', 8))
+        self.pipeline_stats_label.grid(row=2, column=0, sticky="w")
+
+        # Stats panel: per-stage latencies and throughput, shown (and measured) on demand
+        self.stats_frame = ttk.Frame(console_frame)
+        self.stats_frame.grid(row=3, column=0, sticky="ew", pady=(5, 0))
+        self.stats_frame.grid_columnconfigure(0, weight=1)
+        columns = ("count", "mean", "p50", "p90", "p99", "max")
+        self.stats_tree = ttk.Treeview(self.stats_frame, columns=columns, height=len(STAGES))
+        self.stats_tree.heading("#0", text="Stage")
+        self.stats_tree.column("#0", width=110, stretch=False)
+        for column in columns:
+            self.stats_tree.heading(column, text=column)
+            self.stats_tree.column(column, width=80, anchor="e")
+        for stage in STAGES:
+            self.stats_tree.insert("", "end", iid=stage, text=stage)
+        self.stats_tree.grid(row=0, column=0, columnspan=4, sticky="ew")
+        self._stats_rows = {} # iid -> values last written, so unchanged rows cost no Tk call
+        self.stats_counters_label = ttk.Label(self.stats_frame, text="", font=('Consolas', 8))
+        self.stats_counters_label.grid(row=1, column=0, sticky="w")
+        ttk.Button(self.stats_frame, text="Reset", command=self.reset_stats).grid(row=1, column=1, padx=2, pady=2)
+        ttk.Button(self.stats_frame, text="Export JSON...", command=lambda: self.export_stats("json")).grid(row=1, column=2, padx=2, pady=2)
+        ttk.Button(self.stats_frame, text="Export CSV...", command=lambda: self.export_stats("csv")).grid(row=1, column=3, padx=2, pady=2)
+        self.stats_frame.grid_remove()
+
+        self.bind_view()
         self.update_widget_states()
 
+    def bind_view(self):
+        # One binding per widget (or group of widgets that always change together). Initial
+        # values are what the widgets were created with, so setting them again costs nothing.
+        view = self.view
+
+        def label(widget):
+            return lambda text: widget.config(text=text)
+
+        view.bind("ldr_l", label(self.ldr_left_label), "---")
+        view.bind("ldr_r", label(self.ldr_right_label), "---")
+        view.bind("gll", label(self.global_light_label), "---")
+        view.bind("rig_state", label(self.rig_state_label), "")
+        view.bind("pipeline_stats", label(self.pipeline_stats_label), "")
+        view.bind("metrics", label(self.metrics_label), "")
+        for field, widget in self.reported_lesion_labels.items():
+            # None until a frame arrives, then True (intact) or False (lesion)
+            view.bind(f"reported_{field}", lambda intact, widget=widget: widget.config(
+                style='Unknown.Reported.TLabel' if intact is None else
+                'Intact.Reported.TLabel' if intact else 'Lesion.Reported.TLabel'), None)
+
+        def button_state(*widgets):
+            def apply(enabled):
+                state = tk.NORMAL if enabled else tk.DISABLED
+                for widget in widgets:
+                    widget.config(state=state)
+            return apply
+
+        view.bind("can_connect", button_state(self.connect_button))
+        view.bind("can_disconnect", button_state(self.disconnect_button))
+        view.bind("can_replay", button_state(self.replay_button))
+        view.bind("controls_enabled", button_state(self.high_thresh_entry, self.low_thresh_entry, self.set_ldr_button,
+                                                   *self.lesion_toggle_buttons.values()))
+
     def update_port_list(self):
-        ports = serial.tools.list_ports.comports()
-        port_devices = [port.device for port in ports]
-        
-        wokwi_option = "Wokwi RFC2217 (localhost:4000)"
-        if wokwi_option not in port_devices:
-            port_devices.insert(0, wokwi_option)
+        # Refresh button: the watcher scans on its own every couple of seconds; this just
+        # asks for a scan now. Enumeration (and the first pyserial import) stays off the Tk thread.
+        self.port_watcher.rescan()
+
+    def _post_ports_changed(self, ports):
+        # Watcher thread -> Tk thread; only called when the port set actually changed
+        try:
+            self.master.after(0, self.on_ports_changed, ports)
+        except (RuntimeError, tk.TclError):
+            pass # Window already destroyed
 
+    def _post_port_error(self, error):
+        try:
+            self.master.after(0, self.update_console, f"[GUI] Could not list serial ports: {error}")
+        except (RuntimeError, tk.TclError):
+            pass
+
+    def on_ports_changed(self, ports):
+        known = {info.device for info in self.ports}
+        self.ports = ports
+        port_devices = [self.WOKWI_PORT_NAME] + [info.device for info in ports if info.device != self.WOKWI_PORT_NAME]
         self.port_combobox['values'] = port_devices
 
-        if 'COM9' in port_devices:
-            self.port_combobox.set('COM9')
-            self.serial_port = 'COM9'
-        elif wokwi_option in port_devices:
-            self.port_combobox.set(wokwi_option)
-            self.serial_port = wokwi_option
-        elif port_devices:
-            self.port_combobox.set(port_devices[0])
-            self.serial_port = port_devices[0]
-        else:
-            self.port_combobox.set("No ports found")
-            self.serial_port = None
+        # Leave the selection alone unless it vanished, or was never the user's choice and the
+        # remembered board is back. Never touch it while connected.
+        remembered = self.port_memory.find(ports)
+        if self.connection is None and (self.serial_port not in port_devices or
+                                        (remembered and not self._port_chosen_by_user)):
+            choice = remembered or self.WOKWI_PORT_NAME
+            if choice != self.serial_port:
+                self.serial_port = choice
+                self.port_combobox.set(choice)
+                self._port_chosen_by_user = False
         self.update_connection_buttons()
 
+        if remembered and remembered not in known and self.auto_connect.get() and self.replay is None:
+            self.auto_connect_to(remembered)
+        if self._startup_probe:
+            self._startup_mark("ports")
+
+    def auto_connect_to(self, device):
+        connection = self.connection
+        if connection is not None:
+            if connection.port == device or connection.state != SerialConnection.RECONNECTING:
+                return
+            # The board came back under another name; the old connection would retry the old one forever
+            self.disconnect_serial()
+        self.update_console(f"[GUI] Known rig appeared on {device}; connecting.")
+        self.serial_port = device
+        self.port_combobox.set(device)
+        self.connect_serial()
+
+    def on_auto_connect_change(self):
+        self.port_memory.auto_connect = self.auto_connect.get()
+        self.port_memory.save()
+
+    def _startup_mark(self, milestone):
+        # benchmarks/bench_startup.py: log "<milestone> <wall clock>" and quit once the window
+        # has painted and the port list is in. A file rather than stdout, so it also works for
+        # the windowed (console=False) frozen build.
+        if milestone in self._startup_marks:
+            return
+        self._startup_marks.add(milestone)
+        with open(self._startup_probe, "a") as f:
+            f.write(f"{milestone} {time.time():.6f}\n")
+        if {"window", "ports"} <= self._startup_marks:
+            self.master.after(0, self.master.destroy)
+
     def on_port_selected(self, event):
         self.serial_port = self.port_combobox.get()
+        self._port_chosen_by_user = True
         self.update_connection_buttons()
 
     def update_connection_buttons(self):
-        can_connect = bool(self.serial_port and not self.ser)
-        self.connect_button.config(state=tk.NORMAL if can_connect else tk.DISABLED)
-        self.disconnect_button.config(state=tk.NORMAL if self.ser else tk.DISABLED)
+        view = self.view
+        view.set("can_connect", bool(self.serial_port and not self.connection and not self.replay))
+        view.set("can_disconnect", self.connection is not None)
+        view.set("can_replay", self.connection is None)
         self.update_widget_states()
 
     def connect_serial(self):
+        # Returns immediately: opening the port, waiting for the board to boot and the initial
+        # sync all happen on the connection's own thread (see serial_link.SerialConnection)
         if not self.serial_port:
             messagebox.showerror("Connection Error", "Please select a serial port.")
             return
+        if self.connection is not None:
+            return
+        # The board boots with its defaults; sync it to what the controls show now
         try:
-            if self.serial_port == "Wokwi RFC2217 (localhost:4000)":
-                self.ser = serial.serial_for_url('rfc2217://localhost:4000', baudrate=9600)
-            else:
-                self.ser = serial.Serial(self.serial_port, 9600, timeout=1)
-            
-            time.sleep(2)
-            self.ser.flushInput()
-            self.running = True
-            self.read_thread = threading.Thread(target=self.read_from_serial, daemon=True)
-            self.read_thread.start()
-            messagebox.showinfo("Connection Status", f"Connected to {self.serial_port}")
-            self.update_connection_buttons()
-            self.send_command("SET_MODE:REFLEX")
-            self.send_ldr_thresholds()
-            for name, var in self.lesion_states.items():
-                self.send_lesion_state(name, var.get())
-
-        except Exception as e:
-            messagebox.showerror("Connection Error", f"Could not open serial port: {e}")
-            self.ser = None
-            self.running = False
-            self.update_connection_buttons()
+            thresholds = (self.ldr_high_threshold.get(), self.ldr_low_threshold.get())
+            error = validate_thresholds(*thresholds)
+        except tk.TclError as e:
+            error = str(e)
+        if error:
+            thresholds = (DEFAULT_HIGH_THRESHOLD, DEFAULT_LOW_THRESHOLD)
+            self.update_console(f"[GUI] Using default thresholds on connect: {error}")
+        self.applied_thresholds = thresholds
+        # applied_lesions already holds what the lesion buttons show; it is resent as-is
+        self.reset_reflex_metrics()
+        self._telemetry_settings = self.read_telemetry_controls()
+        # Text stays the default on Wokwi (RFC2217 console) and when the user opts out
+        self._want_binary = self.binary_telemetry.get() and self.serial_port != self.WOKWI_PORT_NAME
+
+        wokwi_url = self.WOKWI_URL if self.serial_port == self.WOKWI_PORT_NAME else None
+        if self.io_process.get():
+            # The port, line splitting and parsing live in a worker process that the GUI's
+            # redraws cannot hold up; frames come back through shared memory
+            from serial_worker import WorkerConnection
+            connection_class, serial_module = WorkerConnection, None
+        else:
+            connection_class, serial_module = SerialConnection, _import_serial()
+        connection = connection_class(serial_module, self.serial_port, self.read_from_serial, None, self.sync_commands,
+                                      decoder=self.telemetry_decoder, wokwi_url=wokwi_url,
+                                      instrumentation=self.instrumentation)
+        connection.on_state = lambda state, detail: self._post_connection_state(connection, state, detail)
+        connection.commands.on_result = lambda command, key, result: self._post_command_result(connection, command, key, result)
+        self.connection = connection
+        self.reader = connection
+        self._reader_sample = None
+        connection.start()
+        self.update_connection_buttons()
 
     def disconnect_serial(self):
-        if self.ser and self.ser.is_open:
-            self.running = False
-            if self.read_thread and self.read_thread.is_alive():
-                self.read_thread.join(timeout=1)
-            self.ser.close()
-            messagebox.showinfo("Connection Status", "Disconnected from serial port.")
-        self.ser = None
+        connection, self.connection = self.connection, None
+        if connection is not None:
+            connection.stop()
+            if self.reader is connection:
+                self.reader = None
+            self.connection_label.config(text="Disconnected")
+            self.update_console(f"[GUI] Disconnected from {connection.port}.")
+            self.publish_status(state=SerialConnection.DISCONNECTED)
+            self.clear_reported_lesions()
+        self.update_connection_buttons()
+
+    def sync_commands(self):
+        # Runs on the connection thread after every (re)connect, when the board has just reset
+        # to its defaults. Only plain attributes here: Tk variables are not thread-safe.
+        commands = [(self.STATE_KEY, self.state_command())]
+        if self._want_binary:
+            commands.append(("SET_TELEM", TELEM_BIN_COMMAND))
+        commands += [(key, command) for key, command in self.telemetry_commands()
+                     if command not in self.FIRMWARE_TELEMETRY_DEFAULTS]
+        return commands
+
+    def read_telemetry_controls(self):
+        return (self.TELEMETRY_PERIODS[self.telemetry_period.get()], self.debug_output.get(),
+                self.REPORT_CHOICES[self.report_choice.get()])
+
+    def telemetry_commands(self):
+        # (key, command) pairs for the rate/verbosity the board should run with right now.
+        # Plain attributes only, since sync_commands calls this on the connection thread.
+        period_ms, debug, report = self._telemetry_settings
+        if self._minimized:
+            # Nobody is looking: no telemetry at all, or only the changes while recording
+            report = REPORT_CHANGES if self.recorder is not None else REPORT_OFF
+        return [("SET_PERIOD", period_command(period_ms)), ("SET_DBG", debug_command(debug)),
+                ("SET_REPORT", report_command(report))]
+
+    def apply_telemetry_settings(self, event=None):
+        # Settings the board already acknowledged are skipped by the command channel
+        self._telemetry_settings = self.read_telemetry_controls()
+        for key, command in self.telemetry_commands():
+            self.send_command(command, key)
+
+    def on_window_mapped(self, event, mapped):
+        # <Map>/<Unmap> also fire for every child widget; only the main window matters
+        if event.widget is not self.master or self._minimized != mapped:
+            return
+        self._minimized = not mapped
+        self.apply_telemetry_settings()
+
+    def state_command(self):
+        return state_command(lesion_mask_from_states(self.applied_lesions), *self.applied_thresholds)
+
+    def _post_connection_state(self, connection, state, detail):
+        # Connection thread -> Tk thread
+        try:
+            self.master.after(0, self.on_connection_state, connection, state, detail)
+        except (RuntimeError, tk.TclError):
+            pass # Window already destroyed
+
+    def _post_command_result(self, connection, command, key, result):
+        # Command writer thread -> Tk thread
+        try:
+            self.master.after(0, self.on_command_result, connection, command, key, result)
+        except (RuntimeError, tk.TclError):
+            pass
+
+    def on_command_result(self, connection, command, key, result):
+        if connection is not self.connection:
+            return
+        if result != CommandChannel.RESULT_OK:
+            self.update_console(f"[GUI] {command}: {result}")
+        if key == self.STATE_KEY:
+            self.update_rig_state_label()
+
+    def update_rig_state_label(self):
+        # "Confirmed" only when the board has acknowledged exactly what the controls show
+        connection = self.connection
+        if connection is None:
+            text = ""
+        elif connection.commands.confirmed.get(self.STATE_KEY) == self.state_command():
+            text = "Rig state: confirmed"
+        elif connection.is_live() and connection.commands.pending():
+            text = "Rig state: sending..."
+        else:
+            text = "Rig state: NOT confirmed"
+        self.view.set("rig_state", text)
+
+    def on_connection_state(self, connection, state, detail):
+        if connection is not self.connection:
+            return # A connection the user has already closed
+        text = state.capitalize() + (f": {detail}" if detail else "")
+        self.connection_label.config(text=text)
+        self.update_console(f"[GUI] {connection.port}: {text}")
+        self.publish_status(state=state, port=connection.port)
+        if state == SerialConnection.LIVE:
+            self._reader_sample = None
+            key = next((info.key for info in self.ports if info.device == connection.port), None)
+            self.port_memory.remember(connection.port, key)
+            # Frames from before the resync were produced under the board's defaults
+            self._oracle_grace_until = time.monotonic() + self.ORACLE_GRACE_PERIOD
+            if self._want_binary:
+                self.master.after(self.TELEMETRY_HANDSHAKE_MS, self._check_telemetry_handshake)
+        elif state == SerialConnection.DISCONNECTED:
+            # Only reported when the first connect fails; lost live connections retry instead
+            self.connection = None
+            if self.reader is connection:
+                self.reader = None
+        if state in (SerialConnection.RECONNECTING, SerialConnection.DISCONNECTED):
+            self.clear_reported_lesions()
+        self.update_rig_state_label()
         self.update_connection_buttons()
 
-    def read_from_serial(self):
-        while self.running and self.ser and self.ser.is_open:
+    def read_from_serial(self, items):
+        # Runs on the reader thread: hand decoded lines/frames to the GUI tick, never to Tk directly
+        instr = self.instrumentation
+        timed = instr.enabled
+        if timed:
+            start = time.perf_counter()
+            # Replayed frames have no read time; they "arrive" now
+            arrived, instr.last_arrival = instr.last_arrival or start, 0.0
+            instr.arrivals.append(arrived)
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record_items(items)
+        reader = self.reader
+        if isinstance(reader, ReplayReader):
+            # Replayed frames are timed by the recording and judged by the thresholds they were made with,
+            # as analyze_recording does
+            self.reflex_metrics.update_records((t, frame, thresholds[0])
+                                               for frame, (t, thresholds) in zip(items, reader.batch))
+        else:
+            self.reflex_metrics.update_items(items, time.monotonic(), self.applied_thresholds[0])
+        server = self.telemetry_server
+        if server is not None:
+            server.publish_items(items)
+        put = self.ui_queue.put_nowait
+        for item in items:
             try:
-                if self.ser.in_waiting > 0:
-                    line = self.ser.readline().decode('utf-8', errors='replace').strip()
-                    if line:
-                        self.master.after(0, self.update_console, line)
-                        if line.startswith("DATA|"):
-                            self.master.after(0, self.parse_arduino_data, line)
-            except serial.SerialException as e:
-                print(f"Serial read error: {e}")
-                self.running = False
-                self.master.after(0, lambda: messagebox.showerror("Serial Error", f"Serial connection lost: {e}"))
-                self.master.after(0, self.disconnect_serial)
-                break
-            except Exception as e:
-                print(f"Unexpected read error: {e}")
-                self.running = False
-                self.master.after(0, lambda: messagebox.showerror("Error", f"An unexpected error occurred: {e}"))
-                self.master.after(0, self.disconnect_serial)
-                break
-            time.sleep(0.01)
+                put(item)
+            except queue.Full:
+                self.ui_stats['dropped'] += 1
+        if timed:
+            instr.record("handoff", time.perf_counter() - start)
+
+    def _check_telemetry_handshake(self):
+        # Older firmware answers "Unknown command" and simply keeps printing text
+        if self.connection is not None and self.connection.is_live() and self.telemetry_decoder.mode != TelemetryStreamDecoder.MODE_BINARY:
+            self.update_console("[GUI] Binary telemetry not acknowledged; staying in text mode.")
+
+    def _ui_tick(self):
+        instr = self.instrumentation
+        timed = instr.enabled
+        if timed:
+            tick_start = time.perf_counter()
+            newest_arrival = None
+            arrivals = instr.arrivals
+            while arrivals:
+                newest_arrival = arrivals.popleft()
+                instr.record("queue_wait", tick_start - newest_arrival)
+
+        # Drain everything the reader thread queued since the last tick
+        items = []
+        try:
+            while True:
+                items.append(self.ui_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        stats = self.ui_stats
+        stats['queue_depth'] = len(items)
+        if len(items) > stats['max_queue_depth']:
+            stats['max_queue_depth'] = len(items)
+
+        now = time.monotonic()
+        latest_data = None
+        if items:
+            # Only the newest DATA frame matters for the labels; older ones are coalesced.
+            # Every frame still goes to the strip chart, which reduces them to per-pixel min/max.
+            # Binary frames arrive already decoded; the console shows them in the text layout.
+            lines = []
+            chart_rows = []
+            high, low = self.applied_thresholds
+            for item in items:
+                if isinstance(item, DataFrame):
+                    frame = item
+                    lines.append(encode_data_line(item))
+                else:
+                    lines.append(item)
+                    if not item.startswith("DATA|"):
+                        continue
+                    frame = decode_data_line(item)
+                    if frame is None:
+                        stats['malformed'] += 1 # Truncated/garbled line; keep showing the last good frame
+                        continue
+                latest_data = frame
+                chart_rows.append((frame.ldr_l, frame.ldr_r, high, low, frame.servo_l, frame.servo_r))
+
+            # One Text insert for the whole batch
+            if timed:
+                start = time.perf_counter()
+                self.update_console(lines)
+                instr.record("console", time.perf_counter() - start)
+                instr.count("console_lines", len(lines))
+            else:
+                self.update_console(lines)
+            stats['lines_applied'] += len(lines)
+
+            if latest_data is not None:
+                if timed:
+                    start = time.perf_counter()
+                    self.parse_arduino_data(latest_data)
+                    instr.record("parse", time.perf_counter() - start)
+                else:
+                    self.parse_arduino_data(latest_data)
+                stats['frames_applied'] += 1
+                stats['frames_coalesced'] += len(chart_rows) - 1
+                self.strip_chart.add_samples(now, chart_rows)
+
+        self.strip_chart.redraw(now)
+        self.update_reader_rates()
+        self.update_pipeline_stats_label()
+        if now - self._metrics_refreshed >= self.METRICS_INTERVAL:
+            self._metrics_refreshed = now
+            self.update_metrics_label()
+        # Every widget change of this tick, in one pass
+        if timed:
+            start = time.perf_counter()
+            instr.count("widget_updates", self.view.render())
+            end = time.perf_counter()
+            instr.record("render", end - start)
+            if newest_arrival is not None and latest_data is not None:
+                instr.record("end_to_end", end - newest_arrival)
+            instr.record("tick", end - tick_start)
+            if now - self._stats_panel_refreshed >= self.STATS_PANEL_INTERVAL:
+                self._stats_panel_refreshed = now
+                self.update_stats_panel()
+        else:
+            self.view.render()
+        self.master.after(self.ui_tick_ms, self._ui_tick)
 
-    def update_console(self, text):
-        self.console_text.config(state=tk.NORMAL)
-        self.console_text.insert(tk.END, text + "\n")
-        self.console_text.see(tk.END)
-        self.console_text.config(state=tk.DISABLED)
+    def on_chart_window_change(self, event=None):
+        self.strip_chart.set_window(self.CHART_WINDOWS[self.chart_window.get()])
+
+    def update_reader_rates(self):
+        if not self.reader:
+            return
+        reads, bytes_read, now = self.reader.stats_snapshot()
+        if self._reader_sample is None:
+            self._reader_sample = (reads, bytes_read, now)
+            return
+        last_reads, last_bytes, last_time = self._reader_sample
+        elapsed = now - last_time
+        if elapsed < self.READER_STATS_INTERVAL:
+            return
+        delta_reads = reads - last_reads
+        self.reader_rates['reads_per_sec'] = delta_reads / elapsed
+        self.reader_rates['bytes_per_read'] = (bytes_read - last_bytes) / delta_reads if delta_reads else 0.0
+        self._reader_sample = (reads, bytes_read, now)
+
+    def update_pipeline_stats_label(self):
+        stats = self.ui_stats
+        text = (f"Queue: {stats['queue_depth']} (max {stats['max_queue_depth']})  "
+                f"Frames: {stats['frames_applied']}  Coalesced: {stats['frames_coalesced']}  "
+                f"Dropped: {stats['dropped']}  Malformed: {stats['malformed'] + self.telemetry_decoder.bad_frames}  "
+                f"Oracle mismatches: {stats['oracle_mismatches']}  "
+                f"Telemetry: {self.telemetry_decoder.mode}  "
+                f"Reads/s: {self.reader_rates['reads_per_sec']:.1f}  Bytes/read: {self.reader_rates['bytes_per_read']:.0f}")
+        self.view.set("pipeline_stats", text)
+
+    def update_metrics_label(self):
+        self.view.set("metrics", f"Reflex: {self.reflex_metrics.summary_text()}" if self.reflex_metrics.frames else "")
+
+    def reset_reflex_metrics(self):
+        self.reflex_metrics.reset()
+        self.update_metrics_label()
+
+    def toggle_stats_panel(self):
+        # Showing the panel switches the instrumentation on (and starts it from zero)
+        visible = self.stats_visible.get()
+        self.instrumentation.set_enabled(visible)
+        if visible:
+            self.stats_frame.grid()
+            self.update_stats_panel()
+        else:
+            self.stats_frame.grid_remove()
+
+    def reset_stats(self):
+        self.instrumentation.reset()
+        self.update_stats_panel()
+
+    def update_stats_panel(self):
+        snapshot = self.instrumentation.snapshot()
+        for stage, s in snapshot["stages"].items():
+            values = (s["count"],) + tuple(format_us(s[key]) for key in ("mean_us", "p50_us", "p90_us", "p99_us", "max_us"))
+            if self._stats_rows.get(stage) != values:
+                self._stats_rows[stage] = values
+                self.stats_tree.item(stage, values=values)
+        counters = snapshot["counters"]
+        self.stats_counters_label.config(text="  ".join(f"{name}: {c['total']} ({c['per_sec'] or 0:.1f}/s)"
+                                                        for name, c in counters.items()))
+
+    def export_stats(self, kind):
+        path = filedialog.asksaveasfilename(title="Export pipeline stats", defaultextension=f".{kind}",
+                                            filetypes=[(kind.upper(), f"*.{kind}")])
+        if not path:
+            return
+        try:
+            if kind == "json":
+                self.instrumentation.export_json(path)
+            else:
+                self.instrumentation.export_csv(path)
+        except OSError as e:
+            messagebox.showerror("Export Error", f"Could not write {path}: {e}")
+            return
+        self.update_console(f"[GUI] Pipeline stats written to {path}")
+
+    def update_console(self, lines):
+        if isinstance(lines, str):
+            lines = lines.split("\n")
+        self.console_log.append_lines(lines)
 
     def parse_arduino_data(self, line):
-        if line.startswith("DATA|"):
-            parts = line[5:].split('|')
-            data = {}
-            for part in parts:
-                sub_parts = part.split(',')
-                for item in sub_parts:
-                    if ':' in item:
-                        key, value = item.split(':')
-                        data[key.strip()] = value.strip()
-            self.arduino_data = data
-            self.update_gui_from_arduino_data()
+        frame = line if isinstance(line, DataFrame) else decode_data_line(line)
+        if frame is None:
+            self.ui_stats['malformed'] += 1 # Truncated/garbled line; keep showing the last good frame
+            return
+        self.arduino_data = frame
+        self.check_frame_against_engine(frame)
+        self.update_gui_from_arduino_data()
+        instr = self.instrumentation
+        if instr.enabled:
+            instr.count("frames_rendered")
+
+    def check_frame_against_engine(self, frame):
+        # reflex_engine mirrors the firmware, so any disagreement means drift or a wiring fault.
+        # Replayed frames were produced under the thresholds stored in the recording, not ours.
+        if self.replay is not None or time.monotonic() < self._oracle_grace_until:
+            return
+        mismatched = compare_frame(frame, *self.applied_thresholds)
+        if mismatched:
+            self.ui_stats['oracle_mismatches'] += 1
+            if self.ui_stats['oracle_mismatches'] == 1:
+                self.update_console(f"[GUI] Telemetry disagrees with the reflex engine on {', '.join(mismatched)}: {frame!r}")
 
     def update_gui_from_arduino_data(self):
-        if 'LDR_L' in self.arduino_data:
-            self.ldr_left_label.config(text=self.arduino_data['LDR_L'])
-        if 'LDR_R' in self.arduino_data:
-            self.ldr_right_label.config(text=self.arduino_data['LDR_R'])
-        if 'GLL' in self.arduino_data:
-            self.global_light_label.config(text=self.arduino_data['GLL'])
-
-    def send_command(self, command):
-        if self.ser and self.ser.is_open:
-            try:
-                self.ser.write(f"{command}\n".encode('utf-8'))
-            except serial.SerialException as e:
-                messagebox.showerror("Serial Write Error", f"Failed to send command: {e}")
-                self.disconnect_serial()
-            except Exception as e:
-                messagebox.showerror("Error", f"An unexpected error occurred while sending command: {e}")
-                self.disconnect_serial()
-
-    def on_mode_change(self):
-        self.send_command("SET_MODE:REFLEX")
-        self.update_widget_states()
+        frame = self.arduino_data
+        if frame is None:
+            return
+        # Only fields whose value changed reach Tk, at the next render
+        view = self.view
+        view.set("ldr_l", str(frame.ldr_l))
+        view.set("ldr_r", str(frame.ldr_r))
+        view.set("gll", frame.gll.name)
+        mask = frame.lesion_mask
+        for bit, field in enumerate(LESION_FIELDS):
+            view.set(f"reported_{field}", not (mask >> bit) & 1)
+        self.pupil_view.set_servos(frame.servo_l, frame.servo_r)
+
+    def clear_reported_lesions(self):
+        # Back to Unknown: with no board (or recording) behind it the last mask is not current
+        for field in LESION_FIELDS:
+            self.view.set(f"reported_{field}", None)
+
+    def send_command(self, command, key=None):
+        # Queued on the connection's acknowledged command channel; dropped unless the link is up.
+        # A failed write counts as a lost port, and the resync then carries the latest state.
+        if self.connection is not None:
+            self.connection.send(command, key)
+
+    def send_state(self):
+        # Lesions and thresholds go out together as one SET_STATE line. Changes made while a
+        # previous one is still awaiting its ACK collapse into a single follow-up write.
+        self.send_command(self.state_command(), key=self.STATE_KEY)
+        self.update_rig_state_label()
+        self.publish_status()
 
     def update_widget_states(self):
-        is_connected = bool(self.ser and self.ser.is_open)
-        is_reflex_mode = True
-
-        self.high_thresh_entry.config(state=tk.NORMAL if is_connected and is_reflex_mode else tk.DISABLED)
-        self.low_thresh_entry.config(state=tk.NORMAL if is_connected and is_reflex_mode else tk.DISABLED)
-        self.set_ldr_button.config(state=tk.NORMAL if is_connected and is_reflex_mode else tk.DISABLED)
-        
-        for name, button_instance in self.lesion_toggle_buttons.items():
-            button_instance.config(state=tk.NORMAL if is_connected and is_reflex_mode else tk.DISABLED)
+        # Controls stay usable while (re)connecting; changes are applied by the next sync
+        # (the entries and buttons are only reconfigured when this actually flips)
+        self.view.set("controls_enabled", self.connection is not None)
 
     def adjust_ldr_threshold(self, var, delta):
         current_val = var.get()
@@ -549,32 +1729,201 @@ class IrisControllerApp:
         var.set(new_val)
 
     def send_ldr_thresholds(self):
-        if self.ser and self.ser.is_open:
+        if self.connection is not None:
             high = self.ldr_high_threshold.get()
             low = self.ldr_low_threshold.get()
-            if high >= low:
-                messagebox.showwarning("Threshold Warning", "High Intensity Threshold must be less than Low Intensity Threshold for correct LDR behavior.")
+            error = validate_thresholds(high, low)
+            if error:
+                messagebox.showwarning("Threshold Warning", error)
                 return
-            self.send_command(f"SET_LDR_THRESH:{high},{low}")
+            self.apply_thresholds(high, low)
         else:
             messagebox.showwarning("Connection Required", "Please connect to Arduino to set LDR Thresholds.")
 
+    def apply_thresholds(self, high, low):
+        # Validated thresholds from the entries or from a shared-telemetry client
+        self.applied_thresholds = (high, low)
+        self.send_state()
+        if self.recorder is not None:
+            self.recorder.thresholds = (high, low)
+        self._oracle_grace_until = time.monotonic() + self.ORACLE_GRACE_PERIOD
+        # Preview what the current readings will do under the new thresholds
+        frame = self.arduino_data
+        if frame is not None:
+            outcome = evaluate(frame.ldr_l, frame.ldr_r, frame.lesion_mask, high, low)
+            self.update_console(f"[GUI] Thresholds {high}/{low}: LDR {frame.ldr_l}/{frame.ldr_r} -> "
+                                f"{outcome.gll.name}, servos {outcome.servo_l}/{outcome.servo_r}")
+
     def send_lesion_state(self, lesion_name, state):
-        if self.ser and self.ser.is_open:
-            pin_num = self.lesion_pins[lesion_name]
-            pin_state = 1 if state else 0
-            self.send_command(f"SET_PIN_STATE:{pin_num},{pin_state}")
+        if self.connection is not None:
+            self.lesion_states[lesion_name].set(state)
+            self.applied_lesions[lesion_name] = state
+            self.send_state()
         else:
             if lesion_name in self.lesion_toggle_buttons:
                 self.lesion_toggle_buttons[lesion_name].set_state(not state)
             messagebox.showwarning("Connection Required", "Please connect to Arduino to change Lesion states.")
 
+    # --- Sharing telemetry on localhost ---
+    def toggle_sharing(self):
+        if self.telemetry_server is not None:
+            server, self.telemetry_server = self.telemetry_server, None
+            server.stop()
+            self.update_console("[GUI] Stopped sharing telemetry.")
+            return
+        import secrets
+        from telemetry_server import TelemetryServer
+        # Only clients given this token (shown in the console) may change lesions/thresholds
+        server = TelemetryServer(token=secrets.token_urlsafe(8), on_request=self._post_remote_request)
+        try:
+            server.start()
+        except OSError as e:
+            self.share_telemetry.set(False)
+            messagebox.showerror("Share Error", f"Could not listen on {server.host}:{server.port}: {e}")
+            return
+        self.telemetry_server = server
+        connection = self.connection
+        self.publish_status(state=connection.state if connection is not None else SerialConnection.DISCONNECTED,
+                            port=connection.port if connection is not None else None)
+        self.update_console(f"[GUI] Sharing telemetry on {server.host}:{server.port} (newline-delimited JSON); "
+                            f"control token: {server.token}")
+
+    def publish_status(self, **fields):
+        # Connection state plus what the board is being asked to run, for shared-telemetry clients
+        server = self.telemetry_server
+        if server is not None:
+            from telemetry_server import lesions_from_states
+            server.set_status(thresholds=list(self.applied_thresholds),
+                              lesions=lesions_from_states(self.applied_lesions), **fields)
+
+    def _post_remote_request(self, action, value, reply, address):
+        # Server thread -> Tk thread
+        try:
+            self.master.after(0, self.on_remote_request, action, value, reply, address)
+        except (RuntimeError, tk.TclError):
+            reply("the GUI is closing")
+
+    def on_remote_request(self, action, value, reply, address):
+        # Applied exactly like the GUI's own controls, so the command channel stays the only writer
+        if self.connection is None:
+            reply("not connected to a board")
+            return
+        if action == "thresholds":
+            error = validate_thresholds(*value)
+            if error:
+                reply(error)
+                return
+            self.ldr_high_threshold.set(value[0])
+            self.ldr_low_threshold.set(value[1])
+            self.apply_thresholds(*value)
+        else:
+            for name, intact in value.items():
+                self.lesion_states[name].set(intact)
+                self.lesion_toggle_buttons[name].set_state(intact)
+            self.applied_lesions = dict(value)
+            self.send_state()
+        self.update_console(f"[GUI] {address[0]}:{address[1]} set {action}.")
+        reply()
+
+    # --- Recording / replay ---
+    def toggle_recording(self):
+        if self.recorder is not None:
+            self.stop_recording()
+            return
+        path = filedialog.asksaveasfilename(title="Record telemetry to", defaultextension=FILE_EXTENSION,
+                                            filetypes=[("Telemetry recordings", f"*{FILE_EXTENSION}")])
+        if not path:
+            return
+        try:
+            self.recorder = TelemetryRecorder(path, self.applied_thresholds)
+        except OSError as e:
+            messagebox.showerror("Recording Error", f"Could not create {path}: {e}")
+            return
+        self.record_button.config(text="Stop recording")
+        self.update_console(f"[GUI] Recording DATA frames to {path}")
+
+    def stop_recording(self):
+        recorder, self.recorder = self.recorder, None
+        if recorder is None:
+            return
+        recorder.close()
+        self.record_button.config(text="Record...")
+        self.update_console(f"[GUI] Recorded {recorder.frames_recorded} frames to {recorder.path}")
+
+    def toggle_replay(self):
+        if self.replay is not None:
+            self.stop_replay()
+            return
+        path = filedialog.askopenfilename(title="Replay telemetry recording",
+                                          filetypes=[("Telemetry recordings", f"*{FILE_EXTENSION}"), ("All files", "*")])
+        if not path:
+            return
+        try:
+            start = float(self.replay_start.get())
+        except (tk.TclError, ValueError):
+            start = 0.0
+        try:
+            self.replay = Recording(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Replay Error", f"Could not open {path}: {e}")
+            return
+        self.arduino_data = None
+        self.reset_reflex_metrics()
+        self.reader = ReplayReader(self.replay, self.read_from_serial,
+                                   lambda e: self.master.after(0, self.on_replay_error, e),
+                                   speed=self.REPLAY_SPEEDS.get(self.replay_speed.get(), 1.0), start=start,
+                                   on_finished=lambda: self.master.after(0, self.stop_replay),
+                                   backlog=self.ui_queue.qsize, max_backlog=self.UI_QUEUE_MAXSIZE // 2)
+        self._reader_sample = None
+        self.reader.start()
+        self.replay_button.config(text="Stop replay")
+        self.session_label.config(text=f"Replaying {len(self.replay)} frames ({self.replay.duration:.1f} s)")
+        self.update_connection_buttons()
+
+    def stop_replay(self):
+        if self.replay is None:
+            return
+        reader, self.reader = self.reader, None
+        if reader is not None:
+            reader.stop()
+            self.update_console(f"[GUI] Replay stopped at {reader.position:.1f} s")
+        self.replay.close()
+        self.replay = None
+        self.clear_reported_lesions()
+        self.replay_button.config(text="Replay...")
+        self.session_label.config(text="")
+        self.update_connection_buttons()
+
+    def on_replay_error(self, e):
+        self.stop_replay()
+        messagebox.showerror("Replay Error", f"Replay failed: {e}")
+
+    def open_rig_manager(self):
+        if self.rig_manager_window is not None and self.rig_manager_window.winfo_exists():
+            self.rig_manager_window.lift()
+            return
+        if self.device_manager is None:
+            from device_manager import DeviceManager # Its thread pool machinery is only needed from here on
+            self.device_manager = DeviceManager(_import_serial())
+        self.rig_manager_window = RigManagerWindow(self, self.device_manager)
+
     def on_closing(self):
         if messagebox.askokcancel("Quit", "Do you want to quit?"):
+            self.stop_replay()
             self.disconnect_serial()
+            self.stop_recording()
+            self.port_watcher.stop()
+            if self.telemetry_server is not None:
+                self.telemetry_server.stop()
+            if self.device_manager is not None:
+                self.device_manager.shutdown()
             self.master.destroy()
 
 if __name__ == "__main__":
+    if getattr(sys, "frozen", False):
+        # A one-file build's I/O worker process (the "I/O process" box) starts here too
+        import multiprocessing
+        multiprocessing.freeze_support()
     root = tk.Tk()
     app = IrisControllerApp(root)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
@@ -1,8 +1,41 @@
 # -*- mode: python ; coding: utf-8 -*-
-from PyInstaller.utils.hooks import collect_submodules
+import sys
 
-hiddenimports = []
-hiddenimports += collect_submodules('serial')
+# Only the pyserial modules the app uses: this platform's backend for serial.Serial, list_ports,
+# and the rfc2217:// URL handler for Wokwi (serial_for_url imports it by name, so PyInstaller
+# cannot see it). collect_submodules('serial') bundled every backend, URL handler and miniterm,
+# and a one-file build unpacks all of it on every launch.
+if sys.platform == 'win32':
+    backend = ['serial.serialwin32', 'serial.win32', 'serial.tools.list_ports_windows']
+elif sys.platform == 'darwin':
+    backend = ['serial.serialposix', 'serial.tools.list_ports_posix', 'serial.tools.list_ports_osx']
+else:
+    backend = ['serial.serialposix', 'serial.tools.list_ports_posix', 'serial.tools.list_ports_linux']
+
+hiddenimports = backend + [
+    'serial.tools.list_ports',
+    'serial.tools.list_ports_common',
+    'serial.urlhandler.protocol_rfc2217',
+]
+
+# Reachable by static analysis but never used by the GUI: other platforms' backends, the other
+# URL handlers, pyserial's tools, and NumPy (only reflex_engine's batch helpers import it).
+other_backends = {'serial.serialwin32', 'serial.win32', 'serial.serialposix', 'serial.serialjava', 'serial.serialcli',
+                  'serial.tools.list_ports_windows', 'serial.tools.list_ports_posix',
+                  'serial.tools.list_ports_osx', 'serial.tools.list_ports_linux'} - set(backend)
+excludes = sorted(other_backends) + [
+    'serial.urlhandler.protocol_alt',
+    'serial.urlhandler.protocol_cp2110',
+    'serial.urlhandler.protocol_hwgrep',
+    'serial.urlhandler.protocol_loop',
+    'serial.urlhandler.protocol_socket',
+    'serial.urlhandler.protocol_spy',
+    'serial.rs485',
+    'serial.threaded',
+    'serial.tools.miniterm',
+    'serial.tools.hexlify_codec',
+    'numpy',
+]
 
 
 a = Analysis(
@@ -14,7 +47,7 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=excludes,
     noarchive=False,
     optimize=0,
 )
@@ -20,6 +20,10 @@ const int ewpRightPin = 7;       // Edinger-Westphal Nucleus Right Pathway LED
 const int cn3LeftPin = 8;        // 3rd Cranial Nerve Left Pathway LED
 const int cn3RightPin = 11;      // 3rd Cranial Nerve Right Pathway LED // Corrected: Removed duplicate 'int'
 
+// Same pins in lesion-mask bit order (bit 0 = ONL ... bit 7 = CN3R), used by SET_STATE
+const int lesionPins[8] = {opticNerveLeftPin, opticNerveRightPin, ptnLeftPin, ptnRightPin,
+                           ewpLeftPin, ewpRightPin, cn3LeftPin, cn3RightPin};
+
 // === Tweakable Light Intensity Thresholds (LDR values are inverse to light intensity) ===
 // These will be adjusted by the GUI. Default values:
 int HIGH_INTENSITY_LDR_THRESHOLD = 400; // LDR values BELOW this mean high light (pupil constricts)
@@ -55,6 +59,35 @@ char inputBuffer[SERIAL_BUFFER_SIZE];
 byte bufferIndex = 0;
 bool stringComplete = false;
 
+// --- Telemetry Framing ---
+// Text mode (default) prints human-readable DATA|/DBG| lines every loop; this is what the
+// Wokwi RFC2217 path and the Serial Monitor expect. Binary mode (SET_TELEM:BIN) replaces
+// both with one 14-byte COBS frame terminated by 0x00. Command replies stay text but are
+// also terminated by 0x00 so the host can tell packets apart. A reset always returns to text.
+bool binaryTelemetry = false;
+const byte BIN_FRAME_DATA = 0xD1;
+const byte BIN_PAYLOAD_SIZE = 12; // type, LDR_L(2), LDR_R(2), lesionMask, GLL, AngleL, AngleR, ServoL, ServoR, CRC-8
+
+// --- Telemetry Rate and Verbosity ---
+// loop() runs the reflex every LOOP_DELAY_MS and sends telemetry at most once per
+// telemetryPeriodMs (SET_PERIOD:<ms>). SET_DBG:OFF drops the DBG| line. SET_REPORT:CHANGES
+// sends a frame only when an eye's LDR bucket (bright/ambient/dark against the thresholds),
+// the lesion mask or a servo angle changed, plus a heartbeat every CHANGE_HEARTBEAT_MS so
+// the host can tell a quiet board from a dead one. SET_REPORT:OFF stops telemetry entirely;
+// commands are still answered. A reset restores the defaults below.
+const byte REPORT_ALL = 0;
+const byte REPORT_CHANGES = 1;
+const byte REPORT_OFF = 2;
+const unsigned long LOOP_DELAY_MS = 10;
+const long MIN_TELEMETRY_PERIOD_MS = 20;
+const long MAX_TELEMETRY_PERIOD_MS = 10000;
+const unsigned long CHANGE_HEARTBEAT_MS = 1000;
+unsigned long telemetryPeriodMs = 150;
+bool debugOutput = true;
+byte reportMode = REPORT_ALL;
+unsigned long lastTelemetryMs = 0;
+long lastReportedState = -1; // LDR buckets, lesion mask and servo angles of the last frame sent
+
 void setup() {
   Serial.begin(9600);
   while (!Serial); // Wait for serial port to connect (Leonardo/Micro)
@@ -177,6 +210,31 @@ void loop() {
   leftIris.write(finalServoLeftAngle);
   rightIris.write(finalServoRightAngle);
 
+  // === Decide whether this pass sends telemetry ===
+  unsigned long now = millis();
+  if (reportMode == REPORT_OFF || now - lastTelemetryMs < telemetryPeriodMs) {
+    delay(LOOP_DELAY_MS);
+    return;
+  }
+  // Lesion mask: bit set = LESION (LED OFF); bit 0 = ONL ... bit 7 = CN3R
+  byte lesionMask = (!opticNerveL_OK) | (!opticNerveR_OK) << 1 | (!ptnLeft_OK) << 2 | (!ptnRight_OK) << 3 |
+                    (!ewpLeft_OK) << 4 | (!ewpRight_OK) << 5 | (!cn3Left_OK) << 6 | (!cn3Right_OK) << 7;
+  long reportedState = (long)ldrBucket(leftLDR) | (long)ldrBucket(rightLDR) << 2 | (long)lesionMask << 4 |
+                       (long)finalServoLeftAngle << 12 | (long)finalServoRightAngle << 20;
+  if (reportMode == REPORT_CHANGES && reportedState == lastReportedState && now - lastTelemetryMs < CHANGE_HEARTBEAT_MS) {
+    delay(LOOP_DELAY_MS);
+    return;
+  }
+  lastTelemetryMs = now;
+  lastReportedState = reportedState;
+
+  if (binaryTelemetry) {
+    sendBinaryFrame(leftLDR, rightLDR, lesionMask, (byte)currentGlobalLightLevel,
+                    calculatedAngleLeft, calculatedAngleRight, finalServoLeftAngle, finalServoRightAngle);
+    delay(LOOP_DELAY_MS);
+    return;
+  }
+
   // === Send Consolidated Data to GUI ===
   // This helps the GUI parse data efficiently
   // Using F() macro for constant strings to store them in Flash (PROGMEM)
@@ -186,45 +244,33 @@ void loop() {
   Serial.print(F(",LDR_R:")); Serial.print(rightLDR);
   Serial.print(F("|MODE:REFLEX")); // Mode is fixed to REFLEX
   
-  // Send lesion states
-  Serial.print(F("|ONL:")); Serial.print(digitalRead(opticNerveLeftPin) == HIGH ? F("1") : F("0"));
-  Serial.print(F(",ONR:")); Serial.print(digitalRead(opticNerveRightPin) == HIGH ? F("1") : F("0"));
-  Serial.print(F(",PTNL:")); Serial.print(digitalRead(ptnLeftPin) == HIGH ? F("1") : F("0"));
-  Serial.print(F(",PTNR:")); Serial.print(digitalRead(ptnRightPin) == HIGH ? F("1") : F("0"));
-  Serial.print(F(",EWPL:")); Serial.print(digitalRead(ewpLeftPin) == HIGH ? F("1") : F("0"));
-  Serial.print(F(",EWPR:")); Serial.print(digitalRead(ewpRightPin) == HIGH ? F("1") : F("0"));
-  Serial.print(F(",CN3L:")); Serial.print(digitalRead(cn3LeftPin) == HIGH ? F("1") : F("0"));
-  Serial.print(F(",CN3R:")); Serial.print(digitalRead(cn3RightPin) == HIGH ? F("1") : F("0")); // Corrected: cn3RightPin is now properly declared
-
-  Serial.print(F("|GLL:")); 
-  // Re-calculate debugGlobalLightLevel for consistent output
-  LightLevel debugGlobalLightLevel = NO_STIMULUS;
-  if ((leftLDR < HIGH_INTENSITY_LDR_THRESHOLD && leftOpticNervePathwayIntact) ||
-      (rightLDR < HIGH_INTENSITY_LDR_THRESHOLD && rightOpticNervePathwayIntact)) {
-    debugGlobalLightLevel = HIGH_LIGHT;
-  } else if ((leftLDR >= HIGH_INTENSITY_LDR_THRESHOLD && leftLDR <= LOW_INTENSITY_LDR_THRESHOLD && leftOpticNervePathwayIntact) ||
-             (rightLDR >= HIGH_INTENSITY_LDR_THRESHOLD && rightLDR <= LOW_INTENSITY_LDR_THRESHOLD && rightOpticNervePathwayIntact)) {
-    debugGlobalLightLevel = AMBIENT_LIGHT;
-  } else if ((leftLDR > LOW_INTENSITY_LDR_THRESHOLD && leftOpticNervePathwayIntact) ||
-             (rightLDR > LOW_INTENSITY_LDR_THRESHOLD && rightOpticNervePathwayIntact)) {
-    debugGlobalLightLevel = LOW_LIGHT;
-  }
-  
-  if (debugGlobalLightLevel == HIGH_LIGHT) Serial.print(F("HIGH_LIGHT"));
-  else if (debugGlobalLightLevel == AMBIENT_LIGHT) Serial.print(F("AMBIENT_LIGHT"));
-  else if (debugGlobalLightLevel == LOW_LIGHT) Serial.print(F("LOW_LIGHT"));
-  else Serial.print(F("NO_STIMULUS"));
-  
-  int currentServoL = leftIris.read(); // Read current actual servo position
-  int currentServoR = rightIris.read();
-  
+  // Send lesion states (the pin reads from above)
+  Serial.print(F("|ONL:")); Serial.print(opticNerveL_OK ? F("1") : F("0"));
+  Serial.print(F(",ONR:")); Serial.print(opticNerveR_OK ? F("1") : F("0"));
+  Serial.print(F(",PTNL:")); Serial.print(ptnLeft_OK ? F("1") : F("0"));
+  Serial.print(F(",PTNR:")); Serial.print(ptnRight_OK ? F("1") : F("0"));
+  Serial.print(F(",EWPL:")); Serial.print(ewpLeft_OK ? F("1") : F("0"));
+  Serial.print(F(",EWPR:")); Serial.print(ewpRight_OK ? F("1") : F("0"));
+  Serial.print(F(",CN3L:")); Serial.print(cn3Left_OK ? F("1") : F("0"));
+  Serial.print(F(",CN3R:")); Serial.print(cn3Right_OK ? F("1") : F("0"));
+
+  Serial.print(F("|GLL:"));
+  printLightLevel(currentGlobalLightLevel);
+
+  int currentServoL = finalServoLeftAngle; // Same value leftIris.read() would return
+  int currentServoR = finalServoRightAngle;
+
   Serial.print(F("|AngleL:")); Serial.print(calculatedAngleLeft); // Conceptual angle
   Serial.print(F(",AngleR:")); Serial.print(calculatedAngleRight); // Conceptual angle
   Serial.print(F(",ServoL:")); Serial.print(currentServoL);    // Actual servo angle
   Serial.print(F(",ServoR:")); Serial.println(currentServoR);    // Actual servo angle
 
+  if (!debugOutput) {
+    delay(LOOP_DELAY_MS);
+    return;
+  }
 
-  // Optional: Extensive debug print (also using F() for PROGMEM)
+  // Optional: Extensive debug print (also using F() for PROGMEM); SET_DBG:OFF skips it
   Serial.print(F("DBG|"));
   Serial.print(F("LDR_L: ")); Serial.print(leftLDR);
   Serial.print(F(" | LDR_R: ")); Serial.print(rightLDR);
@@ -237,17 +283,27 @@ void loop() {
   Serial.print(F(" | CN3_L_OK: ")); Serial.print(cn3Left_OK ? F("OK") : F("Lesion"));
   Serial.print(F(" | CN3_R_OK: ")); Serial.print(cn3Right_OK ? F("OK") : F("Lesion")); // Corrected: cn3RightPin is now properly declared
   Serial.print(F(" | Global_Light_Level: "));
-  if (debugGlobalLightLevel == HIGH_LIGHT) Serial.print(F("HIGH_LIGHT"));
-  else if (debugGlobalLightLevel == AMBIENT_LIGHT) Serial.print(F("AMBIENT_LIGHT"));
-  else if (debugGlobalLightLevel == LOW_LIGHT) Serial.print(F("LOW_LIGHT"));
-  else Serial.print(F("NO_STIMULUS"));
+  printLightLevel(currentGlobalLightLevel);
   Serial.print(F(" | Angle_L (deg): ")); Serial.print(calculatedAngleLeft);
   Serial.print(F(" | Angle_R (deg): ")); Serial.print(calculatedAngleRight);
   Serial.print(F(" | Servo_L (20-170): ")); Serial.print(currentServoL);
   Serial.print(F(" | Servo_R (20-170): ")); Serial.println(currentServoR);
 
+  delay(LOOP_DELAY_MS); // Small delay to stabilize readings; telemetry is paced by telemetryPeriodMs
+}
+
+// === LDR bucket against the thresholds, for change-only reporting: 0 bright, 1 ambient, 2 dark ===
+byte ldrBucket(int ldr) {
+  if (ldr < HIGH_INTENSITY_LDR_THRESHOLD) return 0;
+  if (ldr <= LOW_INTENSITY_LDR_THRESHOLD) return 1;
+  return 2;
+}
 
-  delay(150); // Small delay to stabilize readings and avoid flickering
+void printLightLevel(LightLevel level) {
+  if (level == HIGH_LIGHT) Serial.print(F("HIGH_LIGHT"));
+  else if (level == AMBIENT_LIGHT) Serial.print(F("AMBIENT_LIGHT"));
+  else if (level == LOW_LIGHT) Serial.print(F("LOW_LIGHT"));
+  else Serial.print(F("NO_STIMULUS"));
 }
 
 // === Helper function to convert conceptual angle (-90 to +90) into servo signal (20-170) ===
@@ -257,9 +313,62 @@ int angleToServo(int angle) {
   return map(angle, -90, 90, SERVO_MIN_ANGLE, SERVO_MAX_ANGLE);
 }
 
+// === CRC-8 (polynomial 0x07), matches telemetry.crc8 on the Python side ===
+byte crc8(const byte* data, byte len) {
+  byte crc = 0;
+  for (byte i = 0; i < len; i++) {
+    crc ^= data[i];
+    for (byte bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x80) ? (crc << 1) ^ 0x07 : (crc << 1);
+    }
+  }
+  return crc;
+}
+
+// === COBS-encode a short payload (< 254 bytes) and write it followed by the 0x00 delimiter ===
+void writeCobsPacket(const byte* data, byte len) {
+  byte encoded[BIN_PAYLOAD_SIZE + 2];
+  byte codeIndex = 0;
+  byte code = 1;
+  byte out = 1;
+  for (byte i = 0; i < len; i++) {
+    if (data[i] == 0) {
+      encoded[codeIndex] = code;
+      codeIndex = out++;
+      code = 1;
+    } else {
+      encoded[out++] = data[i];
+      code++;
+    }
+  }
+  encoded[codeIndex] = code;
+  Serial.write(encoded, out);
+  Serial.write((byte)0);
+}
+
+// === Binary DATA frame (see telemetry.py for the host-side decoder) ===
+void sendBinaryFrame(int leftLDR, int rightLDR, byte lesionMask, byte level,
+                     int angleLeft, int angleRight, int servoLeft, int servoRight) {
+  byte payload[BIN_PAYLOAD_SIZE];
+  payload[0] = BIN_FRAME_DATA;
+  payload[1] = lowByte(leftLDR);
+  payload[2] = highByte(leftLDR);
+  payload[3] = lowByte(rightLDR);
+  payload[4] = highByte(rightLDR);
+  payload[5] = lesionMask;
+  payload[6] = level;
+  payload[7] = (byte)(int8_t)angleLeft;
+  payload[8] = (byte)(int8_t)angleRight;
+  payload[9] = (byte)servoLeft;
+  payload[10] = (byte)servoRight;
+  payload[11] = crc8(payload, BIN_PAYLOAD_SIZE - 1);
+  writeCobsPacket(payload, BIN_PAYLOAD_SIZE);
+}
+
 // === Serial Event Handler (for C-style string) ===
 void serialEvent() {
-  while (Serial.available()) {
+  // Leave any following command in the RX buffer until this one is processed
+  while (!stringComplete && Serial.available()) {
     char inChar = (char)Serial.read();
     // If the buffer is not full and it's not a newline, add character
     if (inChar != '\n' && bufferIndex < SERIAL_BUFFER_SIZE - 1) {
@@ -275,9 +384,62 @@ void serialEvent() {
 void processCommand(char* command) {
   // Use C-string functions (strstr, sscanf, atoi)
   // strstr returns a pointer to the first occurrence of the substring, or NULL if not found.
+  bool wasBinary = binaryTelemetry;
+  bool ok = true;
+
+  // Optional "@<seq> " prefix: answer with ACK:<seq>,OK|ERR once the command is handled
+  long seq = -1;
+  if (command[0] == '@') {
+    char* rest;
+    seq = strtol(command + 1, &rest, 10);
+    while (*rest == ' ') rest++;
+    command = rest;
+  }
 
+  // SET_TELEM command (telemetry framing)
+  if (strstr(command, "SET_TELEM:BIN") == command) {
+    Serial.println(F("TELEM:BIN"));
+    binaryTelemetry = true;
+  }
+  else if (strstr(command, "SET_TELEM:TEXT") == command) {
+    Serial.println(F("TELEM:TEXT"));
+    binaryTelemetry = false;
+  }
+  // SET_PERIOD command (minimum time between telemetry frames)
+  else if (strstr(command, "SET_PERIOD:") == command) {
+    long periodMs;
+    if (sscanf(command, "SET_PERIOD:%ld", &periodMs) == 1 &&
+        periodMs >= MIN_TELEMETRY_PERIOD_MS && periodMs <= MAX_TELEMETRY_PERIOD_MS) {
+      telemetryPeriodMs = periodMs;
+      Serial.print(F("PERIOD:"));
+      Serial.println(telemetryPeriodMs);
+    } else {
+      ok = false;
+      Serial.println(F("Error: Invalid SET_PERIOD format. Use SET_PERIOD:<ms> (20-10000)"));
+    }
+  }
+  // SET_DBG command (DBG| line on/off in text mode)
+  else if (strcmp(command, "SET_DBG:ON") == 0 || strcmp(command, "SET_DBG:OFF") == 0) {
+    debugOutput = strcmp(command, "SET_DBG:ON") == 0;
+    Serial.println(debugOutput ? F("DBG:ON") : F("DBG:OFF"));
+  }
+  // SET_REPORT command (every frame, changes only, or none)
+  else if (strstr(command, "SET_REPORT:") == command) {
+    const char* mode = command + strlen("SET_REPORT:");
+    if (strcmp(mode, "ALL") == 0) reportMode = REPORT_ALL;
+    else if (strcmp(mode, "CHANGES") == 0) reportMode = REPORT_CHANGES;
+    else if (strcmp(mode, "OFF") == 0) reportMode = REPORT_OFF;
+    else ok = false;
+    if (ok) {
+      lastReportedState = -1; // Next due frame goes out, so the host starts from a fresh state
+      Serial.print(F("REPORT:"));
+      Serial.println(mode);
+    } else {
+      Serial.println(F("Error: Invalid SET_REPORT mode. Use SET_REPORT:ALL, CHANGES or OFF"));
+    }
+  }
   // SET_LDR_THRESH command
-  if (strstr(command, "SET_LDR_THRESH:") == command) {
+  else if (strstr(command, "SET_LDR_THRESH:") == command) {
     int high, low;
     // sscanf is powerful for parsing formatted strings
     if (sscanf(command, "SET_LDR_THRESH:%d,%d", &high, &low) == 2) {
@@ -288,9 +450,32 @@ void processCommand(char* command) {
       Serial.print(F(", Low="));
       Serial.println(LOW_INTENSITY_LDR_THRESHOLD);
     } else {
+      ok = false;
       Serial.println(F("Error: Invalid SET_LDR_THRESH format. Use SET_LDR_THRESH:<high>,<low>"));
     }
   }
+  // SET_STATE command: all eight lesion pins from one bitmask (bit set = LESION) plus thresholds
+  else if (strstr(command, "SET_STATE:") == command) {
+    int mask, high, low;
+    if (sscanf(command, "SET_STATE:%d,%d,%d", &mask, &high, &low) == 3 && mask >= 0 && mask <= 255) {
+      for (byte bit = 0; bit < 8; bit++) {
+        digitalWrite(lesionPins[bit], (mask >> bit) & 1 ? LOW : HIGH);
+      }
+      HIGH_INTENSITY_LDR_THRESHOLD = high;
+      LOW_INTENSITY_LDR_THRESHOLD = low;
+      if (seq < 0) { // The ACK already confirms it for the GUI
+        Serial.print(F("STATE:"));
+        Serial.print(mask);
+        Serial.print(F(","));
+        Serial.print(HIGH_INTENSITY_LDR_THRESHOLD);
+        Serial.print(F(","));
+        Serial.println(LOW_INTENSITY_LDR_THRESHOLD);
+      }
+    } else {
+      ok = false;
+      Serial.println(F("Error: Invalid SET_STATE format. Use SET_STATE:<lesionMask>,<high>,<low>"));
+    }
+  }
   // SET_PIN_STATE command (for lesion switches)
   else if (strstr(command, "SET_PIN_STATE:") == command) {
     int pinNum, state;
@@ -306,16 +491,30 @@ void processCommand(char* command) {
         Serial.print(F(" set to "));
         Serial.println(state == 1 ? F("HIGH (INTACT, LED ON)") : F("LOW (LESION, LED OFF)"));
       } else {
+        ok = false;
         Serial.print(F("Error: Invalid pin number for lesion control: "));
         Serial.println(pinNum);
       }
     } else {
+      ok = false;
       Serial.println(F("Error: Invalid SET_PIN_STATE format. Use SET_PIN_STATE:<pin>,<state>"));
     }
   }
   // All other commands are now considered unknown as manual mode is removed
   else {
+    ok = false;
     Serial.print(F("Unknown command: "));
     Serial.println(command);
   }
+
+  if (seq >= 0) {
+    Serial.print(F("ACK:"));
+    Serial.print(seq);
+    Serial.println(ok ? F(",OK") : F(",ERR"));
+  }
+
+  // In (or leaving) binary mode every reply is a packet of its own
+  if (wasBinary || binaryTelemetry) {
+    Serial.write((byte)0);
+  }
 }
@@ -0,0 +1,60 @@
+# --- Shared helpers for the benchmark scripts ---
+import importlib.util
+import json
+import os
+import sys
+
+REPO_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+
+def load_gui_module():
+    # "Build control.py" has a space in its name, so it cannot be imported normally
+    spec = importlib.util.spec_from_file_location("build_control", os.path.join(REPO_DIR, "Build control.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentiles(samples, points=(50, 90, 99)):
+    if not samples:
+        return {f"p{p}": None for p in points}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return {f"p{p}": ordered[min(last, int(round(p / 100 * last)))] for p in points}
+
+
+def rss_kib():
+    # Resident set size of this process; None where /proc is unavailable
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def save_results(path, results):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def compare_to_baseline(path, results, tolerance, lower_is_better):
+    # Prints every metric that regressed by more than `tolerance` (a fraction) and returns
+    # how many did. lower_is_better lists metric keys where a smaller number is an improvement.
+    with open(path) as f:
+        baseline = json.load(f)
+    regressions = 0
+    for key, value in sorted(results.items()):
+        old = baseline.get(key)
+        if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or old == 0:
+            continue
+        change = (value - old) / abs(old)
+        worse = change > tolerance if key in lower_is_better else change < -tolerance
+        if worse:
+            regressions += 1
+        print(f"  {'REGRESSION' if worse else 'ok':<10} {key:<36} {old:>12.3f} -> {value:>12.3f} ({change:+.1%})")
+    return regressions
@@ -0,0 +1,99 @@
+# --- Micro-benchmark: typed DATA frame decoder vs. the original dict-of-strings parser ---
+# Usage: python benchmarks/bench_frame_parser.py [--lines 200000] [--malformed 0.01]
+#
+# Reports lines/sec for both parsers over the same synthetic corpus, plus memory measured
+# with tracemalloc: bytes retained per decoded frame and the peak transient allocation
+# while parsing a batch.
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from telemetry import DataFrame, LightLevel, decode_data_line, encode_data_line # noqa: E402
+
+
+# The parser IrisControllerApp used before telemetry.decode_data_line, kept verbatim
+# (minus the GUI update) as the baseline. It raises ValueError on some malformed lines.
+def legacy_parse(line):
+    if line.startswith("DATA|"):
+        parts = line[5:].split('|')
+        data = {}
+        for part in parts:
+            sub_parts = part.split(',')
+            for item in sub_parts:
+                if ':' in item:
+                    key, value = item.split(':')
+                    data[key.strip()] = value.strip()
+        return data
+
+
+def legacy_parse_safe(line):
+    try:
+        return legacy_parse(line)
+    except ValueError:
+        return None
+
+
+def make_corpus(n_lines, malformed_ratio, seed=1234):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(n_lines):
+        frame = DataFrame(rng.randint(0, 1023), rng.randint(0, 1023), rng.randint(0, 255),
+                          LightLevel(rng.randint(0, 3)), rng.choice((-90, 0, 90)), rng.choice((-90, 0, 90)),
+                          rng.choice((20, 95, 170)), rng.choice((20, 95, 170)))
+        line = encode_data_line(frame)
+        if rng.random() < malformed_ratio:
+            # Typical serial damage: truncated mid-field or a dropped separator
+            if rng.random() < 0.5:
+                line = line[:rng.randint(5, len(line) - 1)]
+            else:
+                line = line.replace(",", ":", 1)
+        corpus.append(line)
+    return corpus
+
+
+def time_parser(parse, corpus, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for line in corpus:
+            parse(line)
+        best = min(best, time.perf_counter() - start)
+    return len(corpus) / best
+
+
+def memory_profile(parse, corpus):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    results = [parse(line) for line in corpus]
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    decoded = sum(1 for r in results if r is not None)
+    del results
+    return (retained - base) / max(1, decoded), peak - base, decoded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DATA frame parsers")
+    parser.add_argument("--lines", type=int, default=200000)
+    parser.add_argument("--malformed", type=float, default=0.01, help="Fraction of damaged lines in the corpus")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.lines, args.malformed)
+    print(f"Corpus: {len(corpus)} lines, ~{sum(map(len, corpus)) // len(corpus)} bytes/line, "
+          f"{args.malformed:.1%} malformed")
+    print(f"{'parser':<14}{'lines/sec':>14}{'bytes/frame':>14}{'peak KiB':>12}{'decoded':>10}")
+    for name, parse in (("legacy dict", legacy_parse_safe), ("typed frame", decode_data_line)):
+        rate = time_parser(parse, corpus, args.repeats)
+        per_frame, peak, decoded = memory_profile(parse, corpus)
+        print(f"{name:<14}{rate:>14,.0f}{per_frame:>14.0f}{peak / 1024:>12,.0f}{decoded:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+# --- End-to-end pipeline benchmark against the virtual Arduino ---
+# Usage:
+#   python benchmarks/bench_pipeline.py ingest --rate 5000 --seconds 10
+#   python benchmarks/bench_pipeline.py gui --rate 2000 --seconds 60 --json run.json [--baseline old.json]
+#   python benchmarks/bench_pipeline.py ingest --rate 5000 --gil-load 20 [--worker]
+#
+# ingest: SerialReader + TelemetryStreamDecoder only (no Tk). Reports sustained lines/sec and
+#         serial-to-callback latency percentiles of the DATA frames.
+# gui:    the real IrisControllerApp connected to the virtual Arduino (needs a display).
+#         Reports lines/sec, serial-to-label latency percentiles, Tk event-loop lag (how late
+#         a periodic after() probe fires, a proxy for event-queue backlog), the UI queue
+#         high-water mark, RSS growth, and mean time per call of read_from_serial,
+#         parse_arduino_data and update_console.
+# --worker runs either mode through serial_worker.WorkerConnection (port, line splitting and
+# parsing in a separate process) instead of the threads of this process. --gil-load MS adds a
+# thread that holds the GIL in MS-long slices, like a heavy console redraw, to show how much
+# each path suffers from it.
+# --json writes the numbers for tracking over time; --baseline compares against an earlier run
+# and exits with status 1 if any metric regressed by more than --tolerance.
+import argparse
+import sys
+import threading
+import time
+import types
+
+from bench_common import compare_to_baseline, load_gui_module, percentiles, rss_kib, save_results
+
+from serial_link import SerialReader, open_port
+from telemetry import DataFrame, decode_data_line
+from virtual_arduino import VirtualArduino
+
+LOWER_IS_BETTER = {
+    "latency_ms_p50", "latency_ms_p90", "latency_ms_p99", "event_loop_lag_ms_p50", "event_loop_lag_ms_p99",
+    "max_ui_queue_depth", "rss_growth_kib", "read_from_serial_us", "parse_arduino_data_us", "update_console_us",
+    "dropped_lines", "pty_bytes_dropped", "reads_per_sec", "frames_dropped", "widget_updates_per_sec",
+}
+
+
+class _GilLoad:
+    # A thread that keeps the interpreter busy for slice_ms at a time, the way a long Tk
+    # redraw in the GUI's main thread does
+    def __init__(self, slice_ms):
+        self.slice = slice_ms / 1000
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="gil-load", daemon=True)
+
+    def __enter__(self):
+        if self.slice > 0:
+            self._previous = sys.getswitchinterval()
+            sys.setswitchinterval(self.slice) # Other threads only get the GIL between slices
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.slice > 0:
+            self._stop.set()
+            self._thread.join()
+            sys.setswitchinterval(self._previous)
+
+    def _run(self):
+        while not self._stop.is_set():
+            end = time.perf_counter() + self.slice
+            while time.perf_counter() < end:
+                pass
+
+
+def _device_main(conn, shm_name, rate, options):
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=shm_name)
+    counters = shm.buf[:16].cast("Q")
+    device = VirtualArduino(rate, pattern="sequence", **options)
+    device.sent_times = shm.buf[16:].cast("d")
+    device.start()
+    conn.send(device.port)
+    while not conn.poll(0.05):
+        counters[0], counters[1] = device.frames_sent, device.bytes_dropped
+    device.stop()
+    counters[0], counters[1] = device.frames_sent, device.bytes_dropped
+    device.sent_times.release()
+    counters.release()
+    shm.close()
+    conn.send("stopped")
+
+
+class _DeviceProcess:
+    # The virtual Arduino in a process of its own, so that --gil-load slows down only the host
+    # side, as it would with a real board. Same attributes as VirtualArduino that the
+    # benchmarks read; frames_sent and bytes_dropped lag by up to 50 ms while it runs.
+    SEQUENCE_MASK = VirtualArduino.SEQUENCE_MASK
+
+    def __init__(self, rate, **options):
+        import multiprocessing
+        from multiprocessing import shared_memory
+        context = multiprocessing.get_context("spawn")
+        self._shm = shared_memory.SharedMemory(create=True, size=16 + 8 * (self.SEQUENCE_MASK + 1))
+        self._shm.buf[:16] = bytes(16)
+        self._counters = self._shm.buf[:16].cast("Q")
+        self.sent_times = self._shm.buf[16:].cast("d")
+        self._conn, child = context.Pipe()
+        self._process = context.Process(target=_device_main, args=(child, self._shm.name, rate, options), daemon=True)
+
+    def start(self):
+        self._process.start()
+        self.port = self._conn.recv()
+        return self
+
+    @property
+    def frames_sent(self):
+        return self._counters[0]
+
+    @property
+    def bytes_dropped(self):
+        return self._counters[1]
+
+    def stop(self):
+        self._conn.send("stop")
+        self._conn.recv()
+        self._process.join()
+        self._final = self.frames_sent, self.bytes_dropped
+        # Counters stay readable: keep a copy, then free the block
+        self.sent_times.release()
+        self._counters.release()
+        self._counters = self._final
+        self._shm.close()
+        self._shm.unlink()
+
+
+def _start_device(args):
+    options = {"send_debug": not args.no_debug, "malformed_ratio": args.malformed}
+    if args.gil_load > 0:
+        return _DeviceProcess(args.rate, **options).start()
+    return VirtualArduino(args.rate, pattern="sequence", **options).start()
+
+
+def run_ingest(args):
+    device = _start_device(args)
+    counts = {"lines": 0}
+    latencies = []
+    sent_times, mask = device.sent_times, device.SEQUENCE_MASK
+
+    def on_items(items):
+        now = time.perf_counter()
+        counts["lines"] += len(items)
+        for item in items:
+            if not isinstance(item, DataFrame):
+                item = decode_data_line(item) if item.startswith("DATA|") else None
+                if item is None:
+                    continue
+            sent = sent_times[(item.ldr_r << 10 | item.ldr_l) & mask]
+            if sent:
+                latencies.append((now - sent) * 1000)
+
+    errors = []
+    if args.worker:
+        from serial_worker import WorkerConnection
+        states = []
+        reader = WorkerConnection(None, device.port, on_items, lambda state, detail: states.append(state), lambda: [])
+        reader.start()
+        deadline = time.monotonic() + 10
+        while not reader.is_live() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if not reader.is_live():
+            reader.stop()
+            device.stop()
+            sys.exit(f"I/O worker did not reach the live state: {states}")
+        counts["lines"] = 0
+        latencies.clear()
+        reads_start, bytes_start, _ = reader.stats_snapshot()
+    else:
+        import serial
+        ser = open_port(serial, device.port)
+        reader = SerialReader(ser, on_items, errors.append)
+        reader.start()
+        reads_start = bytes_start = 0
+    frames_start = device.frames_sent
+    start = time.perf_counter()
+    with _GilLoad(args.gil_load):
+        time.sleep(args.seconds)
+    elapsed = time.perf_counter() - start
+    if args.worker:
+        reads, bytes_read, _ = reader.stats_snapshot()
+        frames_dropped = reader.frames_dropped
+        reader.stop()
+    else:
+        reads, bytes_read = reader.reads, reader.bytes_read
+        frames_dropped = 0
+        reader.stop()
+        ser.close()
+    device.stop()
+    reads -= reads_start
+    bytes_read -= bytes_start
+    results = {
+        "mode": "ingest",
+        "io": "worker process" if args.worker else "threads",
+        "gil_load_ms": args.gil_load,
+        "target_rate_hz": args.rate,
+        "lines_per_sec": counts["lines"] / elapsed,
+        "frames_sent_per_sec": (device.frames_sent - frames_start) / elapsed,
+        "reads_per_sec": reads / elapsed,
+        "bytes_per_read": bytes_read / max(1, reads),
+        "pty_bytes_dropped": device.bytes_dropped,
+        "frames_dropped": frames_dropped,
+        "errors": len(errors),
+    }
+    for key, value in percentiles(latencies).items():
+        results[f"latency_ms_{key}"] = value
+    return results
+
+
+class _CallTimer:
+    # Wraps a bound method and accumulates its wall time
+    def __init__(self, func):
+        self.func = func
+        self.calls = 0
+        self.total = 0.0
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            self.total += time.perf_counter() - start
+            self.calls += 1
+
+    def mean_us(self):
+        return self.total / self.calls * 1e6 if self.calls else None
+
+
+def run_gui(args):
+    import tkinter as tk
+    gui = load_gui_module()
+    # Nobody is there to click a dialog (validation warnings etc.), so make them non-blocking
+    gui.messagebox = types.SimpleNamespace(
+        showinfo=lambda *a, **k: None, showwarning=lambda *a, **k: print("warning:", *a),
+        showerror=lambda *a, **k: print("error:", *a), askokcancel=lambda *a, **k: True)
+
+    device = _start_device(args)
+    root = tk.Tk()
+    app = gui.IrisControllerApp(root)
+    app.binary_telemetry.set(args.binary)
+    app.io_process.set(args.worker)
+    app.debug_output.set(not args.no_debug) # Otherwise the app's sync turns DBG| lines off
+
+    timers = {name: _CallTimer(getattr(app, name)) for name in ("read_from_serial", "parse_arduino_data", "update_console")}
+    for name, timer in timers.items():
+        setattr(app, name, timer)
+
+    latencies = []
+    original_render = app.view.render
+    rendered = [None]
+
+    def timed_render():
+        # Labels change in the view model's render at the end of the tick, not in
+        # update_gui_from_arduino_data
+        applied = original_render()
+        frame = app.arduino_data
+        if frame is not None and frame is not rendered[0]:
+            rendered[0] = frame
+            sent = device.sent_times[(frame.ldr_r << 10 | frame.ldr_l) & device.SEQUENCE_MASK]
+            if sent:
+                latencies.append((time.perf_counter() - sent) * 1000)
+        return applied
+
+    app.view.render = timed_render
+
+    app.serial_port = device.port
+    app.connect_serial()
+
+    lags = []
+    probe_ms = 10
+
+    def probe(expected):
+        now = time.perf_counter()
+        lags.append(max(0.0, (now - expected) * 1000))
+        root.after(probe_ms, probe, now + probe_ms / 1000)
+
+    rss_start = rss_kib()
+    frames_start = device.frames_sent
+    lines_start = app.ui_stats["lines_applied"]
+    widget_updates_start = app.view.applied
+    start = time.perf_counter()
+    root.after(probe_ms, probe, start + probe_ms / 1000)
+    root.after(int(args.seconds * 1000), root.quit)
+    with _GilLoad(args.gil_load):
+        root.mainloop()
+    elapsed = time.perf_counter() - start
+    rss_end = rss_kib()
+
+    app.disconnect_serial()
+    root.destroy()
+    device.stop()
+
+    results = {
+        "mode": "gui",
+        "telemetry": "binary" if args.binary else "text",
+        "io": "worker process" if args.worker else "threads",
+        "gil_load_ms": args.gil_load,
+        "target_rate_hz": args.rate,
+        "frames_sent_per_sec": (device.frames_sent - frames_start) / elapsed,
+        "lines_per_sec": (app.ui_stats["lines_applied"] - lines_start) / elapsed,
+        "frames_rendered": app.ui_stats["frames_applied"],
+        "frames_coalesced": app.ui_stats["frames_coalesced"],
+        "dropped_lines": app.ui_stats["dropped"],
+        "max_ui_queue_depth": app.ui_stats["max_queue_depth"],
+        "pty_bytes_dropped": device.bytes_dropped,
+        "widget_updates_per_sec": (app.view.applied - widget_updates_start) / elapsed,
+        "rss_growth_kib": (rss_end - rss_start) if rss_start is not None and rss_end is not None else None,
+    }
+    for key, value in percentiles(latencies).items():
+        results[f"latency_ms_{key}"] = value
+    for key, value in percentiles(lags, (50, 99)).items():
+        results[f"event_loop_lag_ms_{key}"] = value
+    for name, timer in timers.items():
+        results[f"{name}_us"] = timer.mean_us()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput/latency benchmark against the virtual Arduino")
+    parser.add_argument("mode", choices=("ingest", "gui"))
+    parser.add_argument("--rate", type=float, default=1000, help="DATA frames per second from the virtual device")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--no-debug", action="store_true", help="Virtual device omits DBG| lines")
+    parser.add_argument("--binary", action="store_true", help="gui: let the app negotiate binary telemetry")
+    parser.add_argument("--malformed", type=float, default=0.0)
+    parser.add_argument("--worker", action="store_true", help="Serial I/O in a separate process (serial_worker)")
+    parser.add_argument("--gil-load", type=float, default=0.0, metavar="MS",
+                        help="Background thread holding the GIL in MS-long slices")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare with results from an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed regression before failing (fraction)")
+    args = parser.parse_args()
+
+    results = run_ingest(args) if args.mode == "ingest" else run_gui(args)
+    for key, value in results.items():
+        print(f"{key:<28} {value:,.3f}" if isinstance(value, float) else f"{key:<28} {value}")
+    if args.json:
+        save_results(args.json, results)
+    if args.baseline:
+        print(f"Compared with {args.baseline}:")
+        if compare_to_baseline(args.baseline, results, args.tolerance, LOWER_IS_BETTER):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
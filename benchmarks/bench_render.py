@@ -0,0 +1,95 @@
+# --- Widget updates per second: direct label updates vs. the dirty-tracking view model ---
+# Usage: python benchmarks/bench_render.py [--rate 50] [--seconds 600] [--tick-hz 30] [--noise 2]
+#
+# Replays the virtual Arduino's LDR patterns (plus "steady": lights not moving) through the
+# GUI tick's coalescing in simulated time, no display needed, and counts the Tk configure
+# calls the frame-driven widgets would receive:
+#   before      update_gui_from_arduino_data setting the three labels on every rendered frame
+#   no diffing  the same, plus the eight board-reported lesion labels now shown
+#   view model  view_model.ViewModel with the GUI's bindings: only values that changed
+# --noise adds +/- N counts of jitter to every LDR reading, like a real photoresistor.
+import argparse
+import random
+
+from bench_common import save_results # Also puts the repo on sys.path
+
+from telemetry import LESION_FIELDS, DataFrame
+from view_model import ViewModel
+from virtual_arduino import VirtualArduino
+
+PATTERNS = ("sweep", "random", "sequence", "steady")
+LABELS = 3 # LDR L, LDR R, GLL
+
+
+def simulate(pattern, rate, seconds, tick_hz, noise, seed=1):
+    device = VirtualArduino(rate, pattern="sweep" if pattern == "steady" else pattern, seed=seed)
+    device.stop() # Only its frame generator is used; no pty traffic
+    rng = random.Random(seed)
+    calls = {"view_model": 0}
+    view = ViewModel()
+
+    def counted(value):
+        calls["view_model"] += 1
+
+    for name in ("ldr_l", "ldr_r", "gll"):
+        view.bind(name, counted, "---")
+    for field in LESION_FIELDS:
+        view.bind(f"reported_{field}", counted, None)
+
+    steady = device._make_frame(0)
+    frames = int(rate * seconds)
+    ticks = int(tick_hz * seconds)
+    rendered = 0
+    n = 0
+    for tick in range(1, ticks + 1):
+        # Frames that arrived since the previous tick; only the newest one is rendered
+        latest = None
+        while n < frames and n / rate < tick / tick_hz:
+            latest = steady if pattern == "steady" else device._make_frame(n)
+            n += 1
+        if latest is None:
+            continue
+        if noise:
+            latest = DataFrame(max(0, min(1023, latest.ldr_l + rng.randint(-noise, noise))),
+                               max(0, min(1023, latest.ldr_r + rng.randint(-noise, noise))), latest.lesion_mask,
+                               latest.gll, latest.angle_l, latest.angle_r, latest.servo_l, latest.servo_r)
+        rendered += 1
+        # The same sets as IrisControllerApp.update_gui_from_arduino_data
+        view.set("ldr_l", str(latest.ldr_l))
+        view.set("ldr_r", str(latest.ldr_r))
+        view.set("gll", latest.gll.name)
+        for bit, field in enumerate(LESION_FIELDS):
+            view.set(f"reported_{field}", not (latest.lesion_mask >> bit) & 1)
+        view.render()
+    return {
+        "pattern": pattern,
+        "frames_rendered_per_sec": rendered / seconds,
+        "before_calls_per_sec": rendered * LABELS / seconds,
+        "no_diffing_calls_per_sec": rendered * (LABELS + len(LESION_FIELDS)) / seconds,
+        "view_model_calls_per_sec": calls["view_model"] / seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tk calls per second for the frame-driven widgets")
+    parser.add_argument("--rate", type=float, default=50, help="DATA frames per second (50 = the sketch's fastest period)")
+    parser.add_argument("--seconds", type=float, default=600, help="Simulated session length")
+    parser.add_argument("--tick-hz", type=float, default=30, help="GUI ticks per second")
+    parser.add_argument("--noise", type=int, default=0, help="LDR jitter in counts")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'pattern':<10} {'frames/s':>9} {'before':>8} {'no diff':>8} {'view model':>11} {'vs before':>10}")
+    for pattern in PATTERNS:
+        r = simulate(pattern, args.rate, args.seconds, args.tick_hz, args.noise)
+        results[pattern] = r
+        reduction = 1 - r["view_model_calls_per_sec"] / r["before_calls_per_sec"] if r["before_calls_per_sec"] else 0.0
+        print(f"{pattern:<10} {r['frames_rendered_per_sec']:>9.1f} {r['before_calls_per_sec']:>8.1f} "
+              f"{r['no_diffing_calls_per_sec']:>8.1f} {r['view_model_calls_per_sec']:>11.1f} {-reduction:>+10.0%}")
+    if args.json:
+        save_results(args.json, results)
+
+
+if __name__ == "__main__":
+    main()
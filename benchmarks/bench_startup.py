@@ -0,0 +1,78 @@
+# --- Cold-start benchmark ---
+# Launches the GUI (or a frozen build) with IRIS_STARTUP_PROBE pointing at a temp file. The app
+# logs when its window has painted and when the port list is filled in, then closes itself.
+# Times are measured from just before the process is spawned, so they include interpreter
+# start-up and, for a one-file build, unpacking the archive.
+# Usage:
+#   python benchmarks/bench_startup.py --runs 5 --json startup.json [--baseline old.json]
+#   python benchmarks/bench_startup.py --exe dist/IrisReflexSimulator.exe
+# Needs a display. The first run after a reboot or rebuild is the real cold start; later runs
+# hit a warm disk cache, which is why both the first run and the median are reported.
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_common import REPO_DIR, compare_to_baseline, save_results
+
+PROBE_ENV = "IRIS_STARTUP_PROBE" # Must match STARTUP_PROBE_ENV in "Build control.py"
+LOWER_IS_BETTER = {"window_ms_first", "window_ms_median", "window_ms_max",
+                   "ports_ms_first", "ports_ms_median", "ports_ms_max"}
+
+
+def run_once(command, timeout):
+    # Returns {milestone: ms after spawn}
+    fd, probe_path = tempfile.mkstemp(prefix="iris-startup-", suffix=".txt")
+    os.close(fd)
+    env = dict(os.environ, **{PROBE_ENV: probe_path})
+    try:
+        spawned = time.time()
+        subprocess.run(command, env=env, cwd=REPO_DIR, timeout=timeout, check=False)
+        with open(probe_path) as f:
+            marks = dict(line.split() for line in f if line.strip())
+    finally:
+        os.remove(probe_path)
+    return {milestone: (float(stamp) - spawned) * 1000 for milestone, stamp in marks.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time from launch to a painted window and a filled port list")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--exe", help="Time this frozen build instead of running the script with this Python")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds before a run is abandoned")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare with results from an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed regression before failing (fraction)")
+    args = parser.parse_args()
+
+    command = [args.exe] if args.exe else [sys.executable, os.path.join(REPO_DIR, "Build control.py")]
+    samples = {"window": [], "ports": []}
+    for run in range(args.runs):
+        marks = run_once(command, args.timeout)
+        missing = [milestone for milestone in samples if milestone not in marks]
+        if missing:
+            sys.exit(f"Run {run + 1}: the app never reported {', '.join(missing)} (no display, or an old build?)")
+        for milestone in samples:
+            samples[milestone].append(marks[milestone])
+        print(f"run {run + 1}: window {marks['window']:.0f} ms, ports {marks['ports']:.0f} ms")
+
+    results = {"target": args.exe or "script", "runs": args.runs}
+    for milestone, values in samples.items():
+        results[f"{milestone}_ms_first"] = values[0]
+        results[f"{milestone}_ms_median"] = statistics.median(values)
+        results[f"{milestone}_ms_max"] = max(values)
+    for key, value in results.items():
+        print(f"{key:<28} {value:,.1f}" if isinstance(value, float) else f"{key:<28} {value}")
+    if args.json:
+        save_results(args.json, results)
+    if args.baseline:
+        print(f"Compared with {args.baseline}:")
+        if compare_to_baseline(args.baseline, results, args.tolerance, LOWER_IS_BETTER):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# --- Outbound command channel ---
+# A single writer thread per port sends queued commands one at a time, each with a sequence
+# number, and waits for the firmware's "ACK:<seq>,OK|ERR" before sending the next one.
+# Stop-and-wait matters on the Uno: the sketch takes at most one command per loop() pass
+# into a 64-byte buffer, so lines written back to back can run together.
+#
+# Commands submitted under a key replace any not-yet-sent command with the same key, so
+# clicking through ten threshold values while one write is in flight costs one more write,
+# not ten. A command equal to the last one the board acknowledged under its key is dropped.
+import collections
+import threading
+import time
+
+from telemetry import ACK_PREFIX, parse_ack, sequenced_command
+
+
+class CommandChannel:
+    # Seconds; the sketch answers within one loop() pass (LOOP_DELAY_MS = 10 ms), but at 9600
+    # baud the reply can queue behind a DATA/DBG line that takes ~0.1-0.2 s to transmit
+    ACK_TIMEOUT = 1.0
+    SEQ_MODULO = 65536
+
+    # Results passed to on_result
+    RESULT_OK = "ok"
+    RESULT_ERROR = "error" # Board answered ERR (bad format, unknown command, ...)
+    RESULT_TIMEOUT = "timeout" # No ACK within ACK_TIMEOUT
+    RESULT_FAILED = "failed" # The write itself failed
+
+    def __init__(self, write, on_result=None, name="command-writer"):
+        self.write = write # write(line) on the writer thread; raises if the port fails
+        self.on_result = on_result # Writer thread: on_result(command, key, result)
+        self.confirmed = {} # key -> last command the board acknowledged under that key
+        self.awaiting_ack = False # Cheap check for the reader thread before it scans for ACKs
+        self.sent = 0
+        self.acked = 0
+        self.coalesced = 0 # Queued commands replaced by a newer one with the same key
+        self.skipped = 0 # Commands dropped because the board already had them
+        self._queue = collections.OrderedDict() # key -> command, oldest first
+        self._in_flight = None # (key, command)
+        self._ack = None
+        self._seq = 0
+        self._generation = 0 # Bumped by reset() to abandon an in-flight command
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def submit(self, command, key=None):
+        # Returns False if the command was dropped as redundant
+        with self._cond:
+            if key is None:
+                key = object() # Never coalesced
+            elif self._in_flight is not None and self._in_flight[0] == key and key not in self._queue:
+                if self._in_flight[1] == command:
+                    self.skipped += 1
+                    return False
+            elif key not in self._queue and self.confirmed.get(key) == command:
+                self.skipped += 1
+                return False
+            if key in self._queue:
+                self.coalesced += 1
+            self._queue[key] = command
+            self._cond.notify_all()
+        return True
+
+    def pending(self):
+        with self._cond:
+            return len(self._queue) + (self._in_flight is not None)
+
+    def wait_idle(self, timeout):
+        # True once everything submitted so far has been sent and answered (or has failed)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while (self._queue or self._in_flight is not None) and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def reset(self):
+        # The board has reset: forget what it confirmed and abandon queued/in-flight commands
+        with self._cond:
+            self._queue.clear()
+            self.confirmed.clear()
+            self._generation += 1
+            self._cond.notify_all()
+
+    def handle_line(self, line):
+        # Reader thread; returns True if the line was an ACK
+        if not line.startswith(ACK_PREFIX):
+            return False
+        ack = parse_ack(line)
+        if ack is None:
+            return False
+        with self._cond:
+            if self._in_flight is not None and ack[0] == self._seq:
+                self._ack = ack
+                self._cond.notify_all()
+        return True
+
+    def _run(self):
+        cond = self._cond
+        while True:
+            with cond:
+                while not self._queue and not self._closed:
+                    cond.wait()
+                if self._closed:
+                    return
+                key, command = self._queue.popitem(last=False)
+                self._seq = (self._seq + 1) % self.SEQ_MODULO
+                seq = self._seq
+                generation = self._generation
+                self._in_flight = (key, command)
+                self._ack = None
+                self.awaiting_ack = True
+            try:
+                self.write(sequenced_command(seq, command))
+                self.sent += 1
+            except Exception:
+                result = self.RESULT_FAILED
+            else:
+                result = None
+            with cond:
+                if result is None:
+                    deadline = time.monotonic() + self.ACK_TIMEOUT
+                    while self._ack is None and not self._closed and generation == self._generation:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        cond.wait(remaining)
+                    if self._ack is None:
+                        result = self.RESULT_TIMEOUT
+                    elif self._ack[1]:
+                        result = self.RESULT_OK
+                        self.acked += 1
+                        # A reset since the write cleared confirmed for the next board
+                        if isinstance(key, str) and generation == self._generation:
+                            self.confirmed[key] = command
+                    else:
+                        result = self.RESULT_ERROR
+                self._in_flight = None
+                self.awaiting_ack = False
+                abandoned = generation != self._generation
+                cond.notify_all()
+            if not abandoned and self.on_result is not None:
+                self.on_result(command, key if isinstance(key, str) else None, result)
@@ -0,0 +1,293 @@
+# --- Multi-rig device manager ---
+# Owns any number of Arduino connections from one process. Each Rig keeps its own
+# thresholds, lesion states and latest telemetry frame.
+#
+# Threads:
+#   * One shared I/O thread multiplexes every port with a selector where the port exposes
+#     a file descriptor (pyserial on Linux/macOS), so adding rigs does not add threads.
+#   * Ports without a selectable fd (Windows COM ports, RFC2217) fall back to a blocking
+#     serial_link.SerialReader each. These sleep in the driver; nothing busy-polls.
+#   * Opening ports (which includes the Uno's 2 s auto-reset) and outbound writes run on a
+#     small thread pool, so "apply to all rigs" goes out concurrently, not one port at a time.
+import collections
+import concurrent.futures
+import os
+import selectors
+import threading
+import time
+
+from serial_link import READ_TIMEOUT, SerialReader, open_port
+from telemetry import (DEFAULT_HIGH_THRESHOLD, DEFAULT_LOW_THRESHOLD, LESION_NAMES, DataFrame,
+                       TelemetryStreamDecoder, decode_data_line, lesion_mask_from_states, state_command)
+
+
+ARDUINO_RESET_DELAY = 2.0 # Seconds the Uno needs after the port opens (DTR auto-reset)
+
+
+class Rig:
+    STATUS_DISCONNECTED = "disconnected"
+    STATUS_CONNECTING = "connecting"
+    STATUS_LIVE = "live"
+    STATUS_ERROR = "error"
+
+    CONSOLE_LINES = 200 # Recent non-DATA lines kept per rig
+
+    def __init__(self, port, wokwi_url=None):
+        self.port = port
+        self.wokwi_url = wokwi_url
+        self.high_threshold = DEFAULT_HIGH_THRESHOLD
+        self.low_threshold = DEFAULT_LOW_THRESHOLD
+        self.lesion_states = {name: True for name in LESION_NAMES} # True=intact, False=lesion
+        self.status = self.STATUS_DISCONNECTED
+        self.last_error = None
+        self.frame = None # Latest DataFrame
+        self.frames_received = 0
+        self.capture = None # List that every new frame is appended to while a protocol step captures
+        self.console = collections.deque(maxlen=self.CONSOLE_LINES)
+        self.decoder = TelemetryStreamDecoder()
+        self.ser = None
+        self.reader = None # Fallback SerialReader when the port cannot join the selector
+        self._write_lock = threading.Lock()
+
+    @property
+    def lesion_mask(self):
+        return lesion_mask_from_states(self.lesion_states)
+
+    def send(self, command):
+        # Called from the writer pool; one writer per port at a time
+        ser = self.ser
+        if ser is None:
+            return
+        with self._write_lock:
+            ser.write(f"{command}\n".encode("utf-8"))
+
+    def send_state(self):
+        # Lesions and thresholds in one line. Unsequenced, so the sketch answers with a STATE:
+        # line rather than an ACK; rigs are fire-and-forget.
+        self.send(state_command(self.lesion_mask, self.high_threshold, self.low_threshold))
+
+    def handle_items(self, items):
+        # Called from whichever thread read the bytes; only the newest frame is kept
+        for item in items:
+            if isinstance(item, DataFrame):
+                frame = item
+            elif item.startswith("DATA|"):
+                frame = decode_data_line(item)
+                if frame is None:
+                    continue
+            else:
+                if not item.startswith("DBG|"):
+                    self.console.append(item)
+                continue
+            self.frame = frame
+            self.frames_received += 1
+            capture = self.capture
+            if capture is not None:
+                capture.append(frame)
+
+
+class DeviceManager:
+    MAX_IO_WORKERS = 8
+
+    def __init__(self, serial_module, on_change=None):
+        self.serial_module = serial_module # pyserial, passed in so importing this module stays cheap
+        self.on_change = on_change # Called from worker threads with the Rig that changed; keep it cheap
+        self.rigs = {} # port name -> Rig
+        self._lock = threading.Lock()
+        self._dirty = set() # Ports with new telemetry/status since the last pop_dirty()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.MAX_IO_WORKERS,
+                                                               thread_name_prefix="rig-io")
+        self._selector = selectors.DefaultSelector() if os.name == "posix" else None
+        self._selector_lock = threading.Lock()
+        self._io_thread = None
+        self._stopping = False
+        if self._selector is not None:
+            # Self-pipe so register/unregister from other threads can wake the select() call
+            self._wake_r, self._wake_w = os.pipe()
+            os.set_blocking(self._wake_r, False)
+            self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+
+    # --- Rig lifecycle ---
+    def add_rig(self, port, wokwi_url=None):
+        with self._lock:
+            rig = self.rigs.get(port)
+            if rig is None:
+                rig = Rig(port, wokwi_url)
+                self.rigs[port] = rig
+        return rig
+
+    def connect(self, port):
+        rig = self.rigs[port]
+        if rig.status in (Rig.STATUS_CONNECTING, Rig.STATUS_LIVE):
+            return None
+        rig.status = Rig.STATUS_CONNECTING
+        self._mark_dirty(rig)
+        return self._executor.submit(self._open_rig, rig)
+
+    def connect_all(self):
+        return [f for f in (self.connect(port) for port in list(self.rigs)) if f is not None]
+
+    def disconnect(self, port):
+        rig = self.rigs.get(port)
+        if rig is not None:
+            self._close_rig(rig, Rig.STATUS_DISCONNECTED)
+
+    def remove_rig(self, port):
+        self.disconnect(port)
+        with self._lock:
+            self.rigs.pop(port, None)
+            self._dirty.discard(port)
+
+    def shutdown(self):
+        self._stopping = True
+        for rig in list(self.rigs.values()):
+            self._close_rig(rig, Rig.STATUS_DISCONNECTED)
+        if self._selector is not None:
+            os.write(self._wake_w, b"x")
+            if self._io_thread is not None:
+                self._io_thread.join(READ_TIMEOUT * 5)
+            self._selector.close()
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+        self._executor.shutdown(wait=False)
+
+    def _open_rig(self, rig):
+        try:
+            rig.ser = open_port(self.serial_module, rig.port, wokwi_url=rig.wokwi_url)
+            time.sleep(ARDUINO_RESET_DELAY)
+            rig.ser.reset_input_buffer()
+            rig.decoder.reset()
+            self._start_reading(rig)
+            rig.send_state()
+            rig.status = Rig.STATUS_LIVE
+            rig.last_error = None
+        except Exception as e:
+            self._close_rig(rig, Rig.STATUS_ERROR, e)
+            return
+        self._mark_dirty(rig)
+
+    def _close_rig(self, rig, status, error=None):
+        if rig.reader is not None:
+            rig.reader.stop()
+            rig.reader = None
+        ser = rig.ser
+        rig.ser = None
+        if ser is not None:
+            self._unregister(ser)
+            try:
+                ser.close()
+            except Exception:
+                pass
+        rig.status = status
+        if error is not None:
+            rig.last_error = str(error)
+        self._mark_dirty(rig)
+
+    # --- Reading ---
+    def _start_reading(self, rig):
+        fileno = None
+        if self._selector is not None:
+            try:
+                fileno = rig.ser.fileno()
+            except Exception:
+                fileno = None
+        if fileno is None:
+            rig.reader = SerialReader(rig.ser, lambda items, r=rig: self._on_items(r, items),
+                                      lambda e, r=rig: self._close_rig(r, Rig.STATUS_ERROR, e),
+                                      decoder=rig.decoder, name=f"reader-{rig.port}")
+            rig.reader.start()
+            return
+        with self._selector_lock:
+            self._selector.register(fileno, selectors.EVENT_READ, rig)
+            if self._io_thread is None:
+                self._io_thread = threading.Thread(target=self._io_loop, name="rig-selector", daemon=True)
+                self._io_thread.start()
+        os.write(self._wake_w, b"x")
+
+    def _unregister(self, ser):
+        if self._selector is None:
+            return
+        with self._selector_lock:
+            try:
+                self._selector.unregister(ser.fileno())
+            except (KeyError, ValueError, OSError):
+                pass
+        os.write(self._wake_w, b"x")
+
+    def _io_loop(self):
+        selector = self._selector
+        while not self._stopping:
+            try:
+                events = selector.select(timeout=1.0)
+            except (OSError, ValueError):
+                # A port was closed between register and select; just try again
+                continue
+            for key, _ in events:
+                rig = key.data
+                if rig is None:
+                    try:
+                        os.read(self._wake_r, 512)
+                    except BlockingIOError:
+                        pass
+                    continue
+                ser = rig.ser
+                if ser is None:
+                    continue
+                try:
+                    data = ser.read(ser.in_waiting or 1)
+                except Exception as e:
+                    self._close_rig(rig, Rig.STATUS_ERROR, e)
+                    continue
+                if data:
+                    items = rig.decoder.feed(data)
+                    if items:
+                        self._on_items(rig, items)
+
+    def _on_items(self, rig, items):
+        rig.handle_items(items)
+        self._mark_dirty(rig)
+
+    def _mark_dirty(self, rig):
+        with self._lock:
+            self._dirty.add(rig.port)
+        if self.on_change is not None:
+            self.on_change(rig)
+
+    def pop_dirty(self):
+        # Rigs whose frame or status changed since the last call (for coalesced GUI updates)
+        with self._lock:
+            ports = self._dirty
+            self._dirty = set()
+            return [self.rigs[port] for port in ports if port in self.rigs]
+
+    # --- Broadcast actions ---
+    # Offline rigs just record the new state; it is sent when they (re)connect.
+    # The returned futures let callers wait for the writes; the GUI does not.
+    def apply_thresholds(self, high, low, ports=None):
+        futures = []
+        for rig in self._targets(ports):
+            rig.high_threshold = high
+            rig.low_threshold = low
+            if rig.status == Rig.STATUS_LIVE:
+                futures.append(self._executor.submit(self._send, rig, rig.send_state))
+        return futures
+
+    def apply_lesions(self, lesion_states, ports=None):
+        futures = []
+        for rig in self._targets(ports):
+            rig.lesion_states = dict(lesion_states)
+            if rig.status == Rig.STATUS_LIVE:
+                futures.append(self._executor.submit(self._send, rig, rig.send_state))
+        return futures
+
+    def _send(self, rig, send):
+        try:
+            send()
+        except Exception as e:
+            self._close_rig(rig, Rig.STATUS_ERROR, e)
+
+    def _targets(self, ports):
+        with self._lock:
+            if ports is None:
+                return list(self.rigs.values())
+            return [self.rigs[port] for port in ports if port in self.rigs]
@@ -0,0 +1,290 @@
+# --- Headless controller ---
+# The connection, command and telemetry logic of the GUI without Tk, for machines with no
+# display that log rigs overnight. Each --port gets the GUI's SerialConnection (banner wait,
+# state sync, acknowledged commands, reconnect with backoff); nothing here imports tkinter,
+# so `python "Build control.py" --headless ...` also runs where Tk is not installed.
+#
+# Output (stdout or --out FILE) is written through one large buffer and flushed every
+# FLUSH_INTERVAL seconds and at exit, so a fast rig costs a write() call per flush, not per
+# frame. With --ndjson every event is one JSON object per line:
+#   {"type": "frame", "t": 1718000000.123, "port": "/dev/ttyACM0", "LDR_L": 512, ..., "ServoR": 170}
+#   {"type": "line", "t": ..., "port": ..., "text": "Unknown command"}   other lines from the board
+#   {"type": "status", "t": ..., "port": ..., "state": "live", "detail": null}
+#   {"type": "result", "t": ..., "port": ..., "command": "SET_STATE:1,400,600", "result": "ok"}
+#   {"type": "error", "t": ..., "error": "..."}                           a bad stdin command
+# Without --ndjson, frames are not written and the rest is printed as plain text.
+#
+# Commands, one per line on stdin (an optional trailing @PORT picks one rig, default all):
+#   lesions ONL PTNR     lesion exactly these pathways ("lesions none": all intact)
+#   thresholds 400 600   high and low LDR thresholds
+#   status               one status line per rig
+#   quit                 disconnect and exit (so do Ctrl+C, SIGTERM and --duration)
+#
+# Usage: python "Build control.py" --headless --port /dev/ttyACM0 [--port ...] --ndjson [--out log.ndjson]
+import argparse
+import json
+import signal
+import sys
+import threading
+import time
+
+from reflex_engine import validate_thresholds
+from serial_link import SerialConnection
+from telemetry import (DEFAULT_HIGH_THRESHOLD, DEFAULT_LOW_THRESHOLD, DEFAULT_TELEMETRY_PERIOD_MS, LESION_FIELDS,
+                       MAX_TELEMETRY_PERIOD_MS, MIN_TELEMETRY_PERIOD_MS, REPORT_ALL, REPORT_MODES, DataFrame,
+                       TELEM_BIN_COMMAND, debug_command, decode_data_line, period_command, report_command,
+                       state_command)
+
+
+FLUSH_INTERVAL = 1.0 # Seconds between flushes of the output buffer
+OUTPUT_BUFFER = 1 << 20 # Bytes
+STATE_KEY = "SET_STATE"
+WOKWI_PORT_NAME = "Wokwi"
+WOKWI_URL = "rfc2217://localhost:4000"
+
+_FIELD_BITS = {field: bit for bit, field in enumerate(LESION_FIELDS)}
+
+
+class NdjsonWriter:
+    # Thread-safe, buffered; frames are formatted by hand since json.dumps costs several
+    # times more and the fields are all integers. Writes after close() are dropped: a
+    # connection thread that outlives stop()'s join may still report.
+    def __init__(self, stream, ndjson):
+        self.stream = stream
+        self.ndjson = ndjson
+        self._lock = threading.Lock()
+
+    def frames(self, port_json, t, frames):
+        if not self.ndjson:
+            return
+        lines = []
+        for frame in frames:
+            mask = frame.lesion_mask
+            lesions = "".join(f',"{field}":{0 if (mask >> bit) & 1 else 1}' for bit, field in enumerate(LESION_FIELDS))
+            lines.append(f'{{"type":"frame","t":{t:.6f},"port":{port_json},"LDR_L":{frame.ldr_l},"LDR_R":{frame.ldr_r},'
+                         f'"GLL":"{frame.gll.name}","AngleL":{frame.angle_l},"AngleR":{frame.angle_r},'
+                         f'"ServoL":{frame.servo_l},"ServoR":{frame.servo_r}{lesions}}}\n')
+        with self._lock:
+            if self.stream is not None:
+                self.stream.write("".join(lines))
+
+    def event(self, kind, summary, **fields):
+        # summary: the plain-text form, used without --ndjson
+        if self.ndjson:
+            line = json.dumps({"type": kind, "t": round(time.time(), 6), **fields}, separators=(",", ":"))
+        else:
+            line = f"{time.strftime('%Y-%m-%d %H:%M:%S')} {summary}"
+        with self._lock:
+            if self.stream is not None:
+                self.stream.write(line + "\n")
+
+    def flush(self):
+        with self._lock:
+            if self.stream is not None:
+                self.stream.flush()
+
+    def close(self):
+        with self._lock:
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+
+
+class HeadlessRig:
+    def __init__(self, serial_module, port, writer, binary=False, period_ms=DEFAULT_TELEMETRY_PERIOD_MS,
+                 report=REPORT_ALL):
+        self.port = port
+        self.writer = writer
+        self.thresholds = (DEFAULT_HIGH_THRESHOLD, DEFAULT_LOW_THRESHOLD)
+        self.lesion_mask = 0
+        self.binary = binary and port != WOKWI_PORT_NAME # The Wokwi console stays text, as in the GUI
+        self.period_ms = period_ms
+        self.report = report
+        self.frames = 0
+        self._port_json = json.dumps(port)
+        wokwi_url = WOKWI_URL if port == WOKWI_PORT_NAME else None
+        self.connection = SerialConnection(serial_module, port, self.on_items, self.on_state, self.sync_commands,
+                                           wokwi_url=wokwi_url, on_command_result=self.on_command_result,
+                                           name=f"serial-connection-{port}")
+
+    def sync_commands(self):
+        # Supervisor thread, after every (re)connect. DBG lines are always off: nobody reads them here.
+        commands = [(STATE_KEY, self.state_command())]
+        if self.binary:
+            commands.append(("SET_TELEM", TELEM_BIN_COMMAND))
+        return commands + [("SET_PERIOD", period_command(self.period_ms)), ("SET_DBG", debug_command(False)),
+                           ("SET_REPORT", report_command(self.report))]
+
+    def state_command(self):
+        return state_command(self.lesion_mask, *self.thresholds)
+
+    def on_items(self, items):
+        # Reader thread
+        t = time.time()
+        frames = []
+        for item in items:
+            if not isinstance(item, DataFrame):
+                frame = decode_data_line(item) if item.startswith("DATA|") else None
+                if frame is None:
+                    if not item.startswith(("ACK:", "DBG|")): # ACKs come back as results
+                        self.writer.event("line", f"{self.port}: {item}", port=self.port, text=item)
+                    continue
+                item = frame
+            frames.append(item)
+        if frames:
+            self.frames += len(frames)
+            self.writer.frames(self._port_json, t, frames)
+
+    def on_state(self, state, detail):
+        self.writer.event("status", f"{self.port}: {state}" + (f" ({detail})" if detail else ""),
+                          port=self.port, state=state, detail=detail)
+
+    def on_command_result(self, command, key, result):
+        self.writer.event("result", f"{self.port}: {command} -> {result}", port=self.port, command=command,
+                          result=result)
+
+    def set_lesions(self, mask):
+        self.lesion_mask = mask
+        self.connection.send(self.state_command(), STATE_KEY)
+
+    def set_thresholds(self, high, low):
+        self.thresholds = (high, low)
+        self.connection.send(self.state_command(), STATE_KEY)
+
+    def report_status(self):
+        lesions = [field for bit, field in enumerate(LESION_FIELDS) if (self.lesion_mask >> bit) & 1]
+        confirmed = self.connection.commands.confirmed.get(STATE_KEY) == self.state_command()
+        self.writer.event("status", f"{self.port}: {self.connection.state}, {self.frames} frames, thresholds "
+                          f"{self.thresholds[0]}/{self.thresholds[1]}, lesions {' '.join(lesions) or 'none'}"
+                          f"{'' if confirmed else ' (not confirmed)'}",
+                          port=self.port, state=self.connection.state, frames=self.frames,
+                          thresholds=list(self.thresholds), lesions=lesions, confirmed=confirmed)
+
+
+def parse_command(line):
+    # -> (op, args, port or None); raises ValueError
+    words = line.split()
+    port = None
+    if words and words[-1].startswith("@"):
+        port = words.pop()[1:]
+    if not words:
+        raise ValueError("empty command")
+    op, args = words[0].lower(), words[1:]
+    if op == "lesions":
+        mask = 0
+        for word in args:
+            if word.lower() == "none":
+                continue
+            bit = _FIELD_BITS.get(word.upper())
+            if bit is None:
+                raise ValueError(f"unknown pathway {word!r} (expected one of {', '.join(LESION_FIELDS)})")
+            mask |= 1 << bit
+        return op, (mask,), port
+    if op == "thresholds":
+        try:
+            high, low = (int(word) for word in args)
+        except ValueError:
+            raise ValueError("usage: thresholds HIGH LOW") from None
+        error = validate_thresholds(high, low)
+        if error:
+            raise ValueError(error)
+        return op, (high, low), port
+    if op in ("status", "quit") and not args:
+        return op, (), port
+    raise ValueError(f"unknown command {line.strip()!r} (lesions, thresholds, status, quit)")
+
+
+def _read_commands(rigs, writer, stop):
+    # stdin thread; EOF (e.g. stdin from /dev/null under a service manager) just ends it
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            op, args, port = parse_command(line)
+            targets = [rig for rig in rigs if port is None or rig.port == port]
+            if not targets:
+                raise ValueError(f"no rig on {port}")
+        except ValueError as e:
+            writer.event("error", f"error: {e}", error=str(e))
+            continue
+        if op == "quit":
+            stop.set()
+            return
+        for rig in targets:
+            if op == "lesions":
+                rig.set_lesions(*args)
+            elif op == "thresholds":
+                rig.set_thresholds(*args)
+            else:
+                rig.report_status()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='"Build control.py" --headless',
+                                     description="Run the Iris Reflex controller without a GUI")
+    parser.add_argument("--headless", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", action="append", required=True,
+                        help=f"Serial port (repeat for several rigs); {WOKWI_PORT_NAME} for {WOKWI_URL}")
+    parser.add_argument("--ndjson", action="store_true", help="Every frame and event as newline-delimited JSON")
+    parser.add_argument("--out", help="Append the output to this file instead of stdout")
+    parser.add_argument("--binary", action="store_true", help="Ask the boards for binary telemetry")
+    parser.add_argument("--period", type=int, default=DEFAULT_TELEMETRY_PERIOD_MS, help="Telemetry period in ms")
+    parser.add_argument("--report", choices=[mode.lower() for mode in REPORT_MODES], default=REPORT_ALL.lower())
+    parser.add_argument("--thresholds", nargs=2, type=int, metavar=("HIGH", "LOW"), help="Initial thresholds")
+    parser.add_argument("--lesions", help="Initial lesions, e.g. \"ONL PTNR\"")
+    parser.add_argument("--duration", type=float, help="Exit after this many seconds")
+    args = parser.parse_args(argv)
+
+    if not MIN_TELEMETRY_PERIOD_MS <= args.period <= MAX_TELEMETRY_PERIOD_MS:
+        parser.error(f"--period must be {MIN_TELEMETRY_PERIOD_MS}-{MAX_TELEMETRY_PERIOD_MS} ms")
+    initial = []
+    try:
+        if args.thresholds:
+            initial.append(parse_command("thresholds {} {}".format(*args.thresholds)))
+        if args.lesions:
+            initial.append(parse_command(f"lesions {args.lesions}"))
+    except ValueError as e:
+        parser.error(str(e))
+
+    import serial
+    if args.out:
+        stream = open(args.out, "a", encoding="utf-8", buffering=OUTPUT_BUFFER)
+    else:
+        # sys.stdout is line-buffered on a terminal; this one is not
+        stream = open(sys.stdout.fileno(), "w", encoding="utf-8", buffering=OUTPUT_BUFFER, closefd=False)
+    writer = NdjsonWriter(stream, args.ndjson)
+    rigs = [HeadlessRig(serial, port, writer, binary=args.binary, period_ms=args.period, report=args.report.upper())
+            for port in dict.fromkeys(args.port)]
+    for op, values, _ in initial:
+        for rig in rigs:
+            if op == "lesions":
+                rig.lesion_mask = values[0]
+            else:
+                rig.thresholds = values
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    for rig in rigs:
+        rig.connection.start()
+    threading.Thread(target=_read_commands, args=(rigs, writer, stop), name="stdin-commands", daemon=True).start()
+    deadline = time.monotonic() + args.duration if args.duration is not None else None
+    status = 0
+    try:
+        while not stop.wait(FLUSH_INTERVAL if deadline is None else max(0.0, min(FLUSH_INTERVAL, deadline - time.monotonic()))):
+            writer.flush()
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            if all(rig.connection.state == SerialConnection.DISCONNECTED for rig in rigs):
+                status = 1 # Every first connect failed; lost live boards reconnect instead
+                break
+    finally:
+        for rig in rigs:
+            rig.connection.stop()
+        writer.flush()
+        writer.close()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# --- Pipeline instrumentation ---
+# Per-stage latency histograms and throughput counters for the telemetry path:
+#   split       SerialReader: decoder.feed() turning the bytes of one read into lines/frames
+#   handoff     read_from_serial: recorder + UI queue hand-off (reader thread)
+#   queue_wait  bytes returned by read() -> picked up by the GUI tick
+#   parse       parse_arduino_data (decode if needed, oracle check, view-model update)
+#   render      ViewModel.render: the widget updates of one tick
+#   console     update_console
+#   tick        one whole _ui_tick
+#   end_to_end  bytes returned by read() -> labels showing the newest frame
+# Off by default. Every hook is guarded by a single `if probe.enabled` check, so it can stay
+# compiled in on production rigs; nothing is timed, allocated or counted while disabled.
+#
+# Histograms have log-spaced buckets (4 per doubling, 1 us to ~18 min) allocated up front,
+# so memory is fixed however long a session runs; percentiles are accurate to a bucket
+# (about 19%). Each histogram and counter has a single writer thread (reader thread or Tk
+# thread), so there are no locks; a snapshot taken mid-update can be off by one sample.
+import collections
+import math
+import time
+
+
+STAGES = ("split", "handoff", "queue_wait", "parse", "render", "console", "tick", "end_to_end")
+COUNTERS = ("reads", "bytes", "items", "frames_rendered", "console_lines", "widget_updates")
+
+
+def format_us(us):
+    # "850 us", "12.3 ms", "1.25 s"; "-" for no samples
+    if us is None:
+        return "-"
+    if us < 1000:
+        return f"{us:.0f} us"
+    if us < 1e6:
+        return f"{us / 1000:.1f} ms"
+    return f"{us / 1e6:.2f} s"
+
+
+class LatencyHistogram:
+    BUCKETS_PER_OCTAVE = 4
+    OCTAVES = 30 # 2**30 us is about 18 minutes; slower samples land in the last bucket
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (self.BUCKETS_PER_OCTAVE * self.OCTAVES + 1)
+        self.reset()
+
+    def reset(self):
+        counts = self.counts
+        for i in range(len(counts)):
+            counts[i] = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        # Bucket 0 is < 1 us; bucket i covers [2**((i-1)/4), 2**(i/4)) us
+        us = seconds * 1e6
+        if us < 1.0:
+            index = 0
+        else:
+            index = min(int(math.log2(us) * self.BUCKETS_PER_OCTAVE) + 1, len(self.counts) - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += us
+        if us > self.max:
+            self.max = us
+
+    def percentile(self, p):
+        # Upper edge of the bucket holding the p-th percentile, in microseconds (None if empty)
+        if not self.count:
+            return None
+        target = self.count * p / 100
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= target:
+                return min(2 ** (index / self.BUCKETS_PER_OCTAVE), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_us": self.total / self.count if self.count else None,
+            "p50_us": self.percentile(50),
+            "p90_us": self.percentile(90),
+            "p99_us": self.percentile(99),
+            "max_us": self.max if self.count else None,
+        }
+
+
+class PipelineInstrumentation:
+    ARRIVAL_BACKLOG = 1024 # Read timestamps waiting for the GUI tick; older ones are dropped
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stages = {name: LatencyHistogram() for name in STAGES}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        # perf_counter() of each read whose items are still in the UI queue. The reader thread
+        # appends, the Tk thread pops; deque append/popleft are thread-safe.
+        self.arrivals = collections.deque(maxlen=self.ARRIVAL_BACKLOG)
+        self.last_arrival = 0.0 # Reader thread: arrival time of the read being handed off
+        self.started = time.perf_counter()
+
+    def set_enabled(self, enabled):
+        if enabled and not self.enabled:
+            self.reset() # Numbers cover only the time instrumentation was on
+        self.enabled = enabled
+
+    def reset(self):
+        for histogram in self.stages.values():
+            histogram.reset()
+        for name in self.counters:
+            self.counters[name] = 0
+        self.arrivals.clear()
+        self.started = time.perf_counter()
+
+    def record(self, stage, seconds):
+        self.stages[stage].record(seconds)
+
+    def count(self, counter, n=1):
+        self.counters[counter] += n
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "taken_at": time.time(),
+            "elapsed_s": elapsed,
+            "stages": {name: histogram.summary() for name, histogram in self.stages.items()},
+            "counters": {name: {"total": total, "per_sec": total / elapsed if elapsed > 0 else None}
+                         for name, total in self.counters.items()},
+        }
+
+    def export_json(self, path):
+        import json # Export-only; kept off the startup path
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def export_csv(self, path):
+        import csv
+        snapshot = self.snapshot()
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["kind", "name", "count", "mean_us", "p50_us", "p90_us", "p99_us", "max_us", "per_sec"])
+            for name, s in snapshot["stages"].items():
+                writer.writerow(["stage", name, s["count"], s["mean_us"], s["p50_us"], s["p90_us"], s["p99_us"],
+                                 s["max_us"], ""])
+            for name, c in snapshot["counters"].items():
+                writer.writerow(["counter", name, c["total"], "", "", "", "", "", c["per_sec"]])
@@ -0,0 +1,127 @@
+# --- Serial port hot-plug watcher ---
+# A background thread lists the serial ports every POLL_INTERVAL seconds (or at once when
+# rescan() is called) and reports the list only when it differs from the last one, so the GUI
+# touches its port combobox only when a board was actually plugged in or pulled out.
+# comports() costs a few ms of sysfs/SetupAPI queries; that cost stays off the Tk thread.
+#
+# Ports are identified by USB identity (VID:PID plus serial number when the board has one)
+# rather than by name, because an Uno that is unplugged and replugged often comes back as a
+# different COMx or /dev/ttyACMx. PortMemory keeps the last port that reached the live state
+# under that identity, across sessions, so the GUI can reselect (and optionally reconnect to)
+# the same board whatever it is called now.
+import collections
+import json
+import os
+import threading
+
+
+PortInfo = collections.namedtuple("PortInfo", "device key description")
+
+
+def device_key(port):
+    # "2341:0043:75833353934351D0E1A1" / "2341:0043" / None for ports without USB identity
+    if port.vid is None or port.pid is None:
+        return None
+    key = f"{port.vid:04X}:{port.pid:04X}"
+    if port.serial_number:
+        key += f":{port.serial_number}"
+    return key
+
+
+class PortWatcher:
+    POLL_INTERVAL = 2.0 # Seconds between scans
+
+    def __init__(self, comports, on_change, on_error=None, interval=POLL_INTERVAL, name="port-watcher"):
+        self.comports = comports # Returns pyserial ListPortInfo objects; called on the watcher thread only
+        self.on_change = on_change # Watcher thread: on_change([PortInfo, ...]) sorted by device name
+        self.on_error = on_error # Watcher thread: on_error(exception), once per distinct failure
+        self.interval = interval
+        self.ports = None # Last reported list
+        self.scans = 0
+        self._last_error = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def rescan(self, force_report=False):
+        # Scan now instead of at the next poll; force_report also re-sends an unchanged list
+        if force_report:
+            self.ports = None
+        self._wake.set()
+
+    def _scan(self):
+        ports = sorted((PortInfo(port.device, device_key(port), port.description) for port in self.comports()),
+                       key=lambda info: info.device)
+        self.scans += 1
+        return ports
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                ports = self._scan()
+            except Exception as e:
+                if self.on_error is not None and str(e) != self._last_error:
+                    self._last_error = str(e)
+                    self.on_error(e)
+            else:
+                self._last_error = None
+                if ports != self.ports:
+                    self.ports = ports
+                    self.on_change(ports)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+class PortMemory:
+    DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".iris_reflex_ports.json")
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.last_key = None # USB identity of the last port that went live (None for Wokwi etc.)
+        self.last_device = None # Its name at the time
+        self.auto_connect = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return # First run, or an unreadable file: start with nothing remembered
+        if isinstance(data, dict):
+            self.last_key = data.get("last_key")
+            self.last_device = data.get("last_device")
+            self.auto_connect = bool(data.get("auto_connect", False))
+
+    def save(self):
+        try:
+            with open(self.path, "w") as f:
+                json.dump({"last_key": self.last_key, "last_device": self.last_device,
+                           "auto_connect": self.auto_connect}, f, indent=2)
+        except OSError:
+            pass # Remembering the port is a convenience; never fail a connect over it
+
+    def remember(self, device, key):
+        if (device, key) != (self.last_device, self.last_key):
+            self.last_device, self.last_key = device, key
+            self.save()
+
+    def find(self, ports):
+        # Name under which the remembered board is present now, else None. Identity wins over
+        # name: another board that took over the old name is not the same rig.
+        if self.last_key is not None:
+            for info in ports:
+                if info.key == self.last_key:
+                    return info.device
+            return None
+        if any(info.device == self.last_device for info in ports):
+            return self.last_device
+        return None
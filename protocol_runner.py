@@ -0,0 +1,341 @@
+# --- Protocol runner ---
+# Runs a scripted lesion/threshold protocol against one or more rigs and checks every captured
+# frame against reflex_engine, so the README's lesion permutations can be worked through
+# unattended (e.g. an overnight regression run over a bank of boards).
+#
+# Protocol files are plain text, one step per line; '#' starts a comment:
+#   label Left optic nerve        name the steps that follow in the results
+#   lesions ONL PTNR              lesion exactly these pathways (LESION_FIELDS names, or a mask
+#                                 such as 0x41); "lesions none" makes every pathway intact
+#   thresholds 400 600            high/low LDR thresholds
+#   wait 300                      pause N ms
+#   capture 10 [3000]             take M frames per rig, giving up after the timeout (ms)
+# Captured frames only count once they report the commanded lesion mask; older frames that
+# were already on the wire are counted as skipped. Frames do not report thresholds, so put a
+# wait after a thresholds step before capturing.
+#
+# Timing runs on time.monotonic() with absolute deadlines: a wait is measured from the end
+# of the previous step, and back-to-back waits add up exactly instead of each picking up
+# scheduler jitter. Every result carries scheduled_ms/started_ms/lag_ms from the run start.
+#
+# Usage: python protocol_runner.py protocols/lesion_permutations.txt --port /dev/ttyACM0 [--port ...]
+#            [--wokwi] [--out results.json|results.csv] [--check]
+import argparse
+import collections
+import sys
+import threading
+import time
+
+from reflex_engine import evaluate, lesion_names, validate_thresholds
+from telemetry import LESION_FIELDS, LESION_NAMES
+
+
+CAPTURE_POLL = 0.01 # Seconds between checks for newly captured frames
+DEFAULT_CAPTURE_TIMEOUT_MS = 5000
+SET_TIMEOUT = 5.0 # Seconds to wait for the writes of a lesions/thresholds step
+MAX_MISMATCHES = 20 # Mismatching frames listed per result; the rest are only counted
+CHECKED_FIELDS = ("gll", "servo_l", "servo_r")
+WOKWI_URL = "rfc2217://localhost:4000" # Same endpoint as IrisControllerApp.WOKWI_URL
+
+Step = collections.namedtuple("Step", "lineno op args")
+_FIELD_BITS = {field: bit for bit, field in enumerate(LESION_FIELDS)}
+
+
+# --- Parsing ---
+def _parse_int(text, path, lineno, what):
+    try:
+        return int(text, 0)
+    except ValueError:
+        raise ValueError(f"{path}:{lineno}: {what} must be a number, got {text!r}") from None
+
+
+def parse_protocol(text, path="<protocol>"):
+    steps = []
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        op, _, rest = line.partition(" ")
+        op = op.lower()
+        words = rest.split()
+        if op == "label":
+            steps.append(Step(lineno, op, (rest.strip(),)))
+        elif op == "lesions":
+            if not words:
+                raise ValueError(f"{path}:{lineno}: lesions needs pathway names or 'none'")
+            mask = 0
+            for word in words:
+                if word.lower() == "none":
+                    continue
+                if word[0].isdigit():
+                    mask |= _parse_int(word, path, lineno, "lesion mask")
+                elif word.upper() in _FIELD_BITS:
+                    mask |= 1 << _FIELD_BITS[word.upper()]
+                else:
+                    raise ValueError(f"{path}:{lineno}: unknown pathway {word!r} (expected one of {', '.join(LESION_FIELDS)})")
+            if not 0 <= mask <= 0xFF:
+                raise ValueError(f"{path}:{lineno}: lesion mask {mask:#x} is out of range")
+            steps.append(Step(lineno, op, (mask,)))
+        elif op == "thresholds":
+            if len(words) != 2:
+                raise ValueError(f"{path}:{lineno}: thresholds needs <high> <low>")
+            high = _parse_int(words[0], path, lineno, "high threshold")
+            low = _parse_int(words[1], path, lineno, "low threshold")
+            error = validate_thresholds(high, low)
+            if error:
+                raise ValueError(f"{path}:{lineno}: {error}")
+            steps.append(Step(lineno, op, (high, low)))
+        elif op == "wait":
+            if len(words) != 1:
+                raise ValueError(f"{path}:{lineno}: wait needs <ms>")
+            ms = _parse_int(words[0], path, lineno, "wait")
+            if ms < 0:
+                raise ValueError(f"{path}:{lineno}: wait cannot be negative")
+            steps.append(Step(lineno, op, (ms,)))
+        elif op == "capture":
+            if len(words) not in (1, 2):
+                raise ValueError(f"{path}:{lineno}: capture needs <frames> [timeout_ms]")
+            count = _parse_int(words[0], path, lineno, "frame count")
+            timeout_ms = _parse_int(words[1], path, lineno, "timeout") if len(words) == 2 else DEFAULT_CAPTURE_TIMEOUT_MS
+            if count < 1 or timeout_ms < 1:
+                raise ValueError(f"{path}:{lineno}: capture needs a positive frame count and timeout")
+            steps.append(Step(lineno, op, (count, timeout_ms)))
+        else:
+            raise ValueError(f"{path}:{lineno}: unknown step {op!r}")
+    return steps
+
+
+def load_protocol(path):
+    with open(path, encoding="utf-8") as f:
+        return parse_protocol(f.read(), path)
+
+
+def lesion_states_from_mask(mask):
+    # {gui lesion name: True if intact}, as Rig.lesion_states expects
+    return {name: not (mask >> bit) & 1 for bit, name in enumerate(LESION_NAMES)}
+
+
+# --- Running ---
+class ProtocolRunner:
+    def __init__(self, manager, steps, ports=None, on_result=None, on_finished=None):
+        self.manager = manager # device_manager.DeviceManager; rigs should be live before start
+        self.steps = steps
+        self.ports = ports # None = every rig in the manager
+        self.on_result = on_result # Runner thread: on_result(result dict) per rig for each set/capture step
+        self.on_finished = on_finished # Runner thread: on_finished(results, error or None)
+        self.results = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run_thread, name="protocol-runner", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run_thread(self):
+        try:
+            self.run()
+        except Exception as e:
+            if self.on_finished is not None:
+                self.on_finished(self.results, e)
+            return
+        if self.on_finished is not None:
+            self.on_finished(self.results, None)
+
+    def run(self):
+        # Runs on the calling thread; returns the result dicts (also kept in self.results)
+        rigs = self._rigs()
+        if not rigs:
+            raise RuntimeError("No rigs to run the protocol on")
+        start = time.monotonic()
+        deadline = start
+        label = ""
+        for index, step in enumerate(self.steps):
+            if step.op == "label":
+                label = step.args[0]
+                continue
+            if step.op == "wait":
+                deadline += step.args[0] / 1000
+                if self._stop.wait(max(0.0, deadline - time.monotonic())):
+                    break
+                continue
+            started = time.monotonic()
+            if step.op == "capture":
+                outcomes = self._capture(rigs, *step.args)
+            else:
+                outcomes = self._apply(rigs, step)
+            if self._stop.is_set():
+                break
+            for rig, outcome in zip(rigs, outcomes):
+                result = {
+                    "step": index, "line": step.lineno, "op": step.op, "label": label, "rig": rig.port,
+                    "scheduled_ms": round((deadline - start) * 1000, 3),
+                    "started_ms": round((started - start) * 1000, 3),
+                    "lag_ms": round(max(0.0, started - deadline) * 1000, 3),
+                    "lesion_mask": rig.lesion_mask, "lesions": lesion_names(rig.lesion_mask),
+                    "high": rig.high_threshold, "low": rig.low_threshold,
+                }
+                result.update(outcome)
+                self.results.append(result)
+                if self.on_result is not None:
+                    self.on_result(result)
+            deadline = max(deadline, time.monotonic())
+        return self.results
+
+    def _rigs(self):
+        rigs = self.manager.rigs
+        if self.ports is None:
+            return list(rigs.values())
+        return [rigs[port] for port in self.ports if port in rigs]
+
+    def _apply(self, rigs, step):
+        ports = [rig.port for rig in rigs]
+        if step.op == "lesions":
+            futures = self.manager.apply_lesions(lesion_states_from_mask(step.args[0]), ports)
+        else:
+            futures = self.manager.apply_thresholds(*step.args, ports)
+        for future in futures:
+            future.result(SET_TIMEOUT)
+        # The manager only writes to live rigs and drops a rig whose write failed out of live
+        return [{"ok": rig.status == rig.STATUS_LIVE, "frames": 0, "skipped": 0, "mismatched": 0, "mismatches": [],
+                 "error": None if rig.status == rig.STATUS_LIVE else rig.last_error or rig.status} for rig in rigs]
+
+    def _capture(self, rigs, count, timeout_ms):
+        for rig in rigs:
+            rig.capture = []
+        deadline = time.monotonic() + timeout_ms / 1000
+        try:
+            while not self._stop.is_set():
+                if all(sum(frame.lesion_mask == rig.lesion_mask for frame in rig.capture) >= count for rig in rigs):
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._stop.wait(min(CAPTURE_POLL, remaining))
+            captured = [rig.capture for rig in rigs]
+        finally:
+            for rig in rigs:
+                rig.capture = None
+        return [self._check(rig, frames, count) for rig, frames in zip(rigs, captured)]
+
+    @staticmethod
+    def _check(rig, frames, count):
+        mask, high, low = rig.lesion_mask, rig.high_threshold, rig.low_threshold
+        matching = [frame for frame in frames if frame.lesion_mask == mask][:count]
+        mismatches = []
+        mismatched = 0
+        for frame in matching:
+            expected = evaluate(frame.ldr_l, frame.ldr_r, mask, high, low)
+            wrong = [name for name in CHECKED_FIELDS if getattr(frame, name) != getattr(expected, name)]
+            if not wrong:
+                continue
+            mismatched += 1
+            if len(mismatches) < MAX_MISMATCHES:
+                mismatches.append({
+                    "ldr_l": frame.ldr_l, "ldr_r": frame.ldr_r, "fields": wrong,
+                    "observed": {name: _plain(getattr(frame, name)) for name in CHECKED_FIELDS},
+                    "expected": {name: _plain(getattr(expected, name)) for name in CHECKED_FIELDS},
+                })
+        error = None
+        if len(matching) < count:
+            error = f"captured {len(matching)} of {count} frames" + ("" if rig.status == rig.STATUS_LIVE else f" ({rig.status})")
+        elif mismatched:
+            error = f"{mismatched} of {count} frames disagree with the reflex engine"
+        return {"ok": error is None, "frames": len(matching), "skipped": len(frames) - len(matching),
+                "mismatched": mismatched, "mismatches": mismatches, "error": error}
+
+
+def _plain(value):
+    return value.name if hasattr(value, "name") else value
+
+
+# --- Output ---
+CSV_COLUMNS = ("step", "line", "op", "label", "rig", "scheduled_ms", "started_ms", "lag_ms", "lesion_mask",
+               "lesions", "high", "low", "ok", "frames", "skipped", "mismatched", "error")
+
+
+def write_results(results, path):
+    # JSON keeps the per-frame mismatch details; CSV has one summary row per result
+    if path.lower().endswith(".csv"):
+        import csv
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        import json
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"written_at": time.time(), "results": results}, f, indent=2)
+
+
+def summarize(results):
+    failed = [result for result in results if not result["ok"]]
+    lines = [f"{len(results) - len(failed)} of {len(results)} step results passed"]
+    for result in failed:
+        lines.append(f"  line {result['line']} {result['op']} [{result['label'] or '-'}] on {result['rig']}: {result['error']}")
+    if results:
+        lines.append(f"  worst step start lag: {max(result['lag_ms'] for result in results):.1f} ms")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a lesion/threshold protocol against one or more rigs")
+    parser.add_argument("protocol", help="Protocol file (see the top of protocol_runner.py)")
+    parser.add_argument("--port", action="append", default=[], help="Serial port of a rig; repeat for several rigs")
+    parser.add_argument("--wokwi", action="store_true", help=f"Also run on the Wokwi simulator at {WOKWI_URL}")
+    parser.add_argument("--out", help="Write results to this .json or .csv file")
+    parser.add_argument("--connect-timeout", type=float, default=15.0, help="Seconds to wait for every rig to go live")
+    parser.add_argument("--check", action="store_true", help="Only parse the protocol file")
+    args = parser.parse_args()
+
+    try:
+        steps = load_protocol(args.protocol)
+    except (OSError, ValueError) as e:
+        sys.exit(str(e))
+    if args.check:
+        print(f"{args.protocol}: {len(steps)} steps OK")
+        return
+    if not args.port and not args.wokwi:
+        parser.error("give at least one --port (or --wokwi)")
+
+    import serial
+    from device_manager import DeviceManager
+    manager = DeviceManager(serial)
+    try:
+        for port in args.port:
+            manager.add_rig(port)
+        if args.wokwi:
+            manager.add_rig("wokwi", WOKWI_URL)
+        for future in manager.connect_all():
+            future.result(args.connect_timeout)
+        down = [rig for rig in manager.rigs.values() if rig.status != rig.STATUS_LIVE]
+        for rig in down:
+            print(f"{rig.port}: {rig.last_error or rig.status}", file=sys.stderr)
+        if down:
+            sys.exit(1)
+
+        runner = ProtocolRunner(manager, steps, on_result=lambda r: print(
+            f"line {r['line']:>4} {r['op']:<10} {r['rig']:<16} {'ok' if r['ok'] else 'FAIL: ' + r['error']}"))
+        try:
+            results = runner.run()
+        except KeyboardInterrupt:
+            results = runner.results
+            print("Interrupted", file=sys.stderr)
+        if args.out:
+            write_results(results, args.out)
+        print(summarize(results))
+        if not results or not all(result["ok"] for result in results):
+            sys.exit(1)
+    finally:
+        manager.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+# --- Telemetry recording and replay ---
+# A recording is a 32-byte header followed by fixed-width 22-byte records, one per DATA frame:
+#   header: magic "IRISREC1", version u16, record size u16, 4 reserved, wall-clock start f64, 8 reserved
+#   record: t f64 (host monotonic seconds since the start), LDR_L u16, LDR_R u16,
+#           high/low LDR thresholds in force u16 u16, lesion_mask u8, GLL u8,
+#           AngleL i8, AngleR i8, ServoL u8, ServoR u8 (all little-endian)
+# A text DATA line is ~170 bytes, so a recording is about an eighth the size of the raw text.
+#
+# Replay memory-maps the file. Fixed-width records with non-decreasing timestamps make the
+# file its own seek index: record i lives at HEADER_SIZE + i * RECORD_SIZE, so seeking to a
+# time offset is a binary search over the mapped timestamps (O(log n)), never a linear scan.
+# ReplayReader feeds the frames to the same on_items callback a SerialReader would.
+#
+# Usage: python recorder.py info session.irisrec
+#        python recorder.py dump session.irisrec [--start 30] [--end 45]
+import argparse
+import mmap
+import struct
+import threading
+import time
+
+from serial_link import READ_TIMEOUT
+from telemetry import DEFAULT_HIGH_THRESHOLD, DEFAULT_LOW_THRESHOLD, DataFrame, LightLevel, decode_data_line, encode_data_line
+
+
+MAGIC = b"IRISREC1"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sHH4xd8x")
+_RECORD = struct.Struct("<dHHHHBBbbBB")
+_TIMESTAMP = struct.Struct("<d")
+HEADER_SIZE = _HEADER.size # 32
+RECORD_SIZE = _RECORD.size # 22
+FILE_EXTENSION = ".irisrec"
+
+# NumPy view of the records (Recording.columns); field order matches _RECORD
+RECORD_DTYPE = [("t", "<f8"), ("ldr_l", "<u2"), ("ldr_r", "<u2"), ("high", "<u2"), ("low", "<u2"),
+                ("lesion_mask", "u1"), ("gll", "u1"), ("angle_l", "i1"), ("angle_r", "i1"),
+                ("servo_l", "u1"), ("servo_r", "u1")]
+
+_LIGHT_LEVELS = tuple(LightLevel)
+
+
+class TelemetryRecorder:
+    FLUSH_INTERVAL = 1.0 # Seconds between flushes, so a crash loses at most about this much
+
+    def __init__(self, path, thresholds=(DEFAULT_HIGH_THRESHOLD, DEFAULT_LOW_THRESHOLD)):
+        self.path = path
+        # (high, low) the firmware is running with; the GUI updates it when it applies new ones
+        self.thresholds = thresholds
+        self.frames_recorded = 0
+        self._lock = threading.Lock() # record_items runs on the reader thread, close() on the GUI thread
+        self._file = open(path, "wb")
+        self._start = time.monotonic()
+        self._last_flush = self._start
+        self._file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, RECORD_SIZE, time.time()))
+
+    def record_items(self, items, now=None):
+        # Takes the same item lists as SerialReader.on_items: DataFrames (binary mode) and text
+        # lines, of which only well-formed DATA lines are kept. All items of one read share
+        # its arrival time.
+        if now is None:
+            now = time.monotonic()
+        t = now - self._start
+        high, low = self.thresholds
+        pack = _RECORD.pack
+        chunk = bytearray()
+        for item in items:
+            if not isinstance(item, DataFrame):
+                if not item.startswith("DATA|"):
+                    continue
+                item = decode_data_line(item)
+                if item is None:
+                    continue
+            chunk += pack(t, item.ldr_l, item.ldr_r, high, low, item.lesion_mask, item.gll,
+                          item.angle_l, item.angle_r, item.servo_l, item.servo_r)
+        if not chunk:
+            return
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(chunk)
+            self.frames_recorded += len(chunk) // RECORD_SIZE
+            if now - self._last_flush >= self.FLUSH_INTERVAL:
+                self._file.flush()
+                self._last_flush = now
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class Recording:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            header = self._file.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE:
+                raise ValueError(f"{path} is not a telemetry recording (file too short)")
+            magic, version, record_size, self.started_at = _HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a telemetry recording")
+            if version != FORMAT_VERSION or record_size != RECORD_SIZE:
+                raise ValueError(f"{path} uses unsupported recording format {version} ({record_size}-byte records)")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        # A recording cut off mid-write just loses its partial last record
+        self.count = (len(self._map) - HEADER_SIZE) // RECORD_SIZE
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            self._file.close()
+
+    @property
+    def duration(self):
+        return self.timestamp(self.count - 1) if self.count else 0.0
+
+    def timestamp(self, index):
+        return _TIMESTAMP.unpack_from(self._map, HEADER_SIZE + index * RECORD_SIZE)[0]
+
+    def record(self, index):
+        # (t, DataFrame, (high, low))
+        (t, ldr_l, ldr_r, high, low, mask, gll, angle_l, angle_r, servo_l,
+         servo_r) = _RECORD.unpack_from(self._map, HEADER_SIZE + index * RECORD_SIZE)
+        return t, DataFrame(ldr_l, ldr_r, mask, _LIGHT_LEVELS[gll], angle_l, angle_r, servo_l, servo_r), (high, low)
+
+    def index_at(self, seconds):
+        # First record at or after `seconds` (== count when past the end): binary search over
+        # the mapped timestamps, touching ~log2(count) pages
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamp(mid) < seconds:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def frames(self, start=0.0, end=None):
+        # Yields (t, DataFrame) for start <= t < end
+        stop = self.count if end is None else self.index_at(end)
+        for index in range(self.index_at(start), stop):
+            t, frame, _ = self.record(index)
+            yield t, frame
+
+    def columns(self):
+        # Zero-copy NumPy structured array over the mapped records (needs NumPy). Drop the
+        # array (or .copy() it) before close(): a live view keeps the mapping open.
+        from reflex_engine import _import_numpy
+        np = _import_numpy()
+        return np.frombuffer(self._map, dtype=np.dtype(RECORD_DTYPE), count=self.count, offset=HEADER_SIZE)
+
+
+class ReplayReader:
+    # Stands in for serial_link.SerialReader: same start/stop/is_alive/stats_snapshot and the
+    # same on_items callback, so recorded frames go through the live pipeline unchanged.
+    # speed is a multiple of real time (1.0, 10.0, ...); None replays as fast as possible.
+    BATCH_LIMIT = 500 # Max frames per on_items call
+
+    def __init__(self, recording, on_items, on_error, speed=1.0, start=0.0, on_finished=None,
+                 backlog=None, max_backlog=2000, name="replay-reader"):
+        self.recording = recording
+        self.on_items = on_items
+        self.on_error = on_error
+        self.on_finished = on_finished # Called from the replay thread after the last frame
+        self.speed = speed
+        self.start_offset = start
+        # backlog() -> items still waiting downstream. Replay pauses above max_backlog, so
+        # fast replays are not thrown away by a bounded queue the way a flooding port would be.
+        self.backlog = backlog
+        self.max_backlog = max_backlog
+        self.position = start # Recording time of the last frame delivered
+        self.batch = [] # (recording time, (high, low)) of each frame in the on_items call under way
+        self.reads = 0 # on_items calls
+        self.bytes_read = 0 # Record bytes delivered
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(READ_TIMEOUT * 5)
+
+    def stats_snapshot(self):
+        return self.reads, self.bytes_read, time.monotonic()
+
+    def _run(self):
+        recording = self.recording
+        stop = self._stop
+        speed = self.speed
+        try:
+            index = recording.index_at(self.start_offset)
+            count = recording.count
+            if index < count:
+                origin = recording.timestamp(index) # Recording time that maps to wall_origin
+                wall_origin = time.monotonic()
+            while index < count and not stop.is_set():
+                if self.backlog is not None and self.backlog() > self.max_backlog:
+                    stop.wait(0.01)
+                    continue
+                if speed:
+                    due = origin + (time.monotonic() - wall_origin) * speed
+                    next_t = recording.timestamp(index)
+                    if next_t > due:
+                        stop.wait(min((next_t - due) / speed, READ_TIMEOUT))
+                        continue
+                    limit = min(count, index + self.BATCH_LIMIT)
+                    end = index + 1
+                    while end < limit and recording.timestamp(end) <= due:
+                        end += 1
+                else:
+                    end = min(count, index + self.BATCH_LIMIT)
+                items = []
+                batch = []
+                for i in range(index, end):
+                    t, frame, thresholds = recording.record(i)
+                    items.append(frame)
+                    batch.append((t, thresholds))
+                self.position = t
+                self.batch = batch
+                self.reads += 1
+                self.bytes_read += (end - index) * RECORD_SIZE
+                index = end
+                self.on_items(items)
+        except Exception as e:
+            if not stop.is_set():
+                self.on_error(e)
+            return
+        if not stop.is_set() and self.on_finished is not None:
+            self.on_finished()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect telemetry recordings")
+    parser.add_argument("command", choices=("info", "dump"))
+    parser.add_argument("path")
+    parser.add_argument("--start", type=float, default=0.0, help="dump: seconds from the start of the recording")
+    parser.add_argument("--end", type=float, default=None)
+    args = parser.parse_args()
+
+    with Recording(args.path) as recording:
+        if args.command == "info":
+            started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(recording.started_at))
+            print(f"{args.path}: {recording.count} frames over {recording.duration:.1f} s, recorded {started}")
+            return
+        for t, frame in recording.frames(args.start, args.end):
+            print(f"{t:10.3f} {encode_data_line(frame)}")
+
+
+if __name__ == "__main__":
+    main()
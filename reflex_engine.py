@@ -0,0 +1,237 @@
+# --- Headless reflex engine ---
+# A pure-Python copy of the decision logic in loop() of Light_Reflex_Simulator.ino:
+#   1. Afferent gating: an eye's light only counts if its optic nerve AND pretectal nucleus are intact.
+#   2. Global light level: HIGH beats AMBIENT beats LOW beats NO_STIMULUS across both eyes.
+#   3. Efferent gating: an iris only follows the light level if its EWP AND CN3 are intact;
+#      otherwise it stays dilated (+90).
+#   4. angleToServo(): Arduino map() from -90..+90 onto SERVO_MIN_ANGLE..SERVO_MAX_ANGLE.
+# Keep this file in step with the sketch; compare_frame() flags any drift against live telemetry.
+#
+# The batch functions need NumPy, which is only imported when they are called.
+#
+# Usage: python reflex_engine.py --table [--high 400 --low 600] [--masks 0x0,0x1]   (README lesion table)
+import argparse
+
+from telemetry import (DEFAULT_HIGH_THRESHOLD, DEFAULT_LOW_THRESHOLD, LESION_FIELDS, LightLevel)
+
+
+SERVO_MIN_ANGLE = 20 # Fully constricted pupil
+SERVO_MAX_ANGLE = 170 # Fully dilated pupil
+LDR_MIN = 0
+LDR_MAX = 1023
+
+# Lesion mask bits (see telemetry.LESION_FIELDS; a set bit means LESIONED)
+ONL, ONR, PTNL, PTNR, EWPL, EWPR, CN3L, CN3R = (1 << bit for bit in range(8))
+AFFERENT_LEFT = ONL | PTNL
+AFFERENT_RIGHT = ONR | PTNR
+EFFERENT_LEFT = EWPL | CN3L
+EFFERENT_RIGHT = EWPR | CN3R
+
+# Conceptual iris angle for each global light level when the efferent pathway is intact
+ANGLE_FOR_LEVEL = {
+    LightLevel.HIGH_LIGHT: -90, # Constrict fully
+    LightLevel.AMBIENT_LIGHT: 0, # Midline
+    LightLevel.LOW_LIGHT: 90, # Dilate fully
+    LightLevel.NO_STIMULUS: 90, # No stimulus or afferent lesion, remains dilated
+}
+LESIONED_ANGLE = 90 # Efferent lesion, stays dilated
+
+
+def arduino_map(x, in_min, in_max, out_min, out_max):
+    # Arduino's map() uses long arithmetic, i.e. C division that truncates toward zero
+    numerator = (x - in_min) * (out_max - out_min)
+    denominator = in_max - in_min
+    quotient = abs(numerator) // abs(denominator)
+    if (numerator < 0) != (denominator < 0):
+        quotient = -quotient
+    return quotient + out_min
+
+
+def angle_to_servo(angle):
+    return arduino_map(angle, -90, 90, SERVO_MIN_ANGLE, SERVO_MAX_ANGLE)
+
+
+def classify_ldr(ldr, high_threshold, low_threshold):
+    # Light level seen by one eye, ignoring lesions (LDR values fall as light increases)
+    if ldr < high_threshold:
+        return LightLevel.HIGH_LIGHT
+    if ldr <= low_threshold:
+        return LightLevel.AMBIENT_LIGHT
+    return LightLevel.LOW_LIGHT
+
+
+def global_light_level(ldr_l, ldr_r, lesion_mask, high_threshold, low_threshold):
+    # Same priority order as the if/else-if chain in the sketch; LightLevel values are ordered
+    # so that it reduces to a max() over the eyes whose afferent pathway is intact
+    level = LightLevel.NO_STIMULUS
+    if not lesion_mask & AFFERENT_LEFT:
+        level = max(level, classify_ldr(ldr_l, high_threshold, low_threshold))
+    if not lesion_mask & AFFERENT_RIGHT:
+        level = max(level, classify_ldr(ldr_r, high_threshold, low_threshold))
+    return LightLevel(level)
+
+
+class ReflexOutcome:
+    __slots__ = ("gll", "angle_l", "angle_r", "servo_l", "servo_r")
+
+    def __init__(self, gll, angle_l, angle_r, servo_l, servo_r):
+        self.gll = gll
+        self.angle_l = angle_l
+        self.angle_r = angle_r
+        self.servo_l = servo_l
+        self.servo_r = servo_r
+
+    def __eq__(self, other):
+        if not isinstance(other, ReflexOutcome):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return (f"ReflexOutcome(gll={self.gll.name}, angle_l={self.angle_l}, angle_r={self.angle_r}, "
+                f"servo_l={self.servo_l}, servo_r={self.servo_r})")
+
+
+def evaluate(ldr_l, ldr_r, lesion_mask=0, high_threshold=DEFAULT_HIGH_THRESHOLD, low_threshold=DEFAULT_LOW_THRESHOLD):
+    gll = global_light_level(ldr_l, ldr_r, lesion_mask, high_threshold, low_threshold)
+    angle_l = LESIONED_ANGLE if lesion_mask & EFFERENT_LEFT else ANGLE_FOR_LEVEL[gll]
+    angle_r = LESIONED_ANGLE if lesion_mask & EFFERENT_RIGHT else ANGLE_FOR_LEVEL[gll]
+    return ReflexOutcome(gll, angle_l, angle_r, angle_to_servo(angle_l), angle_to_servo(angle_r))
+
+
+def validate_thresholds(high_threshold, low_threshold):
+    # Returns an error message for threshold pairs the firmware would misbehave with, else None
+    for name, value in (("High", high_threshold), ("Low", low_threshold)):
+        if not LDR_MIN <= value <= LDR_MAX:
+            return f"{name} Intensity Threshold must be between {LDR_MIN} and {LDR_MAX}."
+    if high_threshold >= low_threshold:
+        return "High Intensity Threshold must be less than Low Intensity Threshold for correct LDR behavior."
+    return None
+
+
+def compare_frame(frame, high_threshold, low_threshold):
+    # Oracle check for a telemetry.DataFrame: returns the names of fields whose reported value
+    # differs from what the firmware logic should have produced (empty list = consistent)
+    expected = evaluate(frame.ldr_l, frame.ldr_r, frame.lesion_mask, high_threshold, low_threshold)
+    return [name for name in ReflexOutcome.__slots__ if getattr(frame, name) != getattr(expected, name)]
+
+
+# --- Vectorized batch evaluation (NumPy) ---
+class BatchOutcome:
+    # Holds the global light level for every input combination (uint8 LightLevel values).
+    # Angles and servo positions only depend on the GLL and the efferent lesion bits, so they
+    # are derived on access with a table lookup rather than stored up front; for the full
+    # 256 x 1024 x 1024 grid that keeps a result at 256 MiB instead of over a gigabyte.
+    def __init__(self, np, gll, lesion_mask):
+        self._np = np
+        self.gll = gll
+        self.lesion_mask = lesion_mask # Broadcastable against gll
+
+    def _lookup(self, efferent_bits, values_by_level, lesioned_value, dtype):
+        np = self._np
+        table = np.array([values_by_level(level) for level in LightLevel], dtype=dtype)
+        lesioned = (self.lesion_mask & efferent_bits) != 0
+        return np.where(lesioned, table.dtype.type(lesioned_value), table[self.gll])
+
+    @property
+    def angle_l(self):
+        return self._lookup(EFFERENT_LEFT, ANGLE_FOR_LEVEL.__getitem__, LESIONED_ANGLE, self._np.int8)
+
+    @property
+    def angle_r(self):
+        return self._lookup(EFFERENT_RIGHT, ANGLE_FOR_LEVEL.__getitem__, LESIONED_ANGLE, self._np.int8)
+
+    @property
+    def servo_l(self):
+        return self._lookup(EFFERENT_LEFT, lambda level: angle_to_servo(ANGLE_FOR_LEVEL[level]),
+                            angle_to_servo(LESIONED_ANGLE), self._np.uint8)
+
+    @property
+    def servo_r(self):
+        return self._lookup(EFFERENT_RIGHT, lambda level: angle_to_servo(ANGLE_FOR_LEVEL[level]),
+                            angle_to_servo(LESIONED_ANGLE), self._np.uint8)
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError("Batch evaluation needs NumPy: pip install numpy") from e
+    return numpy
+
+
+def evaluate_batch(ldr_l, ldr_r, lesion_mask, high_threshold=DEFAULT_HIGH_THRESHOLD,
+                   low_threshold=DEFAULT_LOW_THRESHOLD):
+    # Element-wise evaluate() over array arguments; ldr_l, ldr_r and lesion_mask broadcast
+    # against each other like any NumPy operands
+    np = _import_numpy()
+    ldr_l = np.asarray(ldr_l)
+    ldr_r = np.asarray(ldr_r)
+    lesion_mask = np.asarray(lesion_mask, dtype=np.uint8)
+
+    def eye_level(ldr, afferent_bits):
+        level = np.where(ldr < high_threshold, np.uint8(LightLevel.HIGH_LIGHT),
+                         np.where(ldr <= low_threshold, np.uint8(LightLevel.AMBIENT_LIGHT),
+                                  np.uint8(LightLevel.LOW_LIGHT))).astype(np.uint8)
+        # A lesioned afferent pathway contributes NO_STIMULUS (0)
+        return level * ((lesion_mask & afferent_bits) == 0).astype(np.uint8)
+
+    gll = np.maximum(eye_level(ldr_l, AFFERENT_LEFT), eye_level(ldr_r, AFFERENT_RIGHT))
+    return BatchOutcome(np, gll, lesion_mask)
+
+
+def evaluate_all_permutations(high_threshold=DEFAULT_HIGH_THRESHOLD, low_threshold=DEFAULT_LOW_THRESHOLD,
+                              ldr_values=None):
+    # All 256 lesion masks x every LDR_L x every LDR_R value in one call.
+    # Result arrays are indexed [lesion_mask, ldr_l index, ldr_r index].
+    np = _import_numpy()
+    if ldr_values is None:
+        ldr_values = np.arange(LDR_MIN, LDR_MAX + 1, dtype=np.int16)
+    ldr_values = np.asarray(ldr_values)
+    masks = np.arange(256, dtype=np.uint8)
+    return evaluate_batch(ldr_values[None, :, None], ldr_values[None, None, :], masks[:, None, None],
+                          high_threshold, low_threshold)
+
+
+# --- README lesion permutation table ---
+def lesion_names(mask):
+    return ", ".join(field for bit, field in enumerate(LESION_FIELDS) if (mask >> bit) & 1) or "None"
+
+
+def permutation_table(high_threshold=DEFAULT_HIGH_THRESHOLD, low_threshold=DEFAULT_LOW_THRESHOLD, masks=range(256)):
+    # Markdown table of servo outcomes for light in the left eye, light in the right eye and darkness
+    bright = max(LDR_MIN, high_threshold - 1)
+    dark = min(LDR_MAX, low_threshold + 1)
+    stimuli = (("Light in Left Eye", bright, dark), ("Light in Right Eye", dark, bright), ("Both Dark", dark, dark))
+    rows = ["| Lesioned Pathway(s) | " + " | ".join(name for name, _, _ in stimuli) + " |",
+            "| :--- |" + " :--- |" * len(stimuli)]
+    for mask in masks:
+        cells = []
+        for _, ldr_l, ldr_r in stimuli:
+            outcome = evaluate(ldr_l, ldr_r, mask, high_threshold, low_threshold)
+            cells.append(f"{outcome.gll.name}: L {outcome.servo_l}°, R {outcome.servo_r}°")
+        rows.append(f"| {lesion_names(mask)} | " + " | ".join(cells) + " |")
+    return "\n".join(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the iris reflex logic without hardware")
+    parser.add_argument("--high", type=int, default=DEFAULT_HIGH_THRESHOLD)
+    parser.add_argument("--low", type=int, default=DEFAULT_LOW_THRESHOLD)
+    parser.add_argument("--table", action="store_true", help="Print the lesion permutation table as Markdown")
+    parser.add_argument("--ldr", type=int, nargs=2, metavar=("LDR_L", "LDR_R"), help="Evaluate a single reading")
+    parser.add_argument("--mask", type=lambda v: int(v, 0), default=0, help="Lesion mask for --ldr (e.g. 0x41)")
+    parser.add_argument("--masks", type=lambda v: [int(m, 0) for m in v.split(",")], default=range(256),
+                        help="Comma-separated lesion masks for --table (default: all 256)")
+    args = parser.parse_args()
+
+    error = validate_thresholds(args.high, args.low)
+    if error:
+        parser.error(error)
+    if args.ldr:
+        print(evaluate(args.ldr[0], args.ldr[1], args.mask, args.high, args.low))
+    if args.table or not args.ldr:
+        print(permutation_table(args.high, args.low, args.masks))
+
+
+if __name__ == "__main__":
+    main()
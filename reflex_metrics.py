@@ -0,0 +1,298 @@
+# --- Streaming reflex metrics ---
+# Turns a stream of DATA frames into quantitative reflex measurements, one frame at a time and
+# in constant memory, so the same code serves the live GUI and multi-hour recordings:
+#   latency     time from an LDR crossing into bright light (LDR < high threshold) to the first
+#               change of each servo, split into direct (same side as the lit eye) and
+#               consensual. Frames carry no board timestamp, so this is measured between host
+#               arrival times and includes the telemetry period.
+#   amplitude   per iris, the servo travel from its position before a light episode to its most
+#               constricted position during it (degrees; positive = constriction)
+#   response    per stimulated eye, how far both pupils constrict from fully dilated while only
+#               that eye is lit. A swinging-flashlight test alternates these episodes.
+#   RAPD        flagged when both eyes have enough single-eye episodes and one eye's mean
+#               response is well below the other's (relative afferent pupillary defect)
+#
+# Every metric keeps Welford's running mean/variance plus P-square quantile estimators
+# (Jain & Chlamtac, 1985: five markers per quantile, no samples stored).
+#
+# Usage: python reflex_metrics.py session.irisrec [--start 30] [--end 600] [--json metrics.json]
+import argparse
+import math
+import threading
+
+from reflex_engine import SERVO_MAX_ANGLE, SERVO_MIN_ANGLE
+from telemetry import DataFrame, decode_data_line
+
+
+RAPD_MIN_EPISODES = 3 # Single-eye episodes per eye before RAPD is judged
+RAPD_ASYMMETRY = 0.5 # (stronger - weaker) / stronger response that counts as a defect
+QUANTILES = (0.5, 0.9)
+LEFT, RIGHT = 0, 1
+SIDES = ("left", "right")
+
+
+class P2Quantile:
+    # Streaming estimate of one quantile in O(1) memory; exact until the fifth sample
+    __slots__ = ("p", "heights", "positions", "desired", "increments")
+
+    def __init__(self, p):
+        self.p = p
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        heights = self.heights
+        if len(heights) < 5:
+            heights.append(x)
+            heights.sort()
+            return
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= heights[k + 1]:
+                k += 1
+        positions = self.positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+        for i in range(1, 4):
+            d = self.desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if d > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i, step):
+        q, n = self.heights, self.positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self):
+        heights = self.heights
+        if not heights:
+            return None
+        if len(heights) < 5:
+            return heights[min(len(heights) - 1, int(round(self.p * (len(heights) - 1))))]
+        return heights[2]
+
+
+class StreamingStat:
+    __slots__ = ("count", "mean", "_m2", "min", "max", "quantiles")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+        self.quantiles = [P2Quantile(p) for p in QUANTILES]
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        if self.min is None or x < self.min:
+            self.min = x
+        if self.max is None or x > self.max:
+            self.max = x
+        for quantile in self.quantiles:
+            quantile.add(x)
+
+    @property
+    def stdev(self):
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else None
+
+    def summary(self):
+        data = {"count": self.count, "mean": self.mean if self.count else None, "stdev": self.stdev,
+                "min": self.min, "max": self.max}
+        for quantile in self.quantiles:
+            data[f"p{int(quantile.p * 100)}"] = quantile.value()
+        return data
+
+
+METRICS = ("latency_direct_ms", "latency_consensual_ms", "amplitude_left", "amplitude_right",
+           "response_left_lit", "response_right_lit")
+
+
+class ReflexMetrics:
+    def __init__(self):
+        self._lock = threading.Lock() # update_items runs on the reader thread, reset() on the GUI thread
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self.stats = {name: StreamingStat() for name in METRICS}
+        self.frames = 0
+        self.no_response = 0 # Light onsets after which an iris did not move before the light changed again
+        self._lit = None # (left lit, right lit) in the previous frame
+        self._servos = None # (servo_l, servo_r) in the previous frame
+        self._pending = [None, None] # Per iris: (onset time, servo before, direct) awaiting a servo change
+        self._episode = None # [lit eye, servos before, most constricted servos so far]
+
+    def update(self, t, frame, high_threshold):
+        # t: seconds on any monotonic clock (host arrival time, or recording time)
+        self.frames += 1
+        lit = (frame.ldr_l < high_threshold, frame.ldr_r < high_threshold)
+        servos = (frame.servo_l, frame.servo_r)
+        previous_lit, previous_servos = self._lit, self._servos
+        self._lit, self._servos = lit, servos
+        if previous_lit is None:
+            return
+
+        # Latency: after a light onset each iris waits for its first servo change
+        pending = self._pending
+        if lit != previous_lit:
+            # The light changed again before the iris moved
+            for iris in (LEFT, RIGHT):
+                if pending[iris] is not None:
+                    self.no_response += 1
+                    pending[iris] = None
+        for iris in (LEFT, RIGHT):
+            if pending[iris] is not None and servos[iris] != pending[iris][1]:
+                onset, _, direct = pending[iris]
+                self.stats["latency_direct_ms" if direct else "latency_consensual_ms"].add((t - onset) * 1000)
+                pending[iris] = None
+        onsets = [eye for eye in (LEFT, RIGHT) if lit[eye] and not previous_lit[eye]]
+        for iris in (LEFT, RIGHT):
+            if not onsets or previous_servos[iris] <= SERVO_MIN_ANGLE:
+                continue # No new light, or already fully constricted
+            if servos[iris] == previous_servos[iris]:
+                pending[iris] = (t, previous_servos[iris], iris in onsets)
+            else:
+                # Moved in the very frame the light arrived (same loop() pass)
+                self.stats["latency_direct_ms" if iris in onsets else "latency_consensual_ms"].add(0.0)
+
+        # Amplitude/response: single-eye light episodes
+        episode = self._episode
+        if lit != previous_lit:
+            if episode is not None:
+                self._close_episode(episode)
+            single = lit[LEFT] != lit[RIGHT]
+            self._episode = [LEFT if lit[LEFT] else RIGHT, previous_servos, list(servos)] if single else None
+        elif episode is not None:
+            constricted = episode[2]
+            for iris in (LEFT, RIGHT):
+                if servos[iris] < constricted[iris]:
+                    constricted[iris] = servos[iris]
+
+    def update_items(self, items, t, high_threshold):
+        # Same item lists as SerialReader.on_items (DataFrames and text lines); all items of
+        # one read share its arrival time
+        with self._lock:
+            for item in items:
+                if not isinstance(item, DataFrame):
+                    if not item.startswith("DATA|"):
+                        continue
+                    item = decode_data_line(item)
+                    if item is None:
+                        continue
+                self.update(t, item, high_threshold)
+
+    def update_records(self, records):
+        # (t, DataFrame, high threshold) per frame, e.g. replayed records with their own times
+        with self._lock:
+            for t, frame, high_threshold in records:
+                self.update(t, frame, high_threshold)
+
+    def _close_episode(self, episode):
+        eye, before, constricted = episode
+        self.stats["amplitude_left"].add(before[LEFT] - constricted[LEFT])
+        self.stats["amplitude_right"].add(before[RIGHT] - constricted[RIGHT])
+        self.stats[f"response_{SIDES[eye]}_lit"].add(SERVO_MAX_ANGLE - (constricted[LEFT] + constricted[RIGHT]) / 2)
+
+    def rapd(self):
+        # (side or None, asymmetry or None); side is the eye with the weaker afferent response
+        left, right = self.stats["response_left_lit"], self.stats["response_right_lit"]
+        if left.count < RAPD_MIN_EPISODES or right.count < RAPD_MIN_EPISODES:
+            return None, None
+        stronger = max(left.mean, right.mean)
+        if stronger <= 0:
+            return None, None
+        asymmetry = abs(left.mean - right.mean) / stronger
+        if asymmetry < RAPD_ASYMMETRY:
+            return None, asymmetry
+        return ("left" if left.mean < right.mean else "right"), asymmetry
+
+    def snapshot(self):
+        side, asymmetry = self.rapd()
+        return {"frames": self.frames, "no_response": self.no_response,
+                "metrics": {name: stat.summary() for name, stat in self.stats.items()},
+                "rapd": {"side": side, "asymmetry": asymmetry}}
+
+    def summary_text(self):
+        # One line for the GUI
+        stats = self.stats
+
+        def fmt(name, unit, field="p50"):
+            value = stats[name].summary()[field]
+            return "-" if value is None else f"{value:.0f}{unit}"
+
+        side, asymmetry = self.rapd()
+        if side is not None:
+            rapd = f"RAPD {side.upper()} ({asymmetry:.0%})"
+        elif asymmetry is not None:
+            rapd = f"no RAPD ({asymmetry:.0%})"
+        else:
+            rapd = (f"RAPD: need {RAPD_MIN_EPISODES} swings per eye "
+                    f"({stats['response_left_lit'].count}/{stats['response_right_lit'].count})")
+        return (f"Latency p50 direct {fmt('latency_direct_ms', ' ms')}, consensual {fmt('latency_consensual_ms', ' ms')}  "
+                f"Amplitude L {fmt('amplitude_left', '°', 'mean')} R {fmt('amplitude_right', '°', 'mean')}  "
+                f"Response L-lit {fmt('response_left_lit', '°', 'mean')} R-lit {fmt('response_right_lit', '°', 'mean')}  "
+                f"{rapd}")
+
+
+def analyze_recording(recording, start=0.0, end=None):
+    # Streams the mapped records through ReflexMetrics using the thresholds stored with each one
+    metrics = ReflexMetrics()
+    stop = recording.count if end is None else recording.index_at(end)
+    for index in range(recording.index_at(start), stop):
+        t, frame, (high, _) = recording.record(index)
+        metrics.update(t, frame, high)
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reflex latency, amplitude and RAPD metrics for a recording")
+    parser.add_argument("path", help="A .irisrec recording")
+    parser.add_argument("--start", type=float, default=0.0, help="Seconds from the start of the recording")
+    parser.add_argument("--end", type=float, default=None)
+    parser.add_argument("--json", help="Also write the metrics to this file")
+    args = parser.parse_args()
+
+    from recorder import Recording
+    with Recording(args.path) as recording:
+        metrics = analyze_recording(recording, args.start, args.end)
+    snapshot = metrics.snapshot()
+    print(f"{args.path}: {snapshot['frames']} frames, {snapshot['no_response']} times an iris did not follow a light onset")
+    for name, summary in snapshot["metrics"].items():
+        values = "  ".join(f"{key} {'-' if value is None else f'{value:.1f}'}" for key, value in summary.items() if key != "count")
+        print(f"{name:<24} n={summary['count']:<6} {values}")
+    side, asymmetry = metrics.rapd()
+    if asymmetry is None:
+        print(f"RAPD: not enough single-eye light episodes (need {RAPD_MIN_EPISODES} per eye)")
+    else:
+        print(f"RAPD: {side.upper() + ' eye' if side else 'none'} (response asymmetry {asymmetry:.0%})")
+    if args.json:
+        import json
+        with open(args.json, "w") as f:
+            json.dump(snapshot, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
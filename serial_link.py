@@ -0,0 +1,287 @@
+# --- Serial reader thread ---
+# Blocks on the port with a short read timeout instead of polling in_waiting and sleeping,
+# reads everything that has arrived in one call, and hands the raw bytes to a
+# TelemetryStreamDecoder that splits lines/frames from an incremental buffer.
+# The timeout bounds how long stop() can take, so shutdown never waits on a hung port.
+import threading
+import time
+
+from command_channel import CommandChannel
+from telemetry import TelemetryStreamDecoder
+
+
+# Port settings shared by every place that opens a rig
+BAUD_RATE = 9600
+READ_TIMEOUT = 0.1 # Seconds a single read may block; also the worst-case stop() latency
+WRITE_TIMEOUT = 1.0 # A dead RFC2217 session must not block the writer forever
+RFC2217_NEGOTIATION_TIMEOUT = 3 # Seconds, passed as ?timeout= to pyserial's rfc2217 handler
+
+
+def open_port(serial_module, port_name, wokwi_url=None):
+    # serial_module is passed in so that importing this module never imports pyserial
+    if wokwi_url is not None:
+        return serial_module.serial_for_url(f"{wokwi_url}?timeout={RFC2217_NEGOTIATION_TIMEOUT}", baudrate=BAUD_RATE,
+                                            timeout=READ_TIMEOUT, write_timeout=WRITE_TIMEOUT)
+    return serial_module.Serial(port_name, BAUD_RATE, timeout=READ_TIMEOUT, write_timeout=WRITE_TIMEOUT)
+
+
+class SerialReader:
+    def __init__(self, ser, on_items, on_error, decoder=None, instrumentation=None, name="serial-reader"):
+        self.ser = ser
+        self.on_items = on_items # Called from the reader thread with a non-empty list of lines/frames
+        self.on_error = on_error # Called from the reader thread once, with the exception that ended it
+        self.decoder = decoder if decoder is not None else TelemetryStreamDecoder()
+        self.instrumentation = instrumentation # Optional instrumentation.PipelineInstrumentation
+        self.reads = 0 # Reads that returned data
+        self.bytes_read = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def stop(self):
+        self._stop.set()
+        # Wake a blocking read immediately where the backend supports it (posix/win32);
+        # otherwise the read returns on its own within READ_TIMEOUT.
+        cancel_read = getattr(self.ser, "cancel_read", None)
+        if cancel_read is not None:
+            try:
+                cancel_read()
+            except Exception:
+                pass
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(READ_TIMEOUT * 5)
+
+    def stats_snapshot(self):
+        return self.reads, self.bytes_read, time.monotonic()
+
+    def _run(self):
+        ser = self.ser
+        stop = self._stop
+        feed = self.decoder.feed
+        instr = self.instrumentation
+        try:
+            while not stop.is_set():
+                # Block for the first byte, then take whatever else is already buffered
+                data = ser.read(1)
+                if not data:
+                    continue # Timeout: just re-check the stop flag
+                timed = instr is not None and instr.enabled
+                if timed:
+                    arrived = time.perf_counter()
+                waiting = ser.in_waiting
+                if waiting:
+                    data += ser.read(waiting)
+                self.reads += 1
+                self.bytes_read += len(data)
+                if timed:
+                    split_start = time.perf_counter()
+                    items = feed(data)
+                    instr.record("split", time.perf_counter() - split_start)
+                    instr.count("reads")
+                    instr.count("bytes", len(data))
+                    instr.count("items", len(items))
+                    instr.last_arrival = arrived
+                else:
+                    items = feed(data)
+                if items:
+                    self.on_items(items)
+        except Exception as e:
+            # Errors caused by stop() closing/cancelling the port are not failures
+            if not stop.is_set():
+                self.on_error(e)
+
+
+# --- Connection state machine ---
+# Runs the whole connect sequence on its own supervisor thread so the GUI never blocks:
+#   connecting -> waiting for banner -> syncing -> live
+# The Uno resets when the port opens and prints its "...Ready." banner from setup(), so
+# the banner, not a fixed sleep, says when the sketch can take commands. Ports that do not
+# reset the board (Wokwi over RFC2217, boards with auto-reset disabled) never print it; after
+# BANNER_TIMEOUT the connection syncs anyway.
+# Syncing sends sync_commands() (current thresholds, lesions, ...) through the acknowledged
+# CommandChannel, so after an automatic reconnect the freshly reset board gets its state back
+# and the host knows whether it took. A connection that has been live
+# reconnects with exponential backoff when the port fails; a first connect that fails just
+# reports the error.
+class SerialConnection:
+    DISCONNECTED = "disconnected"
+    CONNECTING = "connecting"
+    WAITING_FOR_BANNER = "waiting for banner"
+    SYNCING = "syncing"
+    LIVE = "live"
+    RECONNECTING = "reconnecting"
+
+    BANNER = "Ready." # setup() prints "Arduino Iris Reflex Simulation Ready."
+    BANNER_TIMEOUT = 3.0 # Seconds; the Uno's reset and setup() take about 2 s
+    BACKOFF_INITIAL = 0.5 # Seconds before the first reconnect attempt
+    BACKOFF_MAX = 30.0
+    SYNC_TIMEOUT = 3.0 # Seconds to wait for the sync commands to be acknowledged
+
+    def __init__(self, serial_module, port, on_items, on_state, sync_commands, decoder=None, wokwi_url=None,
+                 auto_reconnect=True, on_command_result=None, instrumentation=None, name="serial-connection"):
+        self.serial_module = serial_module
+        self.port = port
+        self.wokwi_url = wokwi_url
+        self.on_items = on_items # Reader thread, like SerialReader.on_items
+        self.on_state = on_state # Supervisor thread: on_state(state, detail or None)
+        self.sync_commands = sync_commands # Supervisor thread: returns [(key, command)]; must not touch Tk
+        self.decoder = decoder if decoder is not None else TelemetryStreamDecoder()
+        self.instrumentation = instrumentation # Passed on to each SerialReader
+        self.auto_reconnect = auto_reconnect
+        self.state = self.DISCONNECTED
+        self.ser = None
+        self.reader = None
+        self.reconnects = 0
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._lost = threading.Event() # Set by a failing read/write, or by stop()
+        self._banner = threading.Event()
+        self._lost_error = None
+        # Writer thread: on_command_result(command, key, result), see CommandChannel
+        self.commands = CommandChannel(self._write_line, on_result=on_command_result, name=f"commands-{port}")
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self.commands.start()
+        self._thread.start()
+
+    def stop(self):
+        # Returns at once; a supervisor stuck in a slow open (RFC2217 negotiation) cleans up
+        # after itself and reports DISCONNECTED when it gets there
+        self._stop.set()
+        self._lost.set()
+        self.commands.close()
+        reader = self.reader
+        if reader is not None:
+            reader.stop()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(READ_TIMEOUT * 5)
+
+    def is_live(self):
+        return self.state == self.LIVE
+
+    def send(self, command, key=None):
+        # Queues the command (see CommandChannel for key); False when there is no link or the
+        # board already has it. Write failures count as a lost connection.
+        if self.ser is None or self.state not in (self.SYNCING, self.LIVE):
+            return False
+        return self.commands.submit(command, key)
+
+    def _write_line(self, line):
+        # CommandChannel's writer thread
+        ser = self.ser
+        if ser is None:
+            raise OSError("port is closed")
+        try:
+            with self._write_lock:
+                ser.write(f"{line}\n".encode("utf-8"))
+        except Exception as e:
+            self._connection_lost(e)
+            raise
+
+    def stats_snapshot(self):
+        reader = self.reader
+        if reader is None:
+            return 0, 0, time.monotonic()
+        return reader.stats_snapshot()
+
+    # --- Supervisor thread ---
+    def _set_state(self, state, detail=None):
+        self.state = state
+        self.on_state(state, detail)
+
+    def _connection_lost(self, error):
+        if self._lost_error is None:
+            self._lost_error = error
+        self._lost.set()
+
+    def _on_items(self, items):
+        if not self._banner.is_set():
+            for item in items:
+                if isinstance(item, str) and self.BANNER in item:
+                    self._banner.set()
+                    break
+        commands = self.commands
+        if commands.awaiting_ack:
+            for item in items:
+                if isinstance(item, str):
+                    commands.handle_line(item)
+        self.on_items(items)
+
+    def _run(self):
+        stop = self._stop
+        was_live = False
+        backoff = self.BACKOFF_INITIAL
+        while not stop.is_set():
+            self._set_state(self.CONNECTING)
+            self._lost.clear()
+            self._lost_error = None
+            self._banner.clear()
+            try:
+                self.ser = open_port(self.serial_module, self.port, wokwi_url=self.wokwi_url)
+            except Exception as e:
+                self._lost_error = e
+            else:
+                if stop.is_set():
+                    break
+                self.decoder.reset()
+                self.reader = SerialReader(self.ser, self._on_items, self._connection_lost, decoder=self.decoder,
+                                           instrumentation=self.instrumentation, name=f"reader-{self.port}")
+                self.reader.start()
+                self._set_state(self.WAITING_FOR_BANNER)
+                banner_seen = self._wait_for_banner()
+                if not self._lost.is_set():
+                    # Whatever the old board confirmed died with its reset; cleared before send() opens
+                    self.commands.reset()
+                    self._set_state(self.SYNCING, None if banner_seen else "no banner; syncing anyway")
+                    sync = self.sync_commands()
+                    for key, command in sync:
+                        self.commands.submit(command, key)
+                    self.commands.wait_idle(self.SYNC_TIMEOUT)
+                    confirmed = all(self.commands.confirmed.get(key) == command for key, command in sync)
+                if not self._lost.is_set():
+                    was_live = True
+                    backoff = self.BACKOFF_INITIAL
+                    self._set_state(self.LIVE, None if confirmed else "state not acknowledged")
+                    self._lost.wait()
+                self._close_port()
+            if stop.is_set():
+                break
+            error = self._lost_error
+            if not (was_live and self.auto_reconnect):
+                self._set_state(self.DISCONNECTED, str(error) if error is not None else None)
+                return
+            self.reconnects += 1
+            self._set_state(self.RECONNECTING, f"retry in {backoff:.1f} s ({error})")
+            if stop.wait(backoff):
+                break
+            backoff = min(backoff * 2, self.BACKOFF_MAX)
+        self._close_port()
+        self._set_state(self.DISCONNECTED)
+
+    def _wait_for_banner(self):
+        # Returns True once the banner arrives; False on timeout or when the port fails first
+        deadline = time.monotonic() + self.BANNER_TIMEOUT
+        while not self._banner.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._lost.is_set():
+                return False
+            self._banner.wait(min(remaining, READ_TIMEOUT))
+        return True
+
+    def _close_port(self):
+        self.commands.reset()
+        reader, self.reader = self.reader, None
+        if reader is not None:
+            reader.stop()
+        ser, self.ser = self.ser, None
+        if ser is not None:
+            try:
+                ser.close()
+            except Exception:
+                pass
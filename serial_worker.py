@@ -0,0 +1,476 @@
+# --- Out-of-process serial I/O ---
+# Optional alternative to running SerialConnection on threads of the GUI process. A worker
+# process owns the port and runs the usual SerialConnection there, so reading, line
+# splitting and DATA parsing never wait for the GUI's GIL (a heavy console redraw otherwise
+# delays reads and bytes pile up in the OS buffer).
+#
+#   worker process                                   GUI process (WorkerConnection)
+#   SerialConnection -> DataFrames --> FrameRing (shared memory) --> pump thread -> on_items
+#                    -> other lines, state, ACK results --> pipe --> pump thread -> callbacks
+#   CommandChannel   <-- commands, sync lists <-------- pipe <---- send()
+#
+# FrameRing is single-producer: fixed 32-byte slots, each stamped with its sequence number
+# (written invalid first and valid last, like a seqlock), and a head counter in the header.
+# The reader takes whatever is new since its last drain; if it falls more than a ring behind,
+# the oldest frames are overwritten and counted as dropped. Text lines other than DATA
+# (banner, ACKs, replies, DBG) are rare and go over the pipe, so their order relative to the
+# frames is only kept to within one read. The worker's reader never waits on the pipe: messages
+# go through an outbox thread, and if the GUI stops draining it the oldest queued text lines
+# are dropped (counted in lines_dropped) rather than letting the port's buffer overflow.
+#
+# WorkerConnection has the interface of SerialConnection that the GUI uses. If the worker
+# dies it is started again (with backoff) and reconnects and resyncs the board, while the
+# GUI and the shared ring stay as they are.
+import collections
+import multiprocessing
+import struct
+import threading
+import time
+
+from telemetry import DataFrame, LightLevel, decode_data_line
+
+
+# --- Shared-memory frame ring ---
+_RING_HEADER = struct.Struct("<QQQQ") # head, reader waiting, reads, bytes read
+_SLOT = struct.Struct("<QdHHBBbbBB6x") # seq, perf_counter() at read, DATA fields
+_SEQ = struct.Struct("<Q")
+_INVALID_SEQ = 2 ** 64 - 1
+RING_HEADER_SIZE = 64
+SLOT_SIZE = _SLOT.size # 32
+DEFAULT_RING_SLOTS = 8192 # About 80 s at the sketch's rate, 1.6 s at 5000 frames/s
+
+_LIGHT_LEVELS = tuple(LightLevel)
+
+
+class FrameRing:
+    def __init__(self, buf, slots):
+        self.buf = buf # memoryview of the shared block
+        self.slots = slots
+        self._head = _RING_HEADER.unpack_from(buf, 0)[0] # Writer: continue after a previous worker
+        self._next = self._head # Reader: next sequence number to read
+        self.dropped = 0 # Reader: frames overwritten (or torn) before they were read
+
+    @staticmethod
+    def size(slots):
+        return RING_HEADER_SIZE + slots * SLOT_SIZE
+
+    # Writer side (worker process)
+    def write(self, t, frame):
+        n = self._head
+        offset = RING_HEADER_SIZE + (n % self.slots) * SLOT_SIZE
+        buf = self.buf
+        _SEQ.pack_into(buf, offset, _INVALID_SEQ)
+        _SLOT.pack_into(buf, offset, _INVALID_SEQ, t, frame.ldr_l, frame.ldr_r, frame.lesion_mask, frame.gll,
+                        frame.angle_l, frame.angle_r, frame.servo_l, frame.servo_r)
+        _SEQ.pack_into(buf, offset, n)
+        self._head = n + 1
+        _SEQ.pack_into(buf, 0, n + 1)
+
+    def add_read_stats(self, reads, nbytes):
+        _, _, total_reads, total_bytes = _RING_HEADER.unpack_from(self.buf, 0)
+        struct.pack_into("<QQ", self.buf, 16, total_reads + reads, total_bytes + nbytes)
+
+    def take_waiting(self):
+        # True if the reader asked to be woken (and clears the request)
+        if _SEQ.unpack_from(self.buf, 8)[0]:
+            _SEQ.pack_into(self.buf, 8, 0)
+            return True
+        return False
+
+    # Reader side (GUI process)
+    def set_waiting(self):
+        _SEQ.pack_into(self.buf, 8, 1)
+
+    def read_stats(self):
+        _, _, reads, nbytes = _RING_HEADER.unpack_from(self.buf, 0)
+        return reads, nbytes
+
+    def read(self):
+        # [(t, DataFrame)] written since the last call, oldest first
+        buf = self.buf
+        head = _SEQ.unpack_from(buf, 0)[0]
+        n = self._next
+        if head - n > self.slots:
+            self.dropped += head - self.slots - n
+            n = head - self.slots
+        frames = []
+        unpack = _SLOT.unpack_from
+        while n < head:
+            offset = RING_HEADER_SIZE + (n % self.slots) * SLOT_SIZE
+            seq, t, ldr_l, ldr_r, mask, gll, angle_l, angle_r, servo_l, servo_r = unpack(buf, offset)
+            if seq == n and _SEQ.unpack_from(buf, offset)[0] == n:
+                frames.append((t, DataFrame(ldr_l, ldr_r, mask, _LIGHT_LEVELS[gll], angle_l, angle_r, servo_l, servo_r)))
+            else:
+                self.dropped += 1 # Overwritten while we were reading it
+            n += 1
+        self._next = head
+        return frames
+
+
+# --- Worker process ---
+class _Worker:
+    SYNC_REPLY_TIMEOUT = 2.0 # Seconds to wait for the GUI's sync list
+    LINE_BACKLOG = 256 # Queued "lines" messages (one per read) before the oldest are dropped
+    FLUSH_TIMEOUT = 1.0 # Seconds the outbox gets to deliver the last messages on exit
+
+    def __init__(self, conn, ring):
+        self.conn = conn
+        self.ring = ring
+        self._outbox = collections.deque()
+        self._outbox_ready = threading.Condition()
+        self._queued_lines = 0
+        self._lines_dropped = 0
+        self._closing = False
+        self._sync_reply = threading.Event()
+        self._sync = []
+        self._decoder_state = None
+        self.connection = None
+
+    def send(self, *message):
+        # Any thread; never blocks on the pipe
+        with self._outbox_ready:
+            outbox = self._outbox
+            if message[0] == "lines":
+                self._queued_lines += 1
+                if self._queued_lines > self.LINE_BACKLOG:
+                    oldest = next(m for m in outbox if m[0] == "lines")
+                    outbox.remove(oldest)
+                    self._queued_lines -= 1
+                    self._lines_dropped += len(oldest[2])
+                message += (self._lines_dropped,)
+            outbox.append(message)
+            self._outbox_ready.notify()
+
+    def _deliver(self):
+        # Outbox thread
+        outbox = self._outbox
+        while True:
+            with self._outbox_ready:
+                while not outbox and not self._closing:
+                    self._outbox_ready.wait()
+                if not outbox:
+                    return
+                message = outbox.popleft()
+                if message[0] == "lines":
+                    self._queued_lines -= 1
+            try:
+                self.conn.send(message)
+            except (OSError, ValueError):
+                return # The GUI went away
+
+    def sync_commands(self):
+        # Supervisor thread: ask the GUI for the current state, keep the last list if it is slow
+        self._sync_reply.clear()
+        self.send("sync_request")
+        self._sync_reply.wait(self.SYNC_REPLY_TIMEOUT)
+        return list(self._sync)
+
+    def on_items(self, items):
+        # Reader thread: frames into the ring, everything else over the pipe
+        now = time.perf_counter()
+        ring = self.ring
+        lines = []
+        wrote = False
+        for item in items:
+            if not isinstance(item, DataFrame):
+                frame = decode_data_line(item) if item.startswith("DATA|") else None
+                if frame is None:
+                    lines.append(item) # Malformed DATA lines too, so the GUI counts them
+                    continue
+                item = frame
+            ring.write(now, item)
+            wrote = True
+        reader = self.connection.reader
+        if reader is not None:
+            ring.add_read_stats(reader.reads - self._reads_seen, reader.bytes_read - self._bytes_seen)
+            self._reads_seen, self._bytes_seen = reader.reads, reader.bytes_read
+        decoder = self.connection.decoder
+        decoder_state = (decoder.mode, decoder.bad_frames)
+        if decoder_state != self._decoder_state:
+            self._decoder_state = decoder_state
+            self.send("decoder", *decoder_state)
+        if lines:
+            self.send("lines", now, lines)
+        elif wrote and ring.take_waiting():
+            self.send("wake")
+
+    def on_state(self, state, detail):
+        self._reads_seen = self._bytes_seen = 0 # A new SerialReader counts from zero
+        self.send("state", state, detail)
+
+    def on_command_result(self, command, key, result):
+        commands = self.connection.commands
+        self.send("result", command, key, result, dict(commands.confirmed), commands.pending())
+
+    def run(self, port, wokwi_url, auto_reconnect):
+        import serial # Imported here: the GUI process may never need pyserial's backends
+        from serial_link import SerialConnection
+        self._reads_seen = self._bytes_seen = 0
+        outbox_thread = threading.Thread(target=self._deliver, name="serial-worker-outbox", daemon=True)
+        outbox_thread.start()
+        self.connection = SerialConnection(serial, port, self.on_items, self.on_state, self.sync_commands,
+                                           wokwi_url=wokwi_url, auto_reconnect=auto_reconnect,
+                                           on_command_result=self.on_command_result, name="serial-connection")
+        self.connection.start()
+        try:
+            while True:
+                message = self.conn.recv()
+                kind = message[0]
+                if kind == "send":
+                    submitted = self.connection.send(message[1], message[2])
+                    commands = self.connection.commands
+                    self.send("commands", submitted, dict(commands.confirmed), commands.pending())
+                elif kind == "sync":
+                    self._sync = message[1]
+                    self._sync_reply.set()
+                elif kind == "stop":
+                    break
+        except (EOFError, OSError):
+            pass # The GUI went away
+        finally:
+            self.connection.stop()
+            with self._outbox_ready:
+                self._closing = True
+                self._outbox_ready.notify()
+            outbox_thread.join(self.FLUSH_TIMEOUT)
+
+
+def _worker_main(conn, shm_name, slots, port, wokwi_url, auto_reconnect):
+    from multiprocessing import shared_memory
+    # Spawned children share the GUI process's resource tracker, so attaching here does not
+    # make the block go away when the worker exits (or crashes); the GUI side unlinks it
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        _Worker(conn, FrameRing(shm.buf, slots)).run(port, wokwi_url, auto_reconnect)
+    finally:
+        conn.close()
+        shm.close()
+
+
+# --- GUI side ---
+class _CommandsMirror:
+    # The parts of CommandChannel the GUI reads, kept in step with the worker's channel
+    def __init__(self):
+        self.on_result = None # Pump thread: on_result(command, key, result)
+        self.confirmed = {}
+        self._pending = 0
+
+    def pending(self):
+        return self._pending
+
+
+class WorkerConnection:
+    # Same states as serial_link.SerialConnection
+    DISCONNECTED = "disconnected"
+    CONNECTING = "connecting"
+    RECONNECTING = "reconnecting"
+    LIVE = "live"
+    SYNCING = "syncing"
+
+    WAKE_TIMEOUT = 0.05 # Seconds the pump sleeps when no wake-up arrives (worker missed the flag)
+    RESTART_INITIAL = 0.5 # Seconds before restarting a crashed worker, doubling per crash
+    RESTART_MAX = 30.0
+    RESTART_RESET_AFTER = 60.0 # A worker that lived this long resets the backoff
+    STOP_TIMEOUT = 3.0
+
+    def __init__(self, serial_module, port, on_items, on_state, sync_commands, decoder=None, wokwi_url=None,
+                 auto_reconnect=True, on_command_result=None, instrumentation=None, ring_slots=DEFAULT_RING_SLOTS,
+                 name="serial-worker"):
+        # serial_module is unused here (the worker imports its own); kept for SerialConnection parity
+        self.port = port
+        self.wokwi_url = wokwi_url
+        self.on_items = on_items # Pump thread, like SerialReader.on_items (frames arrive as DataFrames)
+        self.on_state = on_state # Pump thread: on_state(state, detail or None)
+        self.sync_commands = sync_commands # Pump thread: returns [(key, command)]; must not touch Tk
+        self.decoder = decoder # Mirrors the worker decoder's mode/bad_frames for the status line
+        self.auto_reconnect = auto_reconnect
+        self.instrumentation = instrumentation
+        self.state = self.DISCONNECTED
+        self.commands = _CommandsMirror()
+        self.commands.on_result = on_command_result
+        self.ring_slots = ring_slots
+        self.restarts = 0 # Worker crashes recovered from
+        self.reconnects = 0
+        self.frames_received = 0
+        self.lines_dropped = 0 # Text lines the worker discarded while this side was not reading
+        self._name = name
+        self._context = multiprocessing.get_context("spawn") # No fork: the GUI process has threads
+        self._send_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._process = None
+        self._conn = None
+        self._shm = None
+        self._ring = None
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        from multiprocessing import shared_memory
+        self._shm = shared_memory.SharedMemory(create=True, size=FrameRing.size(self.ring_slots))
+        self._shm.buf[:RING_HEADER_SIZE] = bytes(RING_HEADER_SIZE)
+        self._ring = FrameRing(self._shm.buf, self.ring_slots)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._send("stop")
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(self.STOP_TIMEOUT + 1)
+
+    def is_live(self):
+        return self.state == self.LIVE
+
+    def send(self, command, key=None):
+        # Queued on the worker's CommandChannel; the answer comes back as a "commands" message
+        if self.state not in (self.SYNCING, self.LIVE):
+            return False
+        self.commands._pending += 1 # Until the worker reports its real queue length
+        return self._send("send", command, key)
+
+    def stats_snapshot(self):
+        ring = self._ring
+        if ring is None:
+            return 0, 0, time.monotonic()
+        try:
+            reads, nbytes = ring.read_stats()
+        except ValueError:
+            return 0, 0, time.monotonic() # Shut down while we looked
+        return reads, nbytes, time.monotonic()
+
+    @property
+    def frames_dropped(self):
+        return self._ring.dropped if self._ring is not None else 0
+
+    def _send(self, *message):
+        conn = self._conn
+        if conn is None:
+            return False
+        try:
+            with self._send_lock:
+                conn.send(message)
+        except (OSError, ValueError):
+            return False # Worker gone; the pump notices and restarts it
+        return True
+
+    def _set_state(self, state, detail=None):
+        self.state = state
+        self.on_state(state, detail)
+
+    def _spawn(self):
+        parent, child = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, name=self._name, daemon=True,
+                                        args=(child, self._shm.name, self.ring_slots, self.port, self.wokwi_url,
+                                              self.auto_reconnect))
+        process.start()
+        child.close()
+        self._conn, self._process = parent, process
+
+    def _drain(self):
+        frames = self._ring.read()
+        if not frames:
+            return
+        self.frames_received += len(frames)
+        instr = self.instrumentation
+        if instr is not None and instr.enabled:
+            instr.last_arrival = frames[-1][0] # perf_counter() is system-wide, so the worker's stamps compare
+            instr.count("items", len(frames))
+        self.on_items([frame for _, frame in frames])
+
+    def _handle(self, message):
+        kind = message[0]
+        if kind == "wake":
+            return True
+        if kind == "lines":
+            self._drain() # Frames read before these lines go first
+            self.lines_dropped = message[3]
+            self.on_items(message[2])
+        elif kind == "state":
+            state, detail = message[1], message[2]
+            if state == self.RECONNECTING:
+                self.reconnects += 1
+            # The worker's DISCONNECTED after a failed first connect ends the connection here too
+            self._set_state(state, detail)
+            return state != self.DISCONNECTED or self._stop.is_set()
+        elif kind == "sync_request":
+            self._send("sync", self.sync_commands())
+        elif kind == "result":
+            command, key, result, confirmed, pending = message[1:]
+            self.commands.confirmed, self.commands._pending = confirmed, pending
+            if self.commands.on_result is not None:
+                self.commands.on_result(command, key, result)
+        elif kind == "commands":
+            _, confirmed, pending = message[1:]
+            self.commands.confirmed, self.commands._pending = confirmed, pending
+        elif kind == "decoder" and self.decoder is not None:
+            self.decoder.mode, self.decoder.bad_frames = message[1], message[2]
+        return True
+
+    def _run(self):
+        stop = self._stop
+        backoff = self.RESTART_INITIAL
+        try:
+            while not stop.is_set():
+                self._spawn()
+                started = time.monotonic()
+                if not self._pump():
+                    break # The worker gave up on the port (first connect failed)
+                if stop.is_set():
+                    break
+                # The worker died without being asked to
+                exitcode = self._process.exitcode
+                self._conn.close()
+                self._conn = None
+                self._process.join(0.1)
+                if time.monotonic() - started > self.RESTART_RESET_AFTER:
+                    backoff = self.RESTART_INITIAL
+                self.restarts += 1
+                self._set_state(self.RECONNECTING, f"I/O worker exited ({exitcode}); restarting in {backoff:.1f} s")
+                if stop.wait(backoff):
+                    break
+                backoff = min(backoff * 2, self.RESTART_MAX)
+        finally:
+            self._shutdown()
+
+    def _pump(self):
+        # Returns False once the worker reports DISCONNECTED for good; True when it died or
+        # stop() was called
+        conn, ring, process = self._conn, self._ring, self._process
+        while not self._stop.is_set():
+            self._drain()
+            ring.set_waiting()
+            self._drain() # Frames written between the drain and the flag
+            try:
+                ready = conn.poll(self.WAKE_TIMEOUT)
+                while ready:
+                    if not self._handle(conn.recv()):
+                        return False
+                    ready = conn.poll(0)
+            except (EOFError, OSError):
+                self._drain()
+                process.join(1.0)
+                return True
+            if not process.is_alive():
+                self._drain()
+                return True
+        return True
+
+    def _shutdown(self):
+        self._send("stop")
+        process, conn = self._process, self._conn
+        self._conn = None
+        if process is not None:
+            process.join(self.STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+                process.join(1.0)
+        if conn is not None:
+            conn.close()
+        if self._shm is not None:
+            self._ring = None
+            try:
+                self._shm.close()
+                self._shm.unlink()
+            except (OSError, BufferError):
+                pass
+            self._shm = None
+        if self.state != self.DISCONNECTED:
+            self._set_state(self.DISCONNECTED)
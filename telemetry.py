@@ -0,0 +1,376 @@
+# --- Telemetry frame decoding for the Arduino "DATA|" line ---
+# The firmware prints one DATA line per loop in a fixed field order:
+#   DATA|LDR_L:512,LDR_R:300|MODE:REFLEX|ONL:1,ONR:1,PTNL:1,PTNR:1,EWPL:1,EWPR:1,CN3L:1,CN3R:1|GLL:HIGH_LIGHT|AngleL:-90,AngleR:-90,ServoL:20,ServoR:20
+# This module turns that line into a compact typed record in a single regex match,
+# instead of building a dict of strings that every consumer has to convert again.
+#
+# It also implements the optional binary telemetry mode (SET_TELEM:BIN), where the
+# firmware replaces the DATA/DBG text with 14-byte COBS frames; see TelemetryStreamDecoder.
+import enum
+import re
+import struct
+
+
+# Must match the LightLevel enum order in Light_Reflex_Simulator.ino
+class LightLevel(enum.IntEnum):
+    NO_STIMULUS = 0
+    LOW_LIGHT = 1
+    AMBIENT_LIGHT = 2
+    HIGH_LIGHT = 3
+
+
+# Lesion bit order used everywhere on the Python side (bit 0 = ONL ... bit 7 = CN3R).
+# A SET bit means the pathway is LESIONED, so an all-intact rig has lesion_mask == 0.
+LESION_FIELDS = ("ONL", "ONR", "PTNL", "PTNR", "EWPL", "EWPR", "CN3L", "CN3R")
+
+# Same order, keyed by the names used in the GUI (IrisControllerApp.lesion_pins)
+LESION_NAMES = ("Optic Nerve Left", "Optic Nerve Right", "PTN Left", "PTN Right",
+                "EWP Left", "EWP Right", "CN3 Left", "CN3 Right")
+
+# Arduino pin driving each pathway LED; MUST match the pin definitions in the sketch
+LESION_PINS = dict(zip(LESION_NAMES, (2, 3, 4, 5, 6, 7, 8, 11)))
+
+DEFAULT_HIGH_THRESHOLD = 400 # Matches HIGH_INTENSITY_LDR_THRESHOLD in the sketch
+DEFAULT_LOW_THRESHOLD = 600 # Matches LOW_INTENSITY_LDR_THRESHOLD in the sketch
+
+_LIGHT_LEVELS_BY_NAME = {level.name: level for level in LightLevel}
+
+
+# --- Host -> firmware command lines ---
+def threshold_command(high, low):
+    return f"SET_LDR_THRESH:{high},{low}"
+
+
+def pin_state_command(pin, intact):
+    # 1 (HIGH) = INTACT (LED ON), 0 (LOW) = LESION (LED OFF)
+    return f"SET_PIN_STATE:{pin},{1 if intact else 0}"
+
+
+def state_command(lesion_mask, high, low):
+    # All eight lesion pins (mask bits as in LESION_FIELDS, set = LESION) and both thresholds
+    # in one line, replacing eight SET_PIN_STATE lines and a SET_LDR_THRESH
+    return f"SET_STATE:{lesion_mask},{high},{low}"
+
+
+def lesion_mask_from_states(lesion_states):
+    # {gui lesion name: True if intact} -> lesion mask
+    mask = 0
+    for bit, name in enumerate(LESION_NAMES):
+        if not lesion_states[name]:
+            mask |= 1 << bit
+    return mask
+
+
+# --- Telemetry rate and verbosity ---
+# Defaults and limits MUST match the sketch; it returns to the defaults on every reset.
+DEFAULT_TELEMETRY_PERIOD_MS = 150
+MIN_TELEMETRY_PERIOD_MS = 20
+MAX_TELEMETRY_PERIOD_MS = 10000
+REPORT_ALL = "ALL" # A frame every period
+REPORT_CHANGES = "CHANGES" # Only when an LDR bucket, the lesion mask or a servo angle changed (plus a 1 s heartbeat)
+REPORT_OFF = "OFF" # No telemetry; commands are still answered
+REPORT_MODES = (REPORT_ALL, REPORT_CHANGES, REPORT_OFF)
+
+
+def period_command(period_ms):
+    return f"SET_PERIOD:{period_ms}"
+
+
+def debug_command(enabled):
+    return f"SET_DBG:{'ON' if enabled else 'OFF'}"
+
+
+def report_command(mode):
+    return f"SET_REPORT:{mode}"
+
+
+# --- Sequence-numbered commands ---
+# Any command may be prefixed with "@<seq> "; the firmware then answers "ACK:<seq>,OK" or
+# "ACK:<seq>,ERR" after its normal handling, so the host knows the command took effect.
+# Without the prefix the firmware behaves as before (handy from the Serial Monitor).
+ACK_PREFIX = "ACK:"
+_ACK_RE = re.compile(r"ACK:(\d+),(OK|ERR)$")
+
+
+def sequenced_command(seq, command):
+    return f"@{seq} {command}"
+
+
+def parse_ack(line):
+    # Returns (seq, ok) for an ACK line, else None
+    match = _ACK_RE.match(line)
+    if match is None:
+        return None
+    return int(match.group(1)), match.group(2) == "OK"
+
+
+def _lesion_text(mask):
+    # Wire value '1' = intact (LED ON); the mask records lesions, so a set bit prints '0'
+    return ",".join(f"{field}:{0 if (mask >> bit) & 1 else 1}" for bit, field in enumerate(LESION_FIELDS))
+
+
+# The lesion section only has 256 possible spellings, so decoding it is one dict lookup
+_LESION_MASK_BY_TEXT = {_lesion_text(mask): mask for mask in range(256)}
+
+# Anything after ServoR (extra '|' sections added by newer firmware) is ignored
+_DATA_RE = re.compile(
+    r"DATA\|LDR_L:(-?\d+),LDR_R:(-?\d+)"
+    r"\|MODE:\w+"
+    r"\|(ONL:[01],ONR:[01],PTNL:[01],PTNR:[01],EWPL:[01],EWPR:[01],CN3L:[01],CN3R:[01])"
+    r"\|GLL:([A-Z_]+)"
+    r"\|AngleL:(-?\d+),AngleR:(-?\d+),ServoL:(-?\d+),ServoR:(-?\d+)"
+    r"(?:\|.*)?\s*$"
+)
+
+
+class DataFrame:
+    __slots__ = ("ldr_l", "ldr_r", "lesion_mask", "gll", "angle_l", "angle_r", "servo_l", "servo_r")
+
+    def __init__(self, ldr_l, ldr_r, lesion_mask, gll, angle_l, angle_r, servo_l, servo_r):
+        self.ldr_l = ldr_l
+        self.ldr_r = ldr_r
+        self.lesion_mask = lesion_mask
+        self.gll = gll
+        self.angle_l = angle_l
+        self.angle_r = angle_r
+        self.servo_l = servo_l
+        self.servo_r = servo_r
+
+    def is_intact(self, bit):
+        return not (self.lesion_mask >> bit) & 1
+
+    def lesion_states(self):
+        # {gui lesion name: True if intact}, matching IrisControllerApp.lesion_states
+        mask = self.lesion_mask
+        return {name: not (mask >> bit) & 1 for bit, name in enumerate(LESION_NAMES)}
+
+    def as_dict(self):
+        # Same keys as the firmware line, with typed values
+        data = {"LDR_L": self.ldr_l, "LDR_R": self.ldr_r, "GLL": self.gll.name,
+                "AngleL": self.angle_l, "AngleR": self.angle_r,
+                "ServoL": self.servo_l, "ServoR": self.servo_r}
+        for bit, field in enumerate(LESION_FIELDS):
+            data[field] = 0 if (self.lesion_mask >> bit) & 1 else 1
+        return data
+
+    def __eq__(self, other):
+        if not isinstance(other, DataFrame):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return (f"DataFrame(ldr_l={self.ldr_l}, ldr_r={self.ldr_r}, lesion_mask=0x{self.lesion_mask:02x}, "
+                f"gll={self.gll.name}, angle_l={self.angle_l}, angle_r={self.angle_r}, "
+                f"servo_l={self.servo_l}, servo_r={self.servo_r})")
+
+
+def decode_data_line(line):
+    # Returns a DataFrame, or None if the line is not a complete, well-formed DATA frame
+    match = _DATA_RE.match(line)
+    if match is None:
+        return None
+    ldr_l, ldr_r, lesions, gll, angle_l, angle_r, servo_l, servo_r = match.groups()
+    gll = _LIGHT_LEVELS_BY_NAME.get(gll)
+    if gll is None:
+        return None
+    return DataFrame(int(ldr_l), int(ldr_r), _LESION_MASK_BY_TEXT[lesions], gll,
+                     int(angle_l), int(angle_r), int(servo_l), int(servo_r))
+
+
+def encode_data_line(frame):
+    # Inverse of decode_data_line; produces exactly what the firmware prints
+    return (f"DATA|LDR_L:{frame.ldr_l},LDR_R:{frame.ldr_r}|MODE:REFLEX|{_lesion_text(frame.lesion_mask)}"
+            f"|GLL:{frame.gll.name}|AngleL:{frame.angle_l},AngleR:{frame.angle_r},"
+            f"ServoL:{frame.servo_l},ServoR:{frame.servo_r}")
+
+
+# --- Binary telemetry mode ---
+# Requested with "SET_TELEM:BIN"; the firmware acknowledges with a "TELEM:BIN" text line
+# and from then on every packet on the wire is terminated by a 0x00 byte:
+#   * DATA frames are COBS-encoded so they never contain 0x00 themselves. Decoded layout
+#     (little-endian): type u8 (0xD1), LDR_L u16, LDR_R u16, lesion_mask u8, GLL u8,
+#     AngleL i8, AngleR i8, ServoL u8, ServoR u8, CRC-8 (poly 0x07) over the first 11 bytes.
+#   * Command replies stay readable text ("...\r\n") followed by the 0x00 terminator.
+# "SET_TELEM:TEXT" switches back; the Uno also falls back to text whenever it resets.
+TELEM_BIN_COMMAND = "SET_TELEM:BIN"
+TELEM_TEXT_COMMAND = "SET_TELEM:TEXT"
+TELEM_BIN_ACK = "TELEM:BIN"
+TELEM_TEXT_ACK = "TELEM:TEXT"
+BOOT_BANNER = b"Arduino Iris Reflex Simulation Ready." # First line setup() prints after a reset
+
+BIN_FRAME_DATA = 0xD1
+_BIN_BODY = struct.Struct("<BHHBBbbBB")
+BIN_PAYLOAD_SIZE = _BIN_BODY.size + 1 # + CRC byte
+BIN_ENCODED_SIZE = BIN_PAYLOAD_SIZE + 1 # COBS adds one overhead byte for payloads < 254 bytes
+
+
+def _make_crc8_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+_CRC8_TABLE = _make_crc8_table()
+
+
+def crc8(data):
+    crc = 0
+    for byte in data:
+        crc = _CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+def cobs_encode(data):
+    out = bytearray([0])
+    code_index = 0
+    code = 1
+    for byte in data:
+        if byte == 0:
+            out[code_index] = code
+            code_index = len(out)
+            out.append(0)
+            code = 1
+        else:
+            out.append(byte)
+            code += 1
+            if code == 0xFF:
+                out[code_index] = code
+                code_index = len(out)
+                out.append(0)
+                code = 1
+    out[code_index] = code
+    return bytes(out)
+
+
+def cobs_decode(data):
+    # Returns the decoded bytes, or None if the packet is not valid COBS
+    out = bytearray()
+    index = 0
+    length = len(data)
+    while index < length:
+        code = data[index]
+        if code == 0 or index + code > length:
+            return None
+        out += data[index + 1:index + code]
+        index += code
+        if code < 0xFF and index < length:
+            out.append(0)
+    return bytes(out)
+
+
+def encode_binary_frame(frame):
+    body = _BIN_BODY.pack(BIN_FRAME_DATA, frame.ldr_l, frame.ldr_r, frame.lesion_mask, int(frame.gll),
+                          frame.angle_l, frame.angle_r, frame.servo_l, frame.servo_r)
+    return cobs_encode(body + bytes((crc8(body),))) + b"\x00"
+
+
+def decode_binary_frame(packet):
+    # packet is one 0x00-delimited chunk without the delimiter; returns a DataFrame or None
+    if len(packet) != BIN_ENCODED_SIZE:
+        return None
+    payload = cobs_decode(packet)
+    if payload is None or len(payload) != BIN_PAYLOAD_SIZE or payload[0] != BIN_FRAME_DATA:
+        return None
+    if crc8(payload[:-1]) != payload[-1]:
+        return None
+    _, ldr_l, ldr_r, lesion_mask, gll, angle_l, angle_r, servo_l, servo_r = _BIN_BODY.unpack_from(payload)
+    if gll > LightLevel.HIGH_LIGHT:
+        return None
+    return DataFrame(ldr_l, ldr_r, lesion_mask, LightLevel(gll), angle_l, angle_r, servo_l, servo_r)
+
+
+class TelemetryStreamDecoder:
+    # Incremental decoder for the raw serial byte stream. feed() returns a list whose items
+    # are either text lines (str, stripped) or DataFrame objects decoded from binary packets.
+    # The mode follows the firmware's acknowledgements, so callers never switch it by hand. A
+    # board that resets in binary mode comes back in text without an ack; the decoder notices
+    # its boot banner (or a long run of text lines) and falls back to text by itself.
+    MODE_TEXT = "text"
+    MODE_BINARY = "binary"
+    MAX_PENDING = 4096 # Bytes; a stream with no delimiter this long is garbage, drop it
+    TEXT_RESYNC_BYTES = 256 # Undelimited text lines this long are not a reply (those end in 0x00)
+
+    def __init__(self):
+        self.mode = self.MODE_TEXT
+        self.bad_frames = 0 # Binary packets that failed COBS/CRC/layout checks
+        self._pending = bytearray()
+
+    def reset(self):
+        self.mode = self.MODE_TEXT
+        self._pending.clear()
+
+    def feed(self, data):
+        pending = self._pending
+        pending += data
+        items = []
+        # Walk the buffer with an offset and compact it once at the end, rather than
+        # deleting from the front of the bytearray for every line
+        start = 0
+        while True:
+            delimiter = b"\n" if self.mode == self.MODE_TEXT else b"\x00"
+            end = pending.find(delimiter, start)
+            if end < 0:
+                break
+            packet = bytes(pending[start:end])
+            start = end + 1
+            if self.mode == self.MODE_TEXT:
+                self._handle_text(packet, items)
+            else:
+                self._handle_binary(packet, items)
+        if self.mode == self.MODE_BINARY and len(pending) - start > BIN_ENCODED_SIZE:
+            # More bytes without a 0x00 than any binary packet holds: perhaps the board reset
+            resume = self._find_text_restart(pending, start)
+            if resume is not None:
+                self.mode = self.MODE_TEXT
+                del pending[:resume]
+                return items + self.feed(b"")
+        if start:
+            del pending[:start]
+        if len(pending) > self.MAX_PENDING:
+            pending.clear()
+        return items
+
+    def _find_text_restart(self, pending, start):
+        # Offset where text-mode output begins after start, or None
+        banner = pending.find(BOOT_BANNER, start)
+        if banner >= 0 and pending.find(b"\n", banner) >= 0:
+            return banner
+        end = pending.rfind(b"\n", start)
+        if end - start < self.TEXT_RESYNC_BYTES:
+            return None
+        # Walk back over the printable lines that end at the last newline
+        index = end
+        while index > start and (32 <= pending[index - 1] < 127 or pending[index - 1] in b"\r\n\t"):
+            index -= 1
+        return index if end - index >= self.TEXT_RESYNC_BYTES else None
+
+    def _handle_text(self, packet, items):
+        # NUL bytes left over from binary mode (e.g. the ack's terminator) are not text
+        line = packet.replace(b"\x00", b"").decode("utf-8", errors="replace").strip()
+        if not line:
+            return
+        items.append(line)
+        if line == TELEM_BIN_ACK:
+            self.mode = self.MODE_BINARY
+
+    def _handle_binary(self, packet, items):
+        if not packet:
+            return
+        frame = decode_binary_frame(packet)
+        if frame is not None:
+            items.append(frame)
+            return
+        if packet.endswith(b"\n"):
+            # Command reply sent as text while in binary mode
+            for raw in packet.split(b"\n"):
+                line = raw.decode("utf-8", errors="replace").strip()
+                if line:
+                    items.append(line)
+                    if line == TELEM_TEXT_ACK:
+                        self.mode = self.MODE_TEXT
+            return
+        self.bad_frames += 1
@@ -0,0 +1,381 @@
+# --- Local telemetry fan-out ---
+# Only one program can have the serial port open. The program that has it (the GUI) can
+# publish what it reads on a localhost TCP port so that loggers, dashboards and other
+# windows on the same machine can follow the same board. The stream is newline-delimited
+# JSON, one object per line:
+#
+#   server -> client
+#     {"type": "snapshot", "frame": {...} or null, "t": ..., "state": "live", "port": ..., "thresholds": [400, 600],
+#      "lesions": ["ONL"], "control": false}         first line after connecting, and on request
+#     {"type": "frame", "t": 1718000000.123, "LDR_L": 512, ..., "ServoR": 170}   every DATA frame
+#     {"type": "line", "t": ..., "text": "ACK:3,OK"}  every other line from the board
+#     {"type": "status", "state": "reconnecting", ...}   only the fields that changed
+#     {"type": "dropped", "count": 1234}              this client's total of discarded messages
+#     {"type": "result", "id": 7, "ok": true} / {"type": "result", "id": 7, "ok": false, "error": "..."}
+#   client -> server
+#     {"type": "auth", "token": "..."}                unlocks the two commands below
+#     {"type": "set_thresholds", "high": 400, "low": 600, "id": 7}
+#     {"type": "set_lesions", "lesions": ["ONL", "PTNR"], "id": 8}   exactly these lesioned
+#     {"type": "snapshot"}
+#
+# Frames are encoded once per read and appended to a bounded queue per client. If a client
+# does not keep up, its oldest queued messages are discarded (and counted), so a slow
+# subscriber never holds up the thread that reads the port; publish_items() never blocks
+# and does no socket I/O. One server thread accepts clients and does all the sending and
+# receiving. Commands are only accepted from clients that sent the token the server was
+# started with (none: read-only), and they are not written to the port here: on_request
+# hands them to the owner, which applies them like its own controls, through its one
+# command channel.
+#
+# Usage: python telemetry_server.py [--port 8765] [--token T] [--lesions ONL PTNR | --thresholds 400 600]
+#   subscribes and prints the stream, or sends one command and prints its result
+import argparse
+import collections
+import hmac
+import json
+import selectors
+import socket
+import threading
+import time
+
+from telemetry import LESION_FIELDS, LESION_NAMES, DataFrame, decode_data_line
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+CLIENT_BUFFER = 4096 # Messages queued per client before the oldest are dropped
+MAX_REQUEST_BYTES = 4096 # Longest accepted client line
+SEND_CHUNK = 65536 # Bytes joined per send() call
+
+_FIELD_BITS = {field: bit for bit, field in enumerate(LESION_FIELDS)}
+
+
+def _encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+
+def lesions_from_states(lesion_states):
+    # {gui lesion name: True if intact} -> ["ONL", ...] (the lesioned pathways)
+    return [field for field, name in zip(LESION_FIELDS, LESION_NAMES) if not lesion_states.get(name, True)]
+
+
+class _Client:
+    __slots__ = ("sock", "address", "queue", "dropped", "reported_dropped", "unsent", "inbox", "control")
+
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.queue = collections.deque(maxlen=CLIENT_BUFFER) # Encoded messages; full = drop oldest
+        self.dropped = 0 # Written by publishers only
+        self.reported_dropped = 0
+        self.unsent = b"" # Tail of a message the socket did not take yet
+        self.inbox = b""
+        self.control = False
+
+
+class TelemetryServer:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, token=None, on_request=None, name="telemetry-server"):
+        self.host = host
+        self.port = port # 0 picks a free port; the real one is set by start()
+        self.token = token # Clients must send this to submit commands; None = read-only
+        self.on_request = on_request # Server thread: on_request(action, value, reply, address)
+        self.status = {} # Connection state, port, thresholds, lesions: part of every snapshot
+        self.clients_served = 0
+        self._latest = None # (t, DataFrame) of the newest frame
+        self._clients = () # Replaced, never mutated, so publishers can iterate without a lock
+        self._status_lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._listener = None
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_pending = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    # --- Owner side (any thread) ---
+    def start(self):
+        # Raises OSError if the port is taken
+        listener = socket.create_server((self.host, self.port))
+        listener.setblocking(False)
+        self._listener = listener
+        self.port = listener.getsockname()[1]
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(listener, selectors.EVENT_READ)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake(force=True)
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(1.0)
+
+    @property
+    def client_count(self):
+        return len(self._clients)
+
+    def publish_items(self, items, t=None):
+        # Reader thread: the same item lists as SerialReader.on_items. Never blocks.
+        t = time.time() if t is None else t
+        clients = self._clients
+        latest = None
+        messages = []
+        for item in items:
+            if not isinstance(item, DataFrame):
+                frame = decode_data_line(item) if item.startswith("DATA|") else None
+                if frame is None:
+                    if clients:
+                        messages.append(_encode({"type": "line", "t": t, "text": item}))
+                    continue
+                item = frame
+            latest = item
+            if clients:
+                message = item.as_dict()
+                message["type"] = "frame"
+                message["t"] = t
+                messages.append(_encode(message))
+        if latest is not None:
+            self._latest = (t, latest)
+        if messages:
+            for client in clients:
+                self._enqueue(client, messages)
+            self._wake()
+
+    def set_status(self, **fields):
+        # Any thread: remembered for snapshots and sent to every client (only if it changed)
+        with self._status_lock:
+            changed = {key: value for key, value in fields.items() if self.status.get(key) != value}
+            self.status.update(changed)
+        if changed:
+            self._broadcast({"type": "status", **changed})
+
+    # --- Internals ---
+    def _enqueue(self, client, messages):
+        queue = client.queue
+        overflow = len(queue) + len(messages) - CLIENT_BUFFER
+        if overflow > 0:
+            client.dropped += overflow # deque(maxlen) discards them from the old end
+        queue.extend(messages)
+
+    def _broadcast(self, message):
+        clients = self._clients
+        if clients:
+            encoded = [_encode(message)]
+            for client in clients:
+                self._enqueue(client, encoded)
+            self._wake()
+
+    def _reply(self, client, request_id, error=None):
+        message = {"type": "result", "id": request_id, "ok": error is None}
+        if error is not None:
+            message["error"] = error
+        self._enqueue(client, [_encode(message)])
+        self._wake()
+
+    def _wake(self, force=False):
+        # One pending wake-up byte is enough however many publishes happen before the server runs
+        if self._wake_pending and not force:
+            return
+        self._wake_pending = True
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            pass # Socket buffer full (a wake-up is pending anyway) or already closed
+
+    def _snapshot(self, client):
+        with self._status_lock:
+            message = {"type": "snapshot", "frame": None, "t": None, **self.status, "control": client.control}
+        latest = self._latest
+        if latest is not None:
+            message["t"], message["frame"] = latest[0], latest[1].as_dict()
+        return _encode(message)
+
+    # --- Server thread ---
+    def _run(self):
+        selector = self._selector
+        try:
+            while not self._stop.is_set():
+                for key, events in selector.select():
+                    sock = key.fileobj
+                    if sock is self._listener:
+                        self._accept()
+                    elif sock is self._wake_r:
+                        self._wake_pending = False
+                        try:
+                            while self._wake_r.recv(4096):
+                                pass
+                        except OSError:
+                            pass
+                    else:
+                        client = key.data
+                        if events & selectors.EVENT_READ and not self._receive(client):
+                            continue
+                # Sending happens here for every client, whatever woke us up
+                for client in self._clients:
+                    self._flush(client)
+        finally:
+            for client in self._clients:
+                self._close(client)
+            selector.close()
+            self._listener.close()
+            self._wake_r.close()
+            self._wake_w.close()
+
+    def _accept(self):
+        try:
+            sock, address = self._listener.accept()
+        except OSError:
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # Frames are small and latency matters
+        client = _Client(sock, address)
+        client.queue.append(self._snapshot(client))
+        self._selector.register(sock, selectors.EVENT_READ, client)
+        self._clients = self._clients + (client,)
+        self.clients_served += 1
+
+    def _close(self, client):
+        if client in self._clients:
+            self._clients = tuple(c for c in self._clients if c is not client)
+        try:
+            self._selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+
+    def _receive(self, client):
+        try:
+            data = client.sock.recv(4096)
+        except BlockingIOError:
+            return True
+        except OSError:
+            data = b""
+        if not data:
+            self._close(client)
+            return False
+        lines = (client.inbox + data).split(b"\n")
+        client.inbox = lines.pop()
+        if len(client.inbox) > MAX_REQUEST_BYTES:
+            self._close(client)
+            return False
+        for line in lines:
+            if line.strip():
+                self._handle_request(client, line)
+        return True
+
+    def _handle_request(self, client, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            request = None
+        if not isinstance(request, dict):
+            self._reply(client, None, "expected one JSON object per line")
+            return
+        kind = request.get("type")
+        request_id = request.get("id")
+        if kind == "snapshot":
+            client.queue.append(self._snapshot(client))
+        elif kind == "auth":
+            token = request.get("token")
+            client.control = (self.token is not None and isinstance(token, str)
+                              and hmac.compare_digest(token.encode(), self.token.encode()))
+            self._reply(client, request_id, None if client.control else "invalid token")
+        elif kind in ("set_thresholds", "set_lesions"):
+            if not client.control:
+                self._reply(client, request_id, "not permitted: send {\"type\": \"auth\", \"token\": ...} first")
+                return
+            if self.on_request is None:
+                self._reply(client, request_id, "commands are disabled")
+                return
+            try:
+                action, value = self._parse_command(kind, request)
+            except ValueError as e:
+                self._reply(client, request_id, str(e))
+                return
+            self.on_request(action, value, lambda error=None: self._reply(client, request_id, error), client.address)
+        else:
+            self._reply(client, request_id, f"unknown request type {kind!r}")
+
+    @staticmethod
+    def _parse_command(kind, request):
+        if kind == "set_thresholds":
+            high, low = request.get("high"), request.get("low")
+            if not all(isinstance(value, int) and not isinstance(value, bool) for value in (high, low)):
+                raise ValueError("high and low must be integers")
+            return "thresholds", (high, low)
+        lesions = request.get("lesions")
+        if not isinstance(lesions, list) or any(field not in _FIELD_BITS for field in lesions):
+            raise ValueError(f"lesions must be a list of {', '.join(LESION_FIELDS)}")
+        return "lesions", {name: field not in lesions for field, name in zip(LESION_FIELDS, LESION_NAMES)}
+
+    def _flush(self, client):
+        out = client.unsent
+        queue = client.queue
+        while True:
+            if not out:
+                chunks = []
+                size = 0
+                if client.dropped != client.reported_dropped:
+                    # Ahead of whatever survived in the queue
+                    client.reported_dropped = client.dropped
+                    chunks.append(_encode({"type": "dropped", "count": client.dropped}))
+                while queue and size < SEND_CHUNK:
+                    chunk = queue.popleft()
+                    chunks.append(chunk)
+                    size += len(chunk)
+                if not chunks:
+                    break
+                out = b"".join(chunks)
+            try:
+                sent = client.sock.send(out)
+            except BlockingIOError:
+                sent = 0
+            except OSError:
+                self._close(client)
+                return
+            out = out[sent:]
+            if out:
+                break # The socket buffer is full; go on when it is writable
+        client.unsent = out
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if out else 0)
+        if self._selector.get_key(client.sock).events != events:
+            self._selector.modify(client.sock, events, client)
+
+
+# --- Command-line client ---
+def main():
+    parser = argparse.ArgumentParser(description="Follow (or command) the board shared by the Iris Reflex GUI")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--token", help="Control token shown in the GUI's console")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--lesions", nargs="*", metavar="FIELD", help="Lesion exactly these pathways (none: all intact)")
+    group.add_argument("--thresholds", nargs=2, type=int, metavar=("HIGH", "LOW"))
+    args = parser.parse_args()
+
+    request = None
+    if args.lesions is not None:
+        request = {"type": "set_lesions", "lesions": [field.upper() for field in args.lesions], "id": 1}
+    elif args.thresholds is not None:
+        request = {"type": "set_thresholds", "high": args.thresholds[0], "low": args.thresholds[1], "id": 1}
+    with socket.create_connection((args.host, args.port)) as sock:
+        if args.token:
+            sock.sendall(_encode({"type": "auth", "token": args.token}))
+        if request is not None:
+            sock.sendall(_encode(request))
+        try:
+            for line in sock.makefile("r", encoding="utf-8"):
+                if request is None:
+                    print(line, end="", flush=True)
+                    continue
+                message = json.loads(line)
+                if message["type"] == "result" and (message["id"] == 1 or not message["ok"]):
+                    print(line, end="")
+                    raise SystemExit(0 if message["ok"] else 1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# --- Dirty-tracking view model ---
+# The GUI writes what it wants shown into named fields at any rate; a field whose value did
+# not change costs a comparison and no Tk call. render(), once per GUI tick, applies each
+# changed field through its binding exactly once, however often it was set in between
+# (a value that changed and changed back within one tick is not applied at all).
+#
+# A binding is any callable taking the new value; it makes the Tk call(s) for one widget or
+# one group of widgets. Nothing here imports tkinter, so the layer can be benchmarked and
+# exercised without a display (see benchmarks/bench_render.py).
+_UNSET = object()
+
+
+class _Field:
+    __slots__ = ("apply", "value")
+
+    def __init__(self, apply):
+        self.apply = apply
+        self.value = _UNSET # Value last applied to the widget
+
+
+class ViewModel:
+    def __init__(self):
+        self._fields = {}
+        self._dirty = {} # name -> newest value, in the order first set
+        self.sets = 0 # set() calls
+        self.applied = 0 # Bindings run by render(), i.e. widget updates actually made
+
+    def bind(self, name, apply, initial=_UNSET):
+        # initial: what the widget already shows, so setting it again is free
+        field = _Field(apply)
+        field.value = initial
+        self._fields[name] = field
+
+    def set(self, name, value):
+        self.sets += 1
+        if name in self._dirty or self._fields[name].value != value:
+            self._dirty[name] = value
+
+    def render(self):
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, {}
+        applied = 0
+        for name, value in dirty.items():
+            field = self._fields[name]
+            if field.value != value:
+                field.value = value
+                field.apply(value)
+                applied += 1
+        self.applied += applied
+        return applied
+
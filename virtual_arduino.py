@@ -0,0 +1,361 @@
+# --- Virtual Arduino (pseudo-terminal loopback) ---
+# Emulates Light_Reflex_Simulator.ino on a pty so the GUI and the benchmarks can run without
+# a board or Wokwi. It answers SET_STATE / SET_LDR_THRESH / SET_PIN_STATE / SET_TELEM /
+# SET_PERIOD / SET_DBG / SET_REPORT, including "@<seq> " acknowledgements, with the same
+# replies as the sketch, and streams DATA|/DBG| lines (or binary frames) computed with
+# reflex_engine at any rate, including far above what 9600 baud allows. The rate stands in
+# for the sketch's telemetry period: SET_PERIOD changes it until the next reset. It can also
+# inject malformed lines and simulate a disconnect. POSIX only (needs os.openpty).
+#
+# Usage: python virtual_arduino.py [--rate 50] [--malformed 0.01] [--pattern sweep]
+#        then open the printed /dev/pts/N path as the serial port.
+import argparse
+import array
+import math
+import os
+import random
+import re
+import select
+import threading
+import time
+import tty
+
+from reflex_engine import evaluate
+from telemetry import (DEFAULT_HIGH_THRESHOLD, DEFAULT_LOW_THRESHOLD, LESION_PINS, MAX_TELEMETRY_PERIOD_MS,
+                       MIN_TELEMETRY_PERIOD_MS, REPORT_ALL, REPORT_CHANGES, REPORT_MODES, REPORT_OFF, TELEM_BIN_ACK,
+                       TELEM_TEXT_ACK, DataFrame, encode_binary_frame, encode_data_line)
+
+
+FIRMWARE_LOOP_HZ = 1000 / 150 # The sketch's delay(150)
+READY_BANNER = "Arduino Iris Reflex Simulation Ready."
+MODE_BANNER = "Operating Mode: REFLEX_MODE (Fixed)"
+
+_PIN_BITS = {pin: bit for bit, pin in enumerate(LESION_PINS.values())}
+_THRESH_RE = re.compile(r"SET_LDR_THRESH:\s*([-+]?\d+),\s*([-+]?\d+)")
+_PIN_RE = re.compile(r"SET_PIN_STATE:\s*([-+]?\d+),\s*([-+]?\d+)")
+_STATE_RE = re.compile(r"SET_STATE:\s*([-+]?\d+),\s*([-+]?\d+),\s*([-+]?\d+)")
+_SEQ_RE = re.compile(r"@(\d+) *")
+_PERIOD_RE = re.compile(r"SET_PERIOD:\s*([-+]?\d+)$")
+_DBG_NAMES = ("OpticNerve_L_OK", "OpticNerve_R_OK", "PTN_L_OK", "PTN_R_OK", "EWP_L_OK", "EWP_R_OK", "CN3_L_OK", "CN3_R_OK")
+
+
+def debug_line(frame):
+    # Byte-for-byte the DBG| line the sketch prints
+    flags = " | ".join(f"{name}: {'Lesion' if (frame.lesion_mask >> bit) & 1 else 'OK'}"
+                       for bit, name in enumerate(_DBG_NAMES))
+    return (f"DBG|LDR_L: {frame.ldr_l} | LDR_R: {frame.ldr_r} | {flags} | Global_Light_Level: {frame.gll.name}"
+            f" | Angle_L (deg): {frame.angle_l} | Angle_R (deg): {frame.angle_r}"
+            f" | Servo_L (20-170): {frame.servo_l} | Servo_R (20-170): {frame.servo_r}")
+
+
+class VirtualArduino:
+    # LDR patterns: "sweep" (slow sine per eye), "random", or "sequence", which encodes a
+    # 20-bit frame counter in LDR_L/LDR_R so a receiver can match frames to sent_times
+    PATTERNS = ("sweep", "random", "sequence")
+    SEQUENCE_MASK = 0xFFFFF # 20 bits: 10 in LDR_L, 10 in LDR_R
+    RESET_DELAY = 0.2 # Seconds from the host opening the port to the banner (a real Uno takes ~1.6 s)
+    CHANGE_HEARTBEAT = 1.0 # Seconds; the sketch's CHANGE_HEARTBEAT_MS
+
+    def __init__(self, rate_hz=FIRMWARE_LOOP_HZ, pattern="sweep", send_debug=True, malformed_ratio=0.0, seed=None):
+        self.rate_hz = rate_hz
+        self.pattern = pattern
+        self.send_debug = send_debug
+        self._defaults = (rate_hz, send_debug) # What reset() returns to
+        self.report_mode = REPORT_ALL
+        self._last_reported = None # (LDR buckets, lesion mask, servos) of the last frame sent
+        self._last_report_time = 0.0
+        self.malformed_ratio = malformed_ratio
+        self.high_threshold = DEFAULT_HIGH_THRESHOLD
+        self.low_threshold = DEFAULT_LOW_THRESHOLD
+        self.lesion_mask = 0
+        self.binary = False
+        self.loops = 0 # Emulated loop() passes; frames_sent can be lower in change-only mode
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.bytes_dropped = 0 # Output discarded because nobody was reading the pty
+        self.commands_received = []
+        # perf_counter() at write, indexed by frame counter & SEQUENCE_MASK ("sequence" pattern only).
+        # A fixed array keeps memory flat on long benchmark runs.
+        self.sent_times = array.array("d", bytes(8 * (self.SEQUENCE_MASK + 1))) if pattern == "sequence" else None
+        self._rng = random.Random(seed)
+        self.host_connected = False
+        self._master_fd, slave_fd = os.openpty()
+        tty.setraw(slave_fd) # No echo, no CR/LF translation: behave like a USB CDC port
+        os.set_blocking(self._master_fd, False)
+        self.port = os.ttyname(slave_fd)
+        # With no slave fd of our own, the master reports a hang-up whenever no host has the
+        # port open; that is how _run notices the host opening it (the Uno's DTR reset)
+        os.close(slave_fd)
+        self._stop = threading.Event()
+        self._thread = None
+        self._command_buffer = bytearray()
+        self._lock = threading.Lock()
+
+    # --- Lifecycle ---
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="virtual-arduino", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        # Also used to simulate pulling the USB cable: once the pty master is closed the
+        # host's next read fails with an I/O error, just like a vanished /dev/ttyACM0
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+        try:
+            os.close(self._master_fd)
+        except OSError:
+            pass
+        self._master_fd = -1
+
+    disconnect = stop
+
+    def reset(self):
+        # Like the Uno's DTR auto-reset, which _run triggers whenever a host opens the port:
+        # defaults, text mode, banner
+        self.high_threshold = DEFAULT_HIGH_THRESHOLD
+        self.low_threshold = DEFAULT_LOW_THRESHOLD
+        self.lesion_mask = 0
+        self.binary = False
+        self.rate_hz, self.send_debug = self._defaults
+        self.report_mode = REPORT_ALL
+        self._last_reported = None
+        self._write_line(READY_BANNER)
+        self._write_line(MODE_BANNER)
+
+    def inject(self, raw):
+        # Write arbitrary bytes/str onto the wire (malformed lines, partial frames, noise)
+        self._write(raw.encode("utf-8") if isinstance(raw, str) else raw)
+
+    # --- Emulated firmware ---
+    def _ldr_values(self, n):
+        if self.pattern == "sequence":
+            return n & 0x3FF, (n >> 10) & 0x3FF
+        if self.pattern == "random":
+            return self._rng.randint(0, 1023), self._rng.randint(0, 1023)
+        t = n / max(self.rate_hz, 1e-6)
+        return (int(511.5 + 511.5 * math.sin(t * 0.7)), int(511.5 + 511.5 * math.sin(t * 0.45 + 1.0)))
+
+    def _make_frame(self, n):
+        ldr_l, ldr_r = self._ldr_values(n)
+        outcome = evaluate(ldr_l, ldr_r, self.lesion_mask, self.high_threshold, self.low_threshold)
+        return DataFrame(ldr_l, ldr_r, self.lesion_mask, outcome.gll, outcome.angle_l, outcome.angle_r,
+                         outcome.servo_l, outcome.servo_r)
+
+    def _loop_pass(self):
+        n = self.loops
+        self.loops += 1
+        if self.report_mode == REPORT_OFF:
+            return
+        frame = self._make_frame(n)
+        if self.report_mode == REPORT_CHANGES:
+            high, low = self.high_threshold, self.low_threshold
+            state = (self._bucket(frame.ldr_l, high, low), self._bucket(frame.ldr_r, high, low),
+                     frame.lesion_mask, frame.servo_l, frame.servo_r)
+            now = time.perf_counter()
+            if state == self._last_reported and now - self._last_report_time < self.CHANGE_HEARTBEAT:
+                return
+            self._last_reported = state
+            self._last_report_time = now
+        if self.binary:
+            self._write(encode_binary_frame(frame))
+        else:
+            line = encode_data_line(frame)
+            if self.malformed_ratio and self._rng.random() < self.malformed_ratio:
+                line = line[:self._rng.randint(5, len(line) - 1)] # Truncated mid-field
+            payload = line + "\r\n"
+            if self.send_debug:
+                payload += debug_line(frame) + "\r\n"
+            self._write(payload.encode("ascii"))
+        if self.pattern == "sequence":
+            self.sent_times[n & self.SEQUENCE_MASK] = time.perf_counter()
+        self.frames_sent += 1
+
+    @staticmethod
+    def _bucket(ldr, high, low):
+        # The sketch's ldrBucket(): 0 bright, 1 ambient, 2 dark
+        return 0 if ldr < high else 1 if ldr <= low else 2
+
+    def _process_command(self, command):
+        self.commands_received.append(command)
+        was_binary = self.binary
+        seq = None
+        match = _SEQ_RE.match(command)
+        if match:
+            seq = int(match.group(1))
+            command = command[match.end():]
+        ok = True
+        if command.startswith("SET_TELEM:BIN"):
+            self._write_line(TELEM_BIN_ACK)
+            self.binary = True
+        elif command.startswith("SET_TELEM:TEXT"):
+            self._write_line(TELEM_TEXT_ACK)
+            self.binary = False
+        elif command.startswith("SET_PERIOD:"):
+            match = _PERIOD_RE.match(command)
+            if match and MIN_TELEMETRY_PERIOD_MS <= int(match.group(1)) <= MAX_TELEMETRY_PERIOD_MS:
+                self.rate_hz = 1000 / int(match.group(1))
+                self._write_line(f"PERIOD:{int(match.group(1))}")
+            else:
+                ok = False
+                self._write_line("Error: Invalid SET_PERIOD format. Use SET_PERIOD:<ms> (20-10000)")
+        elif command in ("SET_DBG:ON", "SET_DBG:OFF"):
+            self.send_debug = command == "SET_DBG:ON"
+            self._write_line(command[4:])
+        elif command.startswith("SET_REPORT:"):
+            mode = command[len("SET_REPORT:"):]
+            if mode in REPORT_MODES:
+                self.report_mode = mode
+                self._last_reported = None
+                self._write_line(f"REPORT:{mode}")
+            else:
+                ok = False
+                self._write_line("Error: Invalid SET_REPORT mode. Use SET_REPORT:ALL, CHANGES or OFF")
+        elif command.startswith("SET_LDR_THRESH:"):
+            match = _THRESH_RE.match(command)
+            if match:
+                self.high_threshold, self.low_threshold = int(match.group(1)), int(match.group(2))
+                self._write_line(f"LDR Thresholds set: High={self.high_threshold}, Low={self.low_threshold}")
+            else:
+                ok = False
+                self._write_line("Error: Invalid SET_LDR_THRESH format. Use SET_LDR_THRESH:<high>,<low>")
+        elif command.startswith("SET_STATE:"):
+            match = _STATE_RE.match(command)
+            if match and 0 <= int(match.group(1)) <= 255:
+                self.lesion_mask = int(match.group(1))
+                self.high_threshold, self.low_threshold = int(match.group(2)), int(match.group(3))
+                if seq is None:
+                    self._write_line(f"STATE:{self.lesion_mask},{self.high_threshold},{self.low_threshold}")
+            else:
+                ok = False
+                self._write_line("Error: Invalid SET_STATE format. Use SET_STATE:<lesionMask>,<high>,<low>")
+        elif command.startswith("SET_PIN_STATE:"):
+            match = _PIN_RE.match(command)
+            if not match:
+                ok = False
+                self._write_line("Error: Invalid SET_PIN_STATE format. Use SET_PIN_STATE:<pin>,<state>")
+            else:
+                pin, state = int(match.group(1)), int(match.group(2))
+                bit = _PIN_BITS.get(pin)
+                if bit is None:
+                    ok = False
+                    self._write_line(f"Error: Invalid pin number for lesion control: {pin}")
+                else:
+                    if state == 1:
+                        self.lesion_mask &= ~(1 << bit)
+                    else:
+                        self.lesion_mask |= 1 << bit
+                    self._write_line(f"Pin {pin} set to " + ("HIGH (INTACT, LED ON)" if state == 1 else "LOW (LESION, LED OFF)"))
+        else:
+            ok = False
+            self._write_line(f"Unknown command: {command}")
+        if seq is not None:
+            self._write_line(f"ACK:{seq},{'OK' if ok else 'ERR'}")
+        if was_binary or self.binary:
+            self._write(b"\x00")
+
+    def _host_present(self):
+        # Readable-without-data on the master means hang-up: no host has the port open
+        try:
+            readable, _, _ = select.select([self._master_fd], [], [], 0)
+            if readable:
+                os.read(self._master_fd, 4096) # Input sent before the "reset" is lost, as on the Uno
+        except BlockingIOError:
+            return True
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def _read_commands(self):
+        try:
+            data = os.read(self._master_fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            self.host_connected = False # Host closed the port
+            return
+        self._command_buffer += data
+        while True:
+            end = self._command_buffer.find(b"\n")
+            if end < 0:
+                break
+            # The sketch keeps at most 63 characters of a command
+            command = bytes(self._command_buffer[:end])[:63].decode("ascii", errors="replace")
+            del self._command_buffer[:end + 1]
+            self._process_command(command)
+
+    def _run(self):
+        rate = None
+        while not self._stop.is_set():
+            if not self.host_connected:
+                # Nothing runs until a host opens the port; then "reset" and start streaming
+                if not self._host_present():
+                    self._stop.wait(0.05)
+                    continue
+                self.host_connected = True
+                self._stop.wait(self.RESET_DELAY)
+                self.reset()
+                rate = None
+            if self.rate_hz != rate:
+                # First pass after a reset, or SET_PERIOD changed the rate: restart the schedule
+                rate = self.rate_hz
+                period = 1.0 / rate if rate > 0 else None
+                start = time.perf_counter()
+                first = self.loops
+            if period is None:
+                timeout = 0.1
+            else:
+                # Schedule against the start time so high rates do not drift; catch up in bursts
+                due = first + int((time.perf_counter() - start) / period) + 1
+                while self.loops < due and not self._stop.is_set() and self.rate_hz == rate:
+                    self._loop_pass()
+                timeout = max(0.0, start + (self.loops - first) * period - time.perf_counter())
+            try:
+                readable, _, _ = select.select([self._master_fd], [], [], timeout)
+            except (OSError, ValueError):
+                return
+            if readable:
+                self._read_commands()
+
+    # --- Wire output ---
+    def _write_line(self, text):
+        self._write(text.encode("ascii") + b"\r\n")
+
+    def _write(self, data):
+        with self._lock:
+            view = memoryview(data)
+            while view:
+                try:
+                    written = os.write(self._master_fd, view)
+                except BlockingIOError:
+                    # Host is not draining the pty: drop like a real UART overrun would
+                    self.bytes_dropped += len(view)
+                    return
+                except OSError:
+                    return
+                self.bytes_sent += written
+                view = view[written:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulate the Iris Reflex Arduino on a pseudo-terminal")
+    parser.add_argument("--rate", type=float, default=FIRMWARE_LOOP_HZ, help="DATA frames per second")
+    parser.add_argument("--pattern", choices=VirtualArduino.PATTERNS, default="sweep")
+    parser.add_argument("--no-debug", action="store_true", help="Do not emit DBG| lines")
+    parser.add_argument("--malformed", type=float, default=0.0, help="Fraction of DATA lines to truncate")
+    args = parser.parse_args()
+
+    device = VirtualArduino(args.rate, args.pattern, not args.no_debug, args.malformed).start()
+    print(f"Virtual Arduino on {device.port} ({args.rate:g} frames/s). Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        device.stop()
+
+
+if __name__ == "__main__":
+    main()